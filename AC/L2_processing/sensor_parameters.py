@@ -27,3 +27,32 @@ SENSOR_GAINS = {
 }
 
 
+
+# Archive members (or Google Cloud scene files) which each 
+# AC method reads, as filename patterns for each sensor. All
+# members are used for any sensor / AC method not listed here
+OLCI_MEMBERS    = ['xfdumanifest.xml', 'Oa*_radiance.nc', 'geo_coordinates.nc', 'instrument_data.nc',
+                   'qualityFlags.nc', 'tie_*.nc', 'time_coordinates.nc']
+LANDSAT_MEMBERS = ['*_MTL.txt', '*_B?.TIF', '*_B1?.TIF', '*_BQA.TIF', '*_QA_PIXEL.TIF', '*_QA_RADSAT.TIF']
+MSI_MEMBERS     = ['manifest.safe', 'MTD_MSIL1C.xml', 'MTD_TL.xml', '*_B??.jp2']
+ARCHIVE_MEMBERS = {
+    'l2gen'   : {
+        'MSI'  : MSI_MEMBERS,
+        'OLCI' : OLCI_MEMBERS,
+        'OLI'  : LANDSAT_MEMBERS + ['*_ANG.txt'],
+        'ETM'  : LANDSAT_MEMBERS,
+        'TM'   : LANDSAT_MEMBERS,
+    },
+    'polymer' : {
+        'MSI'  : MSI_MEMBERS,
+        'OLCI' : OLCI_MEMBERS,
+        'OLI'  : LANDSAT_MEMBERS + ['*_ANG.txt'],
+    },
+    'acolite' : {
+        'MSI'  : MSI_MEMBERS,
+        'OLCI' : OLCI_MEMBERS,
+        'OLI'  : LANDSAT_MEMBERS + ['*_MTL.xml'],
+        'ETM'  : LANDSAT_MEMBERS + ['*_MTL.xml'],
+        'TM'   : LANDSAT_MEMBERS + ['*_MTL.xml'],
+    },
+}
@@ -1,12 +1,17 @@
-from ..exceptions import FetchAPIError
-from ..utils import Location, DatetimeRange
-from .sources import BaseAbstract, SOURCES
+from ..exceptions import DownloadStallError, FetchAPIError, ProductOfflineError
+from ..utils import Location, DatetimeRange, SingleFlight
+from .sources import BaseAbstract, BaseSource, SOURCES
+from .SearchCache import SearchCache
+from .SourceHealth import SourceHealth
+from ..utils.SceneCache import folder_size
 
 from celery.utils.log import get_task_logger
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import nullcontext
 from pathlib import Path
-from typing import List, Union
+from typing import List, Optional, Union
 from abc import abstractmethod 
-import traceback
+import time, traceback
 
 logger = get_task_logger('pipeline')
 
@@ -25,8 +30,18 @@ class BaseAPI(BaseAbstract):
     -----
     - The `search_sources` and `download_sources` attributes
       should be set in the inheriting class definition.
+    - Sources are tried in the order given by `health`, which reorders
+      the static priority by each Source's recent success rate and 
+      latency, and skips any Source which is currently failing.
+    - A scene is only downloaded by one process at a time; any other
+      process requesting it waits for (and then uses) that download.
+    - A download which stalls (see sources.StallMonitor) fails over to 
+      the next Source straight away, and counts as a failure in `health`.
+    - A scene which is offline at every Source raises ProductOfflineError,
+      so that its download can be retried once it has been retrieved.
 
     """
+    health = SourceHealth()
 
     @property
     @abstractmethod
@@ -42,7 +57,7 @@ class BaseAPI(BaseAbstract):
 
 
 
-    def _try_source_method(self, method: str, *args, **kwargs):
+    def _try_source_method(self, method: str, *args, cache=None, **kwargs):
         """Try to perform `method` for all available Sources.
         
         Parameters
@@ -51,6 +66,9 @@ class BaseAPI(BaseAbstract):
             Method to call on the available sources (e.g. 'search').
         *args
             Arguments passed to the Source `method`. 
+        cache : SearchCache, optional
+            Cache holding previous results of `method` for each Source,
+            which are returned rather than calling the Source again.
         **kwargs
             Keywords passed to the Source `method`.
 
@@ -58,19 +76,148 @@ class BaseAPI(BaseAbstract):
         ------
         FetchAPIError
             If all Sources fail for the requested `method` call.
+        ProductOfflineError
+            If all Sources fail, with at least one because the product 
+            is offline (i.e. the call should be retried later).
 
         """
         exceptions  = []
+        offline     = False
         source_name = method.split('_')[0]
-        for name in getattr(self, f'{source_name}_sources'):
+        sources     = self.health.order(getattr(self, f'{source_name}_sources'), method)
+
+        # Use the first Source which has a cached result
+        for name in (sources if cache is not None else []):
+            result = cache.get(name, *args, **kwargs)
+            if result is not None: return result
+
+        for name in sources:
             try: 
-                Source = SOURCES[name]()
-                return getattr(Source, method)(*args, **kwargs)
+                return self._call_source(name, method, *args, cache=cache, **kwargs)
+
+            # Stalled download is an expected failure, so the traceback isn't needed
+            except DownloadStallError as e:
+                message = f'{name}: {e}\n'
+                logger.warn(f'{message}Failing over to the next Source')
+                exceptions.append(message)
+            except ProductOfflineError as e:
+                message = f'{name}: {e}\n'
+                logger.info(message)
+                exceptions.append(message)
+                offline = True
             except Exception as e: 
                 message = f'{name}: {e}\n{traceback.format_exc()}\n'
                 logger.warn(message)
                 exceptions.append(message)
 
+        exceptions = '\n'.join(exceptions)
+        message    = f'{self} {method} failed for all Sources:\n{exceptions}'
+        if offline: raise ProductOfflineError(message)
+        logger.error(message)
+        raise FetchAPIError(message)
+
+
+
+    def _hedge_source_method(self, method: str, *args, cache=None, 
+        percentile=95, delay=10, merge=False, **kwargs):
+        """Perform `method` with the primary Source, racing the others if it's slow.
+        
+        The primary (i.e. first) Source is called, and if it hasn't returned 
+        within the given percentile of its recent latencies, the next Source
+        is also called in parallel. Likewise, the next Source is called as 
+        soon as any Source fails or returns an empty result. The first 
+        non-empty result is returned, and any remaining calls are cancelled.
+
+        Parameters
+        ----------
+        method : str
+            Method to call on the available sources (e.g. 'search').
+        *args
+            Arguments passed to the Source `method`. 
+        cache : SearchCache, optional
+            Cache holding previous results of `method` for each Source,
+            which are returned rather than calling the Source again.
+        percentile : float, optional
+            Percentile of a Source's recent latencies after which the next
+            Source is called in parallel.
+        delay : float, optional
+            Seconds after which the next Source is called in parallel, for 
+            any Source without enough recorded latencies.
+        merge : bool, optional
+            If True, wait for every called Source to return, and merge the
+            results of each (preferring the earlier Sources' scene details).
+        **kwargs
+            Keywords passed to the Source `method`.
+
+        Raises
+        ------
+        FetchAPIError
+            If all Sources fail for the requested `method` call.
+
+        """
+        exceptions  = []
+        source_name = method.split('_')[0]
+        sources     = self.health.order(getattr(self, f'{source_name}_sources'), method)
+
+        # Use the first Source which has a cached result
+        for name in (sources if cache is not None else []):
+            result = cache.get(name, *args, **kwargs)
+            if result is not None: return result
+
+        def hedge_delay(name):
+            latency = self.health.latency(name, method, percentile)
+            return delay if latency is None else latency
+
+        waiting = list(sources)
+        pending = {}
+        results = {}
+        pool    = ThreadPoolExecutor(max_workers=len(sources))
+
+        def call_next():
+            name = waiting.pop(0)
+            pending[pool.submit(self._call_source, name, method, *args, cache=cache, **kwargs)] = name
+            return hedge_delay(name)
+
+        try:
+            timeout = call_next()
+            while len(pending):
+                done, _ = wait(pending, timeout=timeout if len(waiting) else None, 
+                               return_when=FIRST_COMPLETED)
+
+                # Slowest call hasn't returned in time, so race it with the next Source
+                if not len(done):
+                    logger.info(f'{self} {method} racing {waiting[0]} after {timeout:.1f}s')
+                    timeout = call_next()
+                    continue
+
+                for future in done:
+                    name = pending.pop(future)
+                    try: 
+                        results[name] = future.result()
+                    except Exception as e:
+                        message = f'{name}: {e}\n{traceback.format_exc()}\n'
+                        logger.warn(message)
+                        exceptions.append(message)
+
+                    # Winner is the first Source with a non-empty result
+                    if len(results.get(name, {})) and not merge:
+                        return results[name]
+
+                    # Call the next Source straight away if this one was unsuccessful
+                    if not len(results.get(name, {})) and len(waiting) and not len(pending):
+                        timeout = call_next()
+
+        # Calls which are still running can't be interrupted; their results are ignored
+        finally: 
+            for future in pending: future.cancel()
+            pool.shutdown(wait=False)
+
+        if len(results):
+            merged = {}
+            for name in reversed([name for name in sources if name in results]):
+                merged.update(results[name])
+            return merged
+
         exceptions = '\n'.join(exceptions)
         message    = f'{self} {method} failed for all Sources:\n{exceptions}'
         logger.error(message)
@@ -78,10 +225,45 @@ class BaseAPI(BaseAbstract):
 
 
 
+    def _call_source(self, name: str, method: str, *args, cache=None, **kwargs):
+        """ 
+        Perform `method` with the given Source, holding one of its download
+        slots for any download. The Source's request rate is applied to each
+        individual HTTP request made by the method (see LimitedAdapter).
+        """
+        Source = SOURCES[name]()
+        slot   = Source.limiter.download() if method.startswith('download') else nullcontext()
+        with slot:
+            start = time.time()
+            try: 
+                result = getattr(Source, method)(*args, **kwargs)
+
+            # Offline products aren't a failure of the Source itself
+            except ProductOfflineError: raise
+            except:
+                self.health.record(name, method, False, time.time() - start)
+                raise
+
+            # Throughput is only known for new downloads, rather than existing files
+            latency = time.time() - start
+            n_bytes = None
+            if isinstance(result, Path) and result.joinpath('.complete').exists():
+                if result.joinpath('.complete').stat().st_mtime >= start:
+                    n_bytes = folder_size(result)
+            self.health.record(name, method, True, latency, n_bytes)
+
+        if cache is not None: 
+            cache.put(name, result, *args, **kwargs)
+        return result
+
+
+
     def search_scenes(self, 
         sensor           : str,           # Sensor to search scenes for 
         location         : Location,      # Object representing location to search at
         dt_range         : DatetimeRange, # Object representing start & end datetime to search between
+        cache            : Optional[SearchCache] = None, # Cache of previous search results to use
+        hedge            : Optional[dict] = None, # If given, race slow Sources (see _hedge_source_method)
         **kwargs,                         # Any other keyword arguments specific to the API
     ) -> dict:                            # Return a dictionary of found scenes: {scene_id: scene_detail_dict}
         """ Function which searches for scenes matching the given criteria """
@@ -90,7 +272,9 @@ class BaseAPI(BaseAbstract):
             'location' : location,
             'dt_range' : dt_range,
         })
-        return self._try_source_method('search_scenes', **kwargs)
+        if hedge is not None:
+            return self._hedge_source_method('search_scenes', cache=cache, **hedge, **kwargs)
+        return self._try_source_method('search_scenes', cache=cache, **kwargs)
 
 
 
@@ -100,6 +284,7 @@ class BaseAPI(BaseAbstract):
         scene_details : dict,             # Any additional details about the scene
         scene_folder  : Union[Path, str], # Folder which holds all downloaded scenes
         overwrite     : bool = False,     # Whether to overwrite an already existing file
+        members       : Optional[List[str]] = None, # Filename patterns of the archive members to extract (None extracts all)
     ) -> Path:                            # Return path to the downloaded scene
         """ Function which downloads the requested scene """
         kwargs = {
@@ -108,6 +293,46 @@ class BaseAPI(BaseAbstract):
             'scene_details' : scene_details,
             'scene_folder'  : scene_folder,
             'overwrite'     : overwrite,
+            'members'       : members,
         }
-        return self._try_source_method('download_scene', **kwargs)
+        output = Path(scene_folder).joinpath(scene_id)
+        start  = time.time()
+        since  = start if overwrite else None
+        flight = SingleFlight(output.joinpath('.download.lock'))
+
+        # Only one process downloads the scene, with any others waiting on its result
+        with flight.lead(lambda: BaseSource.is_complete(output, members, since)) as leader:
+            if leader: 
+                return self._try_source_method('download_scene', **kwargs)
+        logger.info(f'{self} using {scene_id} downloaded by another process')
+        return output
+
+
+
+    def order_scenes(self, 
+        sensor       : str,              # Sensor which created these scenes
+        scenes       : dict,             # Scenes to order: {scene_id: scene_detail_dict}
+        scene_folder : Union[Path, str], # Folder which holds all downloaded scenes
+        overwrite    : bool = False,     # Whether to overwrite already existing files
+        members      : Optional[List[str]] = None, # Filename patterns of the archive members required
+    ) -> dict:                           # Return the number of scenes ordered by each Source
+        """ 
+        Order the scenes up front from every available Source which prepares
+        downloads in advance, so they're ready once each scene is downloaded.
+        Ordering is only an optimization, so a failed order isn't an error.
+        """
+        kwargs = {
+            'sensor'       : sensor,
+            'scenes'       : scenes,
+            'scene_folder' : scene_folder,
+            'overwrite'    : overwrite,
+            'members'      : members,
+        }
+        ordered = {}
+        for name in self.health.order(self.download_sources, 'order_scenes'):
+            try: 
+                ordered[name] = self._call_source(name, 'order_scenes', **kwargs)
+            except Exception as e: 
+                logger.warn(f'{name}: Failed to order {len(scenes)} scenes: {e}')
+        return ordered
         
@@ -13,10 +13,8 @@ class ETM(BaseAPI):
         search:   EarthExplorer
         download: Google, EarthExplorer
 
-    Google download is currently disabled until rate limiting
-    is put in place, due to issues with too much data being 
-    downloaded on Pardees.
+    See the Google Source for how its downloads are limited.
     """
     search_sources   = ['EarthExplorer']
-    download_sources = ['Google', 'EarthExplorer'][1:]
+    download_sources = ['Google', 'EarthExplorer']
     
\ No newline at end of file
@@ -13,11 +13,9 @@ class MSI(BaseAPI):
         search:   Copernicus
         download: Google, Copernicus
 
-    Google download is currently disabled until rate limiting
-    is put in place, due to issues with too much data being 
-    downloaded on Pardees.
+    See the Google Source for how its downloads are limited.
     """
     search_sources   = ['Copernicus']
-    download_sources = ['Google', 'Copernicus'][1:]
+    download_sources = ['Google', 'Copernicus']
 
 
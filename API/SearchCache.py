@@ -0,0 +1,129 @@
+from .. import config
+from ..utils import Location, DatetimeRange
+
+from argparse import Namespace
+from contextlib import contextmanager
+from shapely import wkt
+from pathlib import Path
+from typing import Optional, Union
+import hashlib, pickle, sqlite3, time
+
+
+
+class SearchCache:
+    """Search results shared by all processes, and persisted between runs.
+
+    Nearby samples on the same day result in identical searches, which
+    would otherwise each be sent to the Source again (including on every
+    rerun of the pipeline). Results are instead saved in a SQLite database,
+    keyed by the Source, sensor, location and datetime range searched:
+
+        cache  = SearchCache(ttl=24, empty_ttl=1)
+        scenes = cache.get('OBPG', 'OLCI', location, dt_range)
+
+        if scenes is None:
+            scenes = search()
+            cache.put('OBPG', scenes, 'OLCI', location, dt_range)
+
+    Empty results are kept for a shorter time than other results, as new
+    scenes can still be published for recent dates.
+
+    """
+
+    def __init__(self,
+        ttl       : float = 24 * 7,  # Hours that search results remain valid (0 disables)
+        empty_ttl : float = 1,       # Hours that empty search results remain valid (0 disables)
+        path      : Union[Path, str] = config.scratch_path.joinpath('State', 'search_cache.db'),
+        precision : int   = 4,       # Decimal places coordinates are rounded to in the key
+    ):
+        self.ttl       = ttl
+        self.empty_ttl = empty_ttl
+        self.path      = Path(path)
+        self.precision = precision
+
+
+    def __str__(self):
+        return f'SearchCache({self.path}, ttl={self.ttl}, empty_ttl={self.empty_ttl})'
+
+
+    def __repr__(self):
+        return str(self)
+
+
+    @classmethod
+    def from_config(cls, global_config: Namespace) -> 'SearchCache':
+        """ Create the cache used by the pipeline with the given config """
+        return cls(global_config.search_cache_ttl, global_config.search_empty_ttl)
+
+
+
+    def get(self,
+        source   : str,           # Name of the Source searched
+        sensor   : str,           # Sensor searched for
+        location : Location,      # Location searched at
+        dt_range : DatetimeRange, # Datetime range searched between
+        **kwargs,                 # Any other keywords given to the search
+    ) -> Optional[dict]:          # Returns the cached results, or None if missing / expired
+        """ Get the cached results of a search """
+        if not (self.ttl or self.empty_ttl) or not self.path.exists():
+            return
+
+        key = self.key(source, sensor, location, dt_range, **kwargs)
+        with self._connect() as db:
+            row = db.execute('SELECT results FROM searches WHERE key=? AND expires>?',
+                             (key, time.time())).fetchone()
+        if row is not None:
+            return pickle.loads(row[0])
+
+
+
+    def put(self,
+        source   : str,           # Name of the Source searched
+        results  : dict,          # Results of the search
+        sensor   : str,           # Sensor searched for
+        location : Location,      # Location searched at
+        dt_range : DatetimeRange, # Datetime range searched between
+        **kwargs,                 # Any other keywords given to the search
+    ) -> None:
+        """ Save the results of a search """
+        ttl = self.ttl if len(results) else self.empty_ttl
+        if not ttl: return
+
+        key = self.key(source, sensor, location, dt_range, **kwargs)
+        now = time.time()
+        with self._connect() as db:
+            db.execute('DELETE FROM searches WHERE expires<=?', (now,))
+            db.execute('REPLACE INTO searches VALUES (?, ?, ?)', (key,
+                pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL), now + ttl * 3600))
+
+
+
+    def key(self,
+        source   : str,           # Name of the Source searched
+        sensor   : str,           # Sensor searched for
+        location : Location,      # Location searched at
+        dt_range : DatetimeRange, # Datetime range searched between
+        **kwargs,                 # Any other keywords given to the search
+    ) -> str:                     # Returns the key identifying the search
+        """ Normalized key for a search, ignoring insignificant coordinate / time differences """
+        footprint = wkt.dumps(location.footprint, rounding_precision=self.precision)
+        bbox      = [round(v, self.precision) for v in location.get_bbox()]
+        minutes   = [t.strftime('%Y%m%d%H%M') for t in [dt_range.start, dt_range.end]]
+        extra     = sorted((k, repr(v)) for k, v in kwargs.items())
+        key       = repr([source, sensor, location.given, footprint, bbox, minutes, extra])
+        return hashlib.sha1(key.encode()).hexdigest()
+
+
+
+    # ================================================================
+    # Private functions
+
+    @contextmanager
+    def _connect(self):
+        """ Connection to the shared database """
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        connection = sqlite3.connect(self.path.as_posix(), timeout=60, isolation_level=None)
+        try:
+            connection.execute('CREATE TABLE IF NOT EXISTS searches (key TEXT PRIMARY KEY, results BLOB, expires REAL)')
+            yield connection
+        finally: connection.close()
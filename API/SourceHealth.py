@@ -0,0 +1,163 @@
+from .. import config
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional, Union
+import numpy as np
+import sqlite3, time
+
+
+
+class SourceHealth:
+    """Success rate, latency and throughput of each Source, shared by all processes.
+
+    The outcome of every Source call is recorded in a SQLite database, so
+    that the statistics persist between runs. Sources are then ordered by
+    their expected time to a successful result, and any Source which has
+    failed repeatedly is skipped until a cool-down period has passed (i.e.
+    a circuit breaker):
+
+        health  = SourceHealth()
+        sources = health.order(['Copernicus', 'OBPG', 'LAADS'], 'search_scenes')
+
+        start = time.time()
+        try:    search(sources[0])
+        except: health.record(sources[0], 'search_scenes', False, time.time() - start)
+
+    Sources without enough recorded calls keep their position relative to
+    the Source which precedes them in the given (static) ordering.
+
+    """
+
+    def __init__(self,
+        window    : int   = 100,  # Number of recent calls used for each Source's statistics
+        min_calls : int   = 5,    # Calls required before a Source is reordered
+        failures  : int   = config.source_breaker_failures, # Consecutive failures which open the circuit
+        cooldown  : float = config.source_breaker_cooldown, # Minutes an open circuit skips the Source
+        path      : Union[Path, str] = config.scratch_path.joinpath('State', 'source_health.db'),
+    ):
+        self.window    = window
+        self.min_calls = min_calls
+        self.failures  = failures
+        self.cooldown  = cooldown
+        self.path      = Path(path)
+
+
+    def __str__(self):
+        return f'SourceHealth({self.path})'
+
+
+    def __repr__(self):
+        return str(self)
+
+
+
+    def record(self,
+        source  : str,                     # Name of the Source called
+        method  : str,                     # Method called (e.g. 'search_scenes')
+        success : bool,                    # Whether the call succeeded
+        latency : float,                   # Seconds the call took
+        n_bytes : Optional[float] = None,  # Bytes transferred by the call
+    ) -> None:
+        """ Record the outcome of a Source call """
+        with self._connect() as db:
+            db.execute('INSERT INTO calls VALUES (?, ?, ?, ?, ?, ?)',
+                       (source, method, time.time(), int(success), latency, n_bytes))
+            db.execute('''DELETE FROM calls WHERE source=? AND method=? AND time < (
+                              SELECT MIN(time) FROM (SELECT time FROM calls WHERE source=? AND method=?
+                                                     ORDER BY time DESC LIMIT ?))''',
+                       (source, method, source, method, self.window))
+
+
+
+    def stats(self,
+        source : str, # Name of the Source
+        method : str, # Method called (e.g. 'search_scenes')
+    ) -> dict:        # Returns the statistics of recent calls
+        """ Success rate, latency percentiles and throughput of recent calls """
+        if not self.path.exists(): rows = []
+        else:
+            with self._connect() as db:
+                rows = db.execute('''SELECT time, success, latency, bytes FROM calls
+                                     WHERE source=? AND method=? ORDER BY time DESC''',
+                                  (source, method)).fetchall()
+
+        latencies = [latency for _, success, latency, _ in rows if success]
+        transfers = [(n_bytes, latency) for _, success, latency, n_bytes in rows
+                     if success and n_bytes is not None and latency > 0]
+        failures  = next((i for i, (_, success, _, _) in enumerate(rows) if success), len(rows))
+        return {
+            'calls'        : len(rows),
+            'success_rate' : np.mean([success for _, success, _, _ in rows]) if len(rows) else None,
+            'p50_latency'  : np.percentile(latencies, 50) if len(latencies) else None,
+            'p95_latency'  : np.percentile(latencies, 95) if len(latencies) else None,
+            'bytes_per_sec': (sum(b for b, _ in transfers) / sum(l for _, l in transfers)
+                              if len(transfers) else None),
+            'failures'     : failures, # Consecutive failures of the most recent calls
+            'last_call'    : rows[0][0] if len(rows) else None,
+        }
+
+
+
+    def latency(self,
+        source     : str,   # Name of the Source
+        method     : str,   # Method called (e.g. 'search_scenes')
+        percentile : float, # Percentile of the recent successful latencies
+    ) -> Optional[float]:   # Returns the latency, or None if unknown
+        """ Percentile of a Source's recent successful call latencies """
+        if not self.path.exists(): return
+        with self._connect() as db:
+            latencies = [row[0] for row in db.execute('''SELECT latency FROM calls
+                WHERE source=? AND method=? AND success=1''', (source, method)).fetchall()]
+        if len(latencies) >= self.min_calls:
+            return np.percentile(latencies, percentile)
+
+
+
+    def is_open(self, stats: dict) -> bool:
+        """ Whether the circuit is open (i.e. the Source is skipped) given its stats """
+        return (stats['failures'] >= self.failures and
+                (time.time() - stats['last_call']) < self.cooldown * 60)
+
+
+
+    def order(self,
+        sources : List[str], # Names of the Sources, in their static priority order
+        method  : str,       # Method to be called (e.g. 'search_scenes')
+    ) -> List[str]:          # Returns the Sources to try, in order
+        """
+        Order the Sources by their expected seconds until a successful call:
+        the median latency (or seconds per GB, for downloads) divided by the
+        success rate. Sources with an open circuit are skipped, unless all
+        Sources are open.
+        """
+        stats  = {source: self.stats(source, method) for source in sources}
+        costs  = {}
+        prior  = 0
+        for source in sources:
+            stat = stats[source]
+            if stat['calls'] >= self.min_calls and stat['success_rate']:
+                seconds = (1024 ** 3 / stat['bytes_per_sec'] if stat['bytes_per_sec'] else
+                           stat['p50_latency'] or 0)
+                prior   = seconds / stat['success_rate']
+            costs[source] = prior
+
+        closed = [source for source in sources if not self.is_open(stats[source])]
+        return sorted(closed or sources, key=lambda source: costs[source])
+
+
+
+    # ================================================================
+    # Private functions
+
+    @contextmanager
+    def _connect(self):
+        """ Connection to the shared database """
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        connection = sqlite3.connect(self.path.as_posix(), timeout=60, isolation_level=None)
+        try:
+            connection.execute('''CREATE TABLE IF NOT EXISTS calls (source TEXT, method TEXT,
+                                  time REAL, success INTEGER, latency REAL, bytes REAL)''')
+            connection.execute('CREATE INDEX IF NOT EXISTS calls_source ON calls (source, method, time)')
+            yield connection
+        finally: connection.close()
@@ -1,16 +1,21 @@
-from .BaseAbstract import BaseAbstract, BaseMeta
-from ...utils import Location, DatetimeRange, assert_contains
+from .BaseAbstract   import BaseAbstract, BaseMeta
+from .LimitedAdapter import LimitedAdapter
+from .RateLimiter    import RateLimiter
+from .StallMonitor import StallMonitor
+from ...exceptions import DownloadStallError, IncompleteDownloadError, RangeNotSupportedError
+from ...utils import Location, DatetimeRange, assert_contains, decompress_stream
 
 from requests.packages.urllib3.util.retry import Retry
-from requests.adapters import HTTPAdapter
 from requests import Session
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime as dt
 from pathlib import Path
-from typing import Union
+from typing import List, Optional, Union
 from lxml import etree
 from tqdm import tqdm 
+from tqdm.utils import CallbackIOWrapper
 
-import threading, requests
+import json, os, threading, time, requests
 
 
 # Dictionary mapping name to the respective search/download Source object
@@ -74,6 +79,12 @@ class BaseSource(Picklable, metaclass=BaseSourceMeta):
         i.e. {sensor: (start_datetime, end_datetime)}
     valid_sensor : iterable
         Contains sensors that are valid for this Source.
+    request_rate : float
+        Maximum HTTP requests per second made to this Source, 
+        shared across all worker processes.
+    download_limit : int
+        Maximum concurrent downloads from this Source,
+        shared across all worker processes.
     session  : Session
         Session object to make get / post requests.
 
@@ -88,16 +99,20 @@ class BaseSource(Picklable, metaclass=BaseSourceMeta):
       after the inheriting class __init__ is finished.
 
     """
-    site_url      = None # Root URL for this source
-    valid_dates   = {}   # Dict mapping sensor: valid start/end datetimes 
-    valid_sensors = None # Iterable that contains sensors valid for this Source
+    site_url       = None # Root URL for this source
+    valid_dates    = {}   # Dict mapping sensor: valid start/end datetimes 
+    valid_sensors  = None # Iterable that contains sensors valid for this Source
+    request_rate   = None # Requests per second allowed (None is unlimited)
+    download_limit = None # Concurrent downloads allowed (None is unlimited)
 
 
     def __init__(self, *args, retry_kwargs: dict = {}, **kwargs):
         """Initialize Session object for this Source.
             
         Initializes a requests.Session object for get / post request 
-        handling, using sensible defaults for the retry handler. 
+        handling, using sensible defaults for the retry handler. Every
+        request made through the session is limited to the Source's
+        request_rate (see limit_session).
 
         Alternative retry handler parameters can be passed via a 
         `retry_kwargs` dictionary. For docs and available parameters, see
@@ -120,15 +135,33 @@ class BaseSource(Picklable, metaclass=BaseSourceMeta):
         }
         default.update(retry_kwargs)
 
-        retries = Retry(**default)
-        adapter = HTTPAdapter(max_retries=retries)
-
-        self.session = Session()
-        self.session.mount('http://',  adapter)
-        self.session.mount('https://', adapter)
+        self.retries = Retry(**default)
+        self.session = self.limit_session(Session())
         
 
 
+    @property
+    def limiter(self) -> RateLimiter:
+        """ Rate limiter shared by all processes using this Source """
+        return RateLimiter(str(self), self.request_rate, concurrency=self.download_limit)
+
+
+
+    def limit_session(self, 
+        session : Session, # Session to limit to this Source's request rate
+    ) -> Session:          # Returns the same session
+        """ 
+        Mount an adapter on the session which takes a request token for
+        every HTTP request, so that sessions created by any third party
+        libraries (e.g. sentinelsat) are also held to the request rate
+        """
+        adapter = LimitedAdapter(self.limiter, max_retries=self.retries)
+        session.mount('http://',  adapter)
+        session.mount('https://', adapter)
+        return session
+
+
+
     def search_scenes(self, 
         sensor           : str,           # Sensor to search scenes for 
         location         : Location,      # Object representing location to search at
@@ -146,12 +179,29 @@ class BaseSource(Picklable, metaclass=BaseSourceMeta):
         scene_details : dict,             # Any additional details about the scene
         scene_folder  : Union[Path, str], # Folder which holds all downloaded scenes
         overwrite     : bool = False,     # Whether to overwrite an already existing file
+        members       : Optional[List[str]] = None, # Filename patterns of the archive members to extract (None extracts all)
     ) -> Path:                            # Return path to the downloaded scene
         """ Function which downloads the requested scene """
         raise NotImplementedError(f'{self}: download_scene not implemented')
 
 
 
+    def order_scenes(self, 
+        sensor       : str,              # Sensor which created these scenes
+        scenes       : dict,             # Scenes to order: {scene_id: scene_detail_dict}
+        scene_folder : Union[Path, str], # Folder which holds all downloaded scenes
+        overwrite    : bool = False,     # Whether to overwrite already existing files
+        members      : Optional[List[str]] = None, # Filename patterns of the archive members required
+    ) -> int:                            # Return the number of scenes ordered
+        """ 
+        Order the requested scenes ahead of downloading them. Only Sources 
+        which must prepare a scene before it can be downloaded implement 
+        this; any other Source is able to download scenes straight away.
+        """
+        return 0
+
+
+
     def filename(self, 
         scene_id : str,  # Filename the given scene ID should have once downloaded
     ) -> str:            # By default, it's just the scene ID itself
@@ -175,15 +225,65 @@ class BaseSource(Picklable, metaclass=BaseSourceMeta):
         scene_folder : Union[Path, str], # Folder which holds all downloaded scenes
         scene_id     : str,              # ID of the scene to download
         overwrite    : bool = False,     # Whether to overwrite an already existing file
+        members      : Optional[List[str]] = None, # Filename patterns of the archive members required
     ) -> (bool, Path):                   # Returns completion flag and output path
         """ 
         Get the output path for the download, as well as a flag
-        indicating if the download has already been completed
+        indicating if the download has already been completed. A
+        download which only extracted some of the archive members
+        is not complete if any other members are now required.
         """
         output   = Path(scene_folder).joinpath(scene_id)
-        complete = (not overwrite) and output.joinpath('.complete').exists() 
+        complete = (not overwrite) and self.is_complete(output, members)
         output.mkdir(parents=True, exist_ok=True)
         return complete, output
+
+
+
+    @classmethod
+    def is_complete(cls,
+        output  : Path,                       # Output path of the download
+        members : Optional[List[str]] = None, # Filename patterns of the archive members required
+        since   : Optional[float]     = None, # Timestamp the download must be completed after
+    ) -> bool:                                # Returns flag indicating if the download is complete
+        """ Check if the download has been completed, with all required archive members extracted """
+        marker = output.joinpath('.complete')
+        if not marker.exists() or (since is not None and marker.stat().st_mtime < since):
+            return False
+
+        extracted = cls.get_members(output)
+        return extracted is None or (members is not None and set(members) <= set(extracted))
+
+
+
+    @staticmethod
+    def get_members(
+        output : Path,         # Output path of the download
+    ) -> Optional[List[str]]:  # Returns the patterns extracted, or None if all members were
+        """ Filename patterns of the archive members which were extracted for the download """
+        manifest = output.joinpath('.members.json')
+        if manifest.exists():
+            with manifest.open() as f:
+                return json.load(f)
+
+
+
+    def mark_complete(self,
+        output  : Path,                       # Output path of the download
+        members : Optional[List[str]] = None, # Filename patterns of the archive members extracted
+    ) -> None:
+        """ 
+        Flag the download as complete, recording which archive members
+        were extracted. Members extracted by a previous download remain.
+        """
+        manifest = output.joinpath('.members.json')
+        if members is None:
+            manifest.unlink(missing_ok=True)
+        else:
+            extracted = self.get_members(output) or []
+            with manifest.open('w') as f:
+                json.dump(sorted(set(members) | set(extracted)), f)
+        output.joinpath('.complete').touch()
         
 
 
@@ -199,13 +299,130 @@ class BaseSource(Picklable, metaclass=BaseSourceMeta):
 
 
     def stream_download(self,
-        url        : str,         # URL to download from
-        archive    : Path,        # Path to download the file to
-        chunk_size : int = 1024,  # Size of chunks to iterate
-        show_pbar  : bool = True, # Show progress bar during download
-        **kwargs,                 # Session kwargs
+        url         : str,                # URL to download from
+        archive     : Path,               # Path to download the file to
+        chunk_size  : int  = 1024 ** 2,   # Size of chunks to iterate
+        show_pbar   : bool = True,        # Show progress bar during download
+        segments    : int  = 4,           # Maximum concurrent HTTP Range requests
+        min_segment : int  = 32 * 1024 ** 2, # Minimum bytes downloaded by each Range request
+        retries     : int  = 3,           # Attempts to resume an interrupted segment
+        **kwargs,                         # Session kwargs
+    ) -> None:
+        """ 
+        Download the file located at the given URL in chunks. If the server
+        supports Range requests, the file is split into segments which are
+        downloaded concurrently. Progress is kept alongside the '.part' file,
+        so that an interrupted download is resumed rather than restarted
+        (unless the file has since changed, according to its size and ETag).
+        A download which stalls (see StallMonitor) raises DownloadStallError,
+        leaving the progress to be resumed by a later attempt.
+        """
+        archive  = Path(archive)
+        partial  = archive.with_name(f'{archive.name}.part')
+        progress = archive.with_name(f'{archive.name}.part.json')
+        monitor  = StallMonitor(archive.name)
+        kwargs['timeout'] = monitor.timeout(kwargs.get('timeout', None))
+        chunk_size = monitor.chunk_size(chunk_size)
+
+        # Probe with a single byte Range request, which gives the file size (and
+        # ETag) if the server supports Ranges, or otherwise the full response
+        headers = dict(kwargs.get('headers', None) or {}, Range='bytes=0-0')
+        stream  = self._open_stream(url, **dict(kwargs, headers=headers, stream=True))
+        total   = stream.headers.get('Content-Range', '').split('/')[-1]
+        ranges  = stream.status_code == 206 and total.isdigit()
+        etag    = stream.headers.get('ETag', None)
+
+        if ranges:
+            size = int(total)
+            stream.close()
+        else:
+            size = stream.headers.get('Content-Length', None)
+            size = int(size) if size is not None else None
+        state = self._load_progress(progress, url, size, etag) if partial.exists() else None
+
+        pbar_kwargs = {
+            'total'        : size,
+            'unit_divisor' : 1024, 
+            'unit_scale'   : True,
+            'unit'         : 'B',
+            'leave'        : False,
+            'disable'      : not show_pbar,
+        }
+        with tqdm(**pbar_kwargs) as pbar, monitor.watch():
+            if ranges and (size >= 2 * min_segment or state is not None):
+                try: 
+                    if state is None:
+                        state = self._new_progress(url, size, etag, segments, min_segment)
+                        with partial.open('wb') as f: f.truncate(size)
+
+                    pbar.update(sum(done for _, _, done in state['segments']))
+                    self._download_segments(stream.url, partial, progress, state, 
+                                            chunk_size, retries, pbar, monitor, kwargs)
+
+                # Server advertises Range support, but doesn't honour it
+                except RangeNotSupportedError:
+                    pbar.reset()
+                    stream = self.session.get(stream.url, **kwargs)
+                    self._download_sequential(stream, partial, chunk_size, pbar, monitor)
+
+            # Probe only received the first byte of a file too small to segment
+            elif ranges:
+                stream = self.session.get(stream.url, **kwargs)
+                self._download_sequential(stream, partial, chunk_size, pbar, monitor)
+            else: 
+                self._download_sequential(stream, partial, chunk_size, pbar, monitor)
+
+        received = partial.stat().st_size
+        if size is not None and received != size:
+            raise IncompleteDownloadError(f'Received {received} of {size} bytes from {url}')
+
+        partial.replace(archive)
+        progress.unlink(missing_ok=True)
+
+
+
+    def stream_decompress(self,
+        url         : str,                # URL to download from
+        archive     : Union[Path, str],   # Filename of the archive, which determines its format
+        destination : Path,               # Path of the location to extract to
+        members     : Optional[List[str]] = None, # Filename patterns of the archive members to extract
+        show_pbar   : bool = True,        # Show progress bar during download
+        **kwargs,                         # Session kwargs
     ) -> None:
-        """ Download the file located at the given URL in chunks """
+        """ 
+        Download the archive located at the given URL, extracting it while 
+        it's being received. Only the extracted files are written to disk; 
+        see utils.decompress_stream for the archive formats supported.
+        """
+        monitor = StallMonitor(Path(archive).name)
+        kwargs['timeout'] = monitor.timeout(kwargs.get('timeout', None))
+        stream  = self._open_stream(url, **kwargs)
+        size   = stream.headers.get('Content-Length', None)
+
+        # Transparently undo any Content-Encoding applied by the server
+        stream.raw.decode_content = True
+
+        pbar_kwargs = {
+            'total'        : int(size) if size is not None else None,
+            'unit_divisor' : 1024, 
+            'unit_scale'   : True,
+            'unit'         : 'B',
+            'leave'        : False,
+            'disable'      : not show_pbar,
+        }
+        try:
+            raw = CallbackIOWrapper(monitor.update, stream.raw, 'read')
+            with tqdm.wrapattr(raw, 'read', **pbar_kwargs) as raw, monitor.watch():
+                decompress_stream(raw, Path(archive).name, Path(destination), members)
+        finally: stream.close()
+
+
+
+    # ================================================================
+    # Private functions
+
+    def _open_stream(self, url: str, **kwargs) -> requests.Response:
+        """ Open the response for the given URL, following any authorization redirect """
         stream = self.session.get(url, **kwargs)
         
         # Some sites have an authorization redirect that isn't followed
@@ -215,19 +432,128 @@ class BaseSource(Picklable, metaclass=BaseSourceMeta):
             stream.close()
             assert(len(url)), f'Error getting {self} authorization:\n{text}'
             stream = self.session.get(url[0].get('href'), **kwargs)  
-
-        pbar_kwargs = {
-            'total'        : int(stream.headers.get('Content-Length')),
-            'unit_divisor' : 1024, 
-            'unit_scale'   : True,
-            'unit'         : 'B',
-            'leave'        : False,
-            'disable'      : not show_pbar,
+        stream.raise_for_status()
+        return stream
+
+
+    @staticmethod
+    def _new_progress(url: str, size: int, etag: Optional[str], segments: int, min_segment: int) -> dict:
+        """ Split a download into byte ranges: [start, end (inclusive), bytes done] """
+        n_segments = max(1, min(segments, size // min_segment))
+        bounds     = [round(i * size / n_segments) for i in range(n_segments + 1)]
+        return {
+            'url'      : url,
+            'size'     : size,
+            'etag'     : etag,
+            'segments' : [[start, end - 1, 0] for start, end in zip(bounds, bounds[1:])],
         }
-        with tqdm(**pbar_kwargs) as pbar:
-            with archive.open('wb') as f:
+
+
+    @staticmethod
+    def _load_progress(progress: Path, url: str, size: int, etag: Optional[str]) -> dict:
+        """ 
+        Load the progress of a previous download of the same file, if any. 
+        Progress from a different URL, or of a file which has since changed
+        (i.e. its size or ETag differ), is discarded.
+        """
+        try:
+            with progress.open() as f:
+                state = json.load(f)
+            if (state['url'], state['size'], state.get('etag', None)) == (url, size, etag): 
+                return state
+        except Exception: pass
+
+
+    @staticmethod
+    def _save_progress(progress: Path, state: dict) -> None:
+        """ Save the download progress, ensuring a partial write is never seen """
+        temp = progress.with_name(f'.{progress.name}.{os.getpid()}.tmp')
+        with temp.open('w') as f:
+            json.dump(state, f)
+        temp.replace(progress)
+
+
+
+    def _download_sequential(self, stream, partial: Path, chunk_size: int, pbar, monitor: StallMonitor) -> None:
+        """ Download the full response over a single connection """
+        try:
+            with partial.open('wb') as f:
                 for chunk in stream.iter_content(chunk_size=chunk_size):
                     if chunk: 
                         f.write(chunk)
-                        pbar.update(chunk_size)
-        stream.close()
\ No newline at end of file
+                        pbar.update(len(chunk))
+                        monitor.update(len(chunk))
+        finally: stream.close()
+
+
+
+    def _download_segments(self, 
+        url        : str,   # URL to download from (after any redirects)
+        partial    : Path,  # Preallocated '.part' file to write to
+        progress   : Path,  # File to save the download progress to
+        state      : dict,  # Download progress, as created by _new_progress
+        chunk_size : int,   # Size of chunks to iterate
+        retries    : int,   # Attempts to resume an interrupted segment
+        pbar,               # Progress bar to update
+        monitor    : StallMonitor, # Monitor of the total throughput
+        kwargs     : dict,  # Session kwargs
+    ) -> None:
+        """ Download the remaining bytes of each segment concurrently """
+        lock  = threading.Lock()
+        saved = [time.time()]
+
+        def download(segment):
+            for attempt in range(retries + 1):
+                start, end, done = segment
+                if start + done > end: return
+
+                headers  = dict(kwargs.get('headers', None) or {}, Range=f'bytes={start + done}-{end}')
+                response = self.session.get(url, **dict(kwargs, headers=headers, stream=True))
+                try:
+                    if response.status_code != 206:
+                        raise RangeNotSupportedError(f'{url} returned {response.status_code} for a Range request')
+
+                    # Progress only counts the bytes this segment has flushed to disk, 
+                    # so that a resumed download never trusts bytes which were lost
+                    with partial.open('r+b') as f:
+                        f.seek(start + done)
+                        written, flushed = 0, time.time()
+                        try:
+                            for chunk in response.iter_content(chunk_size=chunk_size):
+                                if not chunk: continue
+                                f.write(chunk)
+                                written += len(chunk)
+
+                                with lock: pbar.update(len(chunk))
+                                if time.time() - flushed > 5:
+                                    written, flushed = self._flush_segment(f, segment, written, lock), time.time()
+                                    with lock:
+                                        if time.time() - saved[0] > 5:
+                                            self._save_progress(progress, state)
+                                            saved[0] = time.time()
+                                monitor.update(len(chunk))
+                        finally: self._flush_segment(f, segment, written, lock)
+                    if start + segment[2] > end: return
+
+                except (RangeNotSupportedError, DownloadStallError): raise 
+                except Exception:
+                    if attempt == retries: raise
+                finally: response.close()
+
+            raise IncompleteDownloadError(f'Segment {start}-{end} of {url} did not complete')
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(state['segments'])) as pool:
+                list(pool.map(download, state['segments']))
+        finally: 
+            with lock: self._save_progress(progress, state)
+
+
+
+    @staticmethod
+    def _flush_segment(f, segment: list, written: int, lock: threading.Lock) -> int:
+        """ Flush the bytes written by a segment to disk, before adding them to its progress """
+        f.flush()
+        os.fsync(f.fileno())
+        with lock: segment[2] += written
+        return 0
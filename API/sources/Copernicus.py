@@ -1,12 +1,16 @@
 from .BaseSource import BaseSource
+from .LTAStaging import LTAStaging
+from ...exceptions import ProductOfflineError
 from ...utils import Location, DatetimeRange, get_credentials, decompress
 
 from datetime import datetime as dt
 from functools import partial
 from pathlib import Path 
-from typing import Union 
+from typing import List, Optional, Union 
 
 from sentinelsat import SentinelAPI
+from sentinelsat.exceptions import LTAError, LTATriggered
+import time
 
 
 
@@ -25,12 +29,17 @@ class Copernicus(BaseSource, SentinelAPI):
         'MSI'  : 'Sentinel-2',
         'OLCI' : 'Sentinel-3',
     }
+    request_rate   = 1  # Requests per second
+    download_limit = 2  # Concurrent downloads; SciHub allows two per user
+    lta_timeout    = 24 # Hours after which a Long Term Archive retrieval is abandoned
 
 
     def __init__(self, *args, **kwargs):
         username, password = get_credentials(self.site_url)
         BaseSource.__init__(self, *args, **kwargs)
         SentinelAPI.__init__(self, username, password)
+        self.limit_session(self.session)
+        self.staging = LTAStaging('Copernicus')
         
 
     def _tqdm(self, **kwargs):
@@ -94,21 +103,87 @@ class Copernicus(BaseSource, SentinelAPI):
         scene_details : dict,             # Any additional details about the scene
         scene_folder  : Union[Path, str], # Folder which holds all downloaded scenes
         overwrite     : bool = False,     # Whether to overwrite an already existing file
+        members       : Optional[List[str]] = None, # Filename patterns of the archive members to extract (None extracts all)
     ) -> Path:                            # Return path to the downloaded scene
-        """ Download the requested scene from Copernicus """
-        complete, output = self.get_output(scene_folder, scene_id, overwrite)
+        """ 
+        Download the requested scene from Copernicus. If the scene is offline,
+        its retrieval from the Long Term Archive is triggered (if it hasn't
+        been already) and ProductOfflineError is raised, so that the download
+        can be retried once the retrieval has completed.
+        """
+        complete, output = self.get_output(scene_folder, scene_id, overwrite, members)
 
         if not complete:
-            self.download(**{
-                'id'              : scene_details['uuid'], 
-                'directory_path'  : output,
-                'checksum'        : False,
-            })
+            uuid = scene_details['uuid']
+            if self.stage(scene_id, uuid):
+                triggered = time.strftime('%Y-%m-%d %H:%M', time.localtime(self.staging.triggered(uuid)))
+                raise ProductOfflineError(f'{scene_id} is offline, with its retrieval triggered at {triggered}')
+
+            try:
+                self.download(**{
+                    'id'              : uuid, 
+                    'directory_path'  : output,
+                    'checksum'        : False,
+                })
+
+            # Product was moved to the archive after being staged
+            except LTATriggered:
+                self.staging.add(uuid, scene_id)
+                raise ProductOfflineError(f'{scene_id} is offline, with its retrieval now triggered')
 
             archive = output.joinpath(f'{scene_id}.zip')
-            decompress(archive, output)
-            output.joinpath('.complete').touch()
+            decompress(archive, output, members=members)
+            self.mark_complete(output, members)
         return output 
+
+
+
+    def order_scenes(self, 
+        sensor       : str,              # Sensor which created these scenes
+        scenes       : dict,             # Scenes to order: {scene_id: scene_detail_dict}
+        scene_folder : Union[Path, str], # Folder which holds all downloaded scenes
+        overwrite    : bool = False,     # Whether to overwrite already existing files
+        members      : Optional[List[str]] = None, # Filename patterns of the archive members required
+    ) -> int:                            # Return the number of scenes ordered
+        """ 
+        Trigger the Long Term Archive retrieval of every offline scene up 
+        front, so that all retrievals run concurrently rather than each 
+        only starting once its download is attempted
+        """
+        self.check_sensor(sensor)
+        ordered = 0
+        for scene_id, details in scenes.items():
+            if self.get_output(scene_folder, scene_id, overwrite, members)[0]: continue
+
+            # Any scenes left once the retrieval quota is reached are triggered when their download is attempted
+            try: ordered += self.stage(scene_id, details['uuid'])
+            except ProductOfflineError: break
+            except LTAError: continue
+        return ordered
+
+
+
+    def stage(self, 
+        scene_id : str, # ID of the scene
+        uuid     : str, # Copernicus ID of the scene's product
+    ) -> bool:          # Returns flag indicating if the product is offline
+        """ Ensure an offline product is being retrieved from the Long Term Archive """
+        if self.is_online(uuid):
+            self.staging.remove(uuid)
+            return False
+
+        triggered = self.staging.triggered(uuid)
+        if triggered is None:
+            try: self.trigger_offline_retrieval(uuid)
+            except LTAError as e:
+                raise ProductOfflineError(f'{scene_id} is offline, and its retrieval could not be triggered: {e}')
+            self.staging.add(uuid, scene_id)
+
+        # Retrieval never completed, so it's triggered again by the next attempt
+        elif (time.time() - triggered) > self.lta_timeout * 3600:
+            self.staging.remove(uuid)
+            raise LTAError(f'{scene_id} is still offline {self.lta_timeout} hours after its retrieval was triggered')
+        return True
         
 
 
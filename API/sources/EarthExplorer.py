@@ -1,11 +1,16 @@
 from .BaseSource import BaseSource
-from ...utils import Location, DatetimeRange, get_credentials, decompress
+from .StallMonitor import StallMonitor
+from ...exceptions import DownloadStallError
+from ...utils import Location, DatetimeRange, get_credentials, decompress, decompress_stream
+from ...utils.decompress import get_extension
+from ...utils.decompress_stream import STREAMABLE
 
 from datetime import datetime as dt
 from functools import partial
 from pathlib import Path 
-from typing import Union 
+from typing import List, Optional, Union 
 from tqdm import tqdm
+from tqdm.utils import CallbackIOWrapper
 
 from landsatxplore.util import guess_dataset, is_display_id
 from landsatxplore import earthexplorer
@@ -20,7 +25,7 @@ from landsatxplore.earthexplorer import (
 
 earthexplorer.tqdm = partial(earthexplorer.tqdm, leave=False)
 
-import requests, re, os
+import requests, re, os, time
 
 
 
@@ -56,7 +61,7 @@ class EE_Fixed(EE):
         assert(self.logged_in()), 'EarthExplorer login failed'
 
 
-    def download(self, identifier, output_dir, dataset=None, timeout=300, skip=False):
+    def download(self, identifier, output_dir, dataset=None, timeout=300, skip=False, destination=None, members=None):
         """ Scenes before a certain date use different IDs """
         os.makedirs(output_dir, exist_ok=True)
         if not dataset:
@@ -69,16 +74,20 @@ class EE_Fixed(EE):
             url = EE_DOWNLOAD_URL.format(
                 data_product_id=DATA_PRODUCTS[dataset], entity_id=entity_id
             )
-            filename = self._download(url, output_dir, timeout=timeout, skip=skip)
+            filename = self._download(url, output_dir, timeout=timeout, skip=skip, destination=destination, members=members)
+
+        # Stalled Source fails over to the next one, rather than trying another product URL
+        except DownloadStallError: raise
         except:
             url = EE_DOWNLOAD_URL.format(
                 data_product_id=self.DATA_PRODUCTS_II[dataset], entity_id=entity_id
             )
-            filename = self._download(url, output_dir, timeout=timeout, skip=skip)
+            filename = self._download(url, output_dir, timeout=timeout, skip=skip, destination=destination, members=members)
         return filename
 
-    def _download(self, url, output_dir, timeout, chunk_size=1024, skip=False):
-        """Download remote file given its URL."""
+    def _download(self, url, output_dir, timeout, chunk_size=1024, skip=False, destination=None, members=None):
+        """Download remote file given its URL, or extract it into destination while 
+        downloading (returning None) if one is given and the archive is streamable."""
         # Check availability of the requested product
         # EarthExplorer should respond with JSON
         with self.session.get(
@@ -90,9 +99,11 @@ class EE_Fixed(EE):
                 raise EarthExplorerError(error_msg)
             download_url = r.json().get("url")
 
+        # Abort (rather than wait on) a download which is throttled to a trickle
+        monitor = StallMonitor(url)
         try:
-            with self.session.get(
-                download_url, stream=True, allow_redirects=True, timeout=timeout
+            with monitor.watch(), self.session.get(
+                download_url, stream=True, allow_redirects=True, timeout=monitor.timeout(timeout)
             ) as r:
                 file_size = int(r.headers.get("Content-Length"))
                 with tqdm(
@@ -110,11 +121,18 @@ class EE_Fixed(EE):
 
                     if skip:
                         return local_filename
+
+                    if destination is not None and get_extension(local_filename) in STREAMABLE:
+                        r.raw.decode_content = True
+                        raw = CallbackIOWrapper(lambda n: (pbar.update(n), monitor.update(n)), r.raw, 'read')
+                        decompress_stream(raw, local_filename, Path(destination), members)
+                        return None
                     with open(local_filename, "wb") as f:
                         for chunk in r.iter_content(chunk_size=chunk_size):
                             if chunk:
                                 f.write(chunk)
                                 pbar.update(chunk_size)
+                                monitor.update(len(chunk))
         except requests.exceptions.Timeout:
             raise EarthExplorerError(
                 "Connection timeout after {} seconds.".format(timeout)
@@ -123,6 +141,87 @@ class EE_Fixed(EE):
 
 
 
+class M2MBatch:
+    """
+    Downloads of many scenes, ordered with a single M2M download-request
+    rather than by checking the availability of each scene separately:
+
+        batch = M2MBatch(api)
+        batch.order('landsat_ot_c2_l1', entity_ids)
+        urls  = batch.urls() # {entity_id: url} of the ready downloads
+
+    Scenes are ordered in chunks of at most `chunk_size`, keeping each request
+    within the limits of the M2M API. Orders are labelled, so that any process
+    using the same account is able to find the URL of an ordered scene with a
+    single download-retrieve request for the whole batch, which is cached for
+    `refresh` seconds.
+
+    Docs: https://m2m.cr.usgs.gov/api/docs/reference/#download-request
+    """
+    label = 'MatchupPipeline' # Label of the orders placed
+
+    def __init__(self, 
+        api        : API,         # M2M API to make requests with
+        refresh    : float = 60,  # Seconds the URLs of ready downloads are cached for
+        chunk_size : int   = 250, # Maximum number of scenes in each M2M request
+    ):
+        self.api        = api
+        self.refresh    = refresh
+        self.chunk_size = chunk_size
+        self.ready      = {}
+        self.updated    = 0
+
+
+    def __str__(self):
+        return f'M2MBatch({self.label})'
+
+
+    def __repr__(self):
+        return str(self)
+
+
+
+    def order(self, 
+        dataset    : str,       # Dataset the scenes belong to
+        entity_ids : List[str], # Entity IDs of the scenes to order
+    ) -> int:                   # Returns the number of scenes ordered
+        """ Request the downloads of the scene product bundles which are available """
+        entity_ids = list(entity_ids)
+        n_ordered  = 0
+        for i in range(0, len(entity_ids), self.chunk_size):
+            options  = self.api.request('download-options', params={
+                'datasetName' : dataset,
+                'entityIds'   : entity_ids[i : i + self.chunk_size],
+            }) or []
+
+            # First available option is the scene bundle; any others are individual files
+            products = {}
+            for option in options:
+                if option.get('available') and option['entityId'] not in products:
+                    products[option['entityId']] = option['id']
+
+            if len(products):
+                self.api.request('download-request', params={
+                    'label'     : self.label,
+                    'downloads' : [{'entityId': entity_id, 'productId': product_id}
+                                   for entity_id, product_id in products.items()],
+                })
+            n_ordered += len(products)
+        return n_ordered
+
+
+
+    def urls(self, refresh: bool = False) -> dict:
+        """ URLs of the ordered downloads which are ready: {entity_id: url} """
+        if refresh or (time.time() - self.updated) > self.refresh:
+            result = self.api.request('download-retrieve', params={'label': self.label}) or {}
+            self.ready   = {download['entityId']: download['url'] 
+                            for download in result.get('available', []) if download.get('url')}
+            self.updated = time.time()
+        return self.ready
+
+
+
 class EarthExplorer(BaseSource, API):   
     """
     API to search and download from EarthExplorer
@@ -140,12 +239,17 @@ class EarthExplorer(BaseSource, API):
         'ETM' : (dt(1999,  4, 15), dt(2021,  9, 27)),
         'TM'  : (dt(1984,  3,  1), dt(2013,  6,  5)),
     }
+    request_rate   = 1 # Requests per second
+    download_limit = 4 # Concurrent downloads
 
     def __init__(self, *args, **kwargs):
         username, password = get_credentials(self.site_url)
         self.ee = EE_Fixed(username, password)
         BaseSource.__init__(self, *args, **kwargs)
         API.__init__(self, username, password)
+        self.limit_session(self.session)
+        self.limit_session(self.ee.session)
+        self.batch = M2MBatch(self)
 
 
 
@@ -196,16 +300,73 @@ class EarthExplorer(BaseSource, API):
         scene_details : dict,             # Any additional details about the scene
         scene_folder  : Union[Path, str], # Folder which holds all downloaded scenes
         overwrite     : bool = False,     # Whether to overwrite an already existing file
+        members       : Optional[List[str]] = None, # Filename patterns of the archive members to extract (None extracts all)
     ) -> Path:                            # Return path to the downloaded scene
-        """ Downloads the requested scene from EarthExplorer """
-        complete, output = self.get_output(scene_folder, scene_id, overwrite)
+        """ 
+        Downloads the requested scene from EarthExplorer, using the URL of 
+        a batch order (see order_scenes) if the scene has already been ordered
+        """
+        complete, output = self.get_output(scene_folder, scene_id, overwrite, members)
 
         if not complete:
-            assert(self.ee.logged_in()), 'EarthExplorer session expired.'
-
-            archive = self.ee.download(scene_id, output)
-            decompress(Path(archive), output) 
-            output.joinpath('.complete').touch()
+            try:    url = self.batch.urls().get(scene_details.get('entity_id', None))
+            except Exception: url = None
+
+            if url is not None:
+                self.download_url(url, output, scene_id, members)
+            else:
+                assert(self.ee.logged_in()), 'EarthExplorer session expired.'
+
+                archive = self.ee.download(scene_id, output, destination=output, members=members)
+                if archive is not None: 
+                    decompress(Path(archive), output, members=members) 
+            self.mark_complete(output, members)
         return output
 
 
+
+    def order_scenes(self, 
+        sensor       : str,              # Sensor which created these scenes
+        scenes       : dict,             # Scenes to order: {scene_id: scene_detail_dict}
+        scene_folder : Union[Path, str], # Folder which holds all downloaded scenes
+        overwrite    : bool = False,     # Whether to overwrite already existing files
+        members      : Optional[List[str]] = None, # Filename patterns of the archive members required
+    ) -> int:                            # Return the number of scenes ordered
+        """ Order all scenes which aren't yet downloaded with a single M2M download-request """
+        self.check_sensor(sensor)
+        pending = [scene_id for scene_id in scenes 
+                   if not self.get_output(scene_folder, scene_id, overwrite, members)[0]]
+        if not len(pending): return 0
+
+        entity_ids = self.get_entity_ids(sensor, pending, [scenes[s] for s in pending])
+        return self.batch.order(self.valid_sensors[sensor], list(entity_ids.values()))
+
+
+
+    def download_url(self, 
+        url      : str,                 # Ready M2M download URL of the scene
+        output   : Path,                # Scene output folder
+        scene_id : str,                 # ID of the scene being downloaded
+        members  : Optional[List[str]], # Filename patterns of the archive members to extract
+    ) -> None:
+        """ Download the scene's product bundle (a .tar archive) and extract it """
+        archive = output.joinpath(f'{scene_id}.tar')
+        self.stream_download(url, archive, stream=True, allow_redirects=True, timeout=300)
+        decompress(archive, output, members=members)
+
+
+
+    def get_entity_ids(self, 
+        sensor        : str,        # Sensor which created these scenes
+        scene_ids     : List[str],  # Display IDs of the scenes
+        scene_details : List[dict], # Details of each scene, as returned by search_scenes
+    ) -> dict:                      # Returns {scene_id: entity_id}
+        """ Entity IDs of the scenes, looking up any which aren't in the scene details """
+        entity_ids = {scene_id: details.get('entity_id', None) 
+                      for scene_id, details in zip(scene_ids, scene_details)}
+        missing    = [scene_id for scene_id, entity_id in entity_ids.items() if entity_id is None]
+        for scene_id in missing:
+            entity_ids[scene_id] = self.get_entity_id(scene_id, self.valid_sensors[sensor])
+        return entity_ids
+
+
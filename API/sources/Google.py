@@ -3,13 +3,19 @@ from ...AC.atm_utils import execute_cmd
 from ...utils import Location, DatetimeRange
 
 from pathlib import Path 
-from typing import Union 
+from typing import List, Optional, Union 
+import fnmatch
 
 
 class Google(BaseSource):
     """
     API to download from Google Cloud (no search available)
 
+    Downloads are limited by the rate limits below (see BaseSource.request_rate
+    / download_limit), and only copy the files which the AC methods read (see
+    get_archive_members), due to issues with too much data being downloaded 
+    on Pardees.
+
     Docs: 
         https://cloud.google.com/storage/docs/public-datasets/landsat
         https://cloud.google.com/storage/docs/public-datasets/sentinel-2
@@ -20,6 +26,8 @@ class Google(BaseSource):
         'TM'  : 'landsat',
         'MSI' : 'sentinel-2',
     }
+    request_rate   = 2 # Requests per second
+    download_limit = 2 # Concurrent downloads, to limit the volume of data in flight
 
     def download_scene(self, 
         sensor        : str,              # Sensor which created this scene
@@ -27,41 +35,83 @@ class Google(BaseSource):
         scene_details : dict,             # Any additional details about the scene
         scene_folder  : Union[Path, str], # Folder which holds all downloaded scenes
         overwrite     : bool = False,     # Whether to overwrite an already existing file
+        members       : Optional[List[str]] = None, # Filename patterns of the scene files to copy (None copies all)
     ) -> Path:                            # Return path to the downloaded scene
-        """ Downloads the requested scene from Google Cloud """
+        """ 
+        Downloads the requested scene from Google Cloud. Only the files 
+        matching the member patterns (i.e. those which the AC methods read) 
+        are copied.
+        """
         self.check_sensor(sensor)
-        
-        complete, output = self.get_output(scene_folder, scene_id, overwrite)
+
+        complete, output = self.get_output(scene_folder, scene_id, overwrite, members)
 
         if not complete:
-            root_path   = Path(__file__).parent.joinpath('gsutil')
-            exec_path   = root_path.joinpath('gsutil').as_posix()
-            config_path = root_path.joinpath('gsutil_config').as_posix()
-            search_path = 'gs://gcp-public-data-{bucket}/{search}'.format(**{
-                'bucket' : self.valid_sensors[sensor],
-                'search' : get_params(sensor, scene_id)['search'],
-            })
-
-            cmd = [exec_path, '-m']
-            env = {'BOTO_PATH': config_path}
-
-            # Need to verify the available file is able to be atmospherically corrected
-            if sensor == 'MSI':
-                code, out, err = execute_cmd(cmd + ['ls', search_path], env)
-                assert(code == 0), err
-
-                is_valid = lambda f: '_OPER_' not in Path(f).name
-                filelist   = out.split('\n')
-                assert(len(filelist)), f'No files found via Google with key "{search_path}"'
-                assert(all(map(is_valid, filelist))), f'Google is hosting old version of tile with key "{search_path}"'
-
-            code, out, err = execute_cmd(cmd + ['cp', '-r', search_path, output.as_posix()], env)
-            assert(code == 0), err
-            output.joinpath('.complete').touch()
+            params = get_params(sensor, scene_id)
+            if sensor == 'MSI': 
+                self.check_available(sensor, params['search'])
+
+            # Landsat folders are named by scene id, whereas MSI .SAFE folders are within the scene output
+            destination = output.parent if sensor != 'MSI' else output
+            self.rsync(sensor, params['root'], params['folder'], destination, members)
+
+            assert(any(f.is_file() for f in output.rglob('*'))), f'No files copied from Google for {scene_id}'
+            self.mark_complete(output, members)
         return output
 
 
 
+    def gsutil(self, 
+        args : List[str], # Arguments passed to gsutil
+    ) -> str:             # Returns the command output
+        """ Execute gsutil with the packaged config, taking a request token for each call """
+        root_path   = Path(__file__).parent.joinpath('gsutil')
+        exec_path   = root_path.joinpath('gsutil').as_posix()
+        config_path = root_path.joinpath('gsutil_config').as_posix()
+
+        with self.limiter.limit():
+            code, out, err = execute_cmd([exec_path, '-m'] + args, {'BOTO_PATH': config_path}, raise_e=False)
+        assert(code == 0), err
+        return out
+
+
+
+    def check_available(self, 
+        sensor : str, # Sensor which created the scene
+        search : str, # Search path of the scene within the bucket
+    ) -> None:
+        """ Need to verify the available file is able to be atmospherically corrected """
+        search_path = f'gs://gcp-public-data-{self.valid_sensors[sensor]}/{search}'
+        is_valid    = lambda f: '_OPER_' not in Path(f).name
+        filelist    = self.gsutil(['ls', search_path]).split('\n')
+        assert(len(filelist)), f'No files found via Google with key "{search_path}"'
+        assert(all(map(is_valid, filelist))), f'Google is hosting old version of tile with key "{search_path}"'
+
+
+
+    def rsync(self,
+        sensor      : str,                 # Sensor which created the scene
+        root        : str,                 # Bucket folder which contains the scene folder
+        folder      : str,                 # Pattern of the scene folder within root
+        destination : Path,                # Local folder the scene folder is copied to
+        members     : Optional[List[str]], # Filename patterns of the scene files to copy
+    ) -> None:
+        """ 
+        Copy the given scene folder within the bucket root, with only the
+        files matching the member patterns. gsutil rsync only excludes files
+        (by a regex of their path relative to root), so everything other 
+        than the requested files is excluded.
+        """
+        as_regex = lambda patterns: '|'.join(fnmatch.translate(p).replace('\\Z', '') for p in patterns)
+        include  = f'(?:{as_regex([folder])})/(?:.*/)?(?:{as_regex(members or ["*"])})$'
+        exclude  = f'^(?!{include}).*'
+
+        source = f'gs://gcp-public-data-{self.valid_sensors[sensor]}/{root}'
+        destination.mkdir(parents=True, exist_ok=True)
+        self.gsutil(['rsync', '-r', '-x', exclude, source, destination.as_posix()])
+
+
+
 def get_params(sensor : str, scene_id : str):
     """ Get the parameters for different sensors """
 
@@ -74,7 +124,8 @@ def get_params(sensor : str, scene_id : str):
             'prefix'     : f'{sat}/01/{path}/{row}/{scene_id}/',
             'maxResults' : 20,      
             'search'     : f'{sat}/01/{path}/{row}/{scene_id}/',
-
+            'root'       : f'{sat}/01/{path}/{row}/',
+            'folder'     : scene_id,
         }
 
     def get_params_MSI(scene_id : str):
@@ -85,10 +136,13 @@ def get_params(sensor : str, scene_id : str):
         band = zone_band_grid[3:4]
         grid = zone_band_grid[4:]
         sid  = f'{scene_id}.SAFE'
+        safe = f'{sat}_{level}_{date.split("T")[0]}T*_{id1}_{id2}_{zone_band_grid}_*.SAFE'
         return {
             'prefix'     : f'tiles/{zone}/{band}/{grid}/{sid}/',
             'maxResults' : 300,
-            'search'     : f'tiles/{zone}/{band}/{grid}/{sat}_{level}_{date.split("T")[0]}T*_{id1}_{id2}_{zone_band_grid}_*.SAFE/'
+            'search'     : f'tiles/{zone}/{band}/{grid}/{safe}/',
+            'root'       : f'tiles/{zone}/{band}/{grid}/',
+            'folder'     : safe,
         }
 
     # Parsers for each sensor
@@ -2,7 +2,7 @@ from .BaseSource import BaseSource
 from ...utils import Location, DatetimeRange, get_credentials, decompress
 
 from pathlib import Path 
-from typing import Union 
+from typing import List, Optional, Union 
 from lxml import etree 
 
 
@@ -20,6 +20,7 @@ class LAADS(BaseSource):
         'MERIS' : 'EN1_MDSI_MER_FRS_1P', #level 1 B
         'OLCI'  : 'S3A_OL_1_EFR,S3B_OL_1_EFR',
     }
+    download_limit = 4 # Concurrent downloads
 
 
     def search_scenes(self, 
@@ -70,9 +71,10 @@ class LAADS(BaseSource):
         scene_details : dict,             # Any additional details about the scene
         scene_folder  : Union[Path, str], # Folder which holds all downloaded scenes
         overwrite     : bool = False,     # Whether to overwrite an already existing file
+        members       : Optional[List[str]] = None, # Filename patterns of the archive members to extract (None extracts all)
     ) -> Path:                            # Return path to the downloaded scene
         """ Function which downloads the requested scene """
-        complete, output = self.get_output(scene_folder, scene_id, overwrite)
+        complete, output = self.get_output(scene_folder, scene_id, overwrite, members)
 
         if not complete:    
             archive = output.joinpath(scene_details['name'])
@@ -92,8 +94,8 @@ class LAADS(BaseSource):
                 })
 
                 try: 
-                    decompress(archive, output)
-                    output.joinpath('.complete').touch()
+                    decompress(archive, output, members=members)
+                    self.mark_complete(output, members)
 
                 # Track failed urls with a blacklist
                 except Exception as e: 
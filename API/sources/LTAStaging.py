@@ -0,0 +1,101 @@
+from ... import config
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Union
+import sqlite3, time
+
+
+
+class LTAStaging:
+    """Offline products being retrieved from a Long Term Archive, shared by all processes.
+
+    Products which are no longer online must be retrieved from the archive
+    before they can be downloaded, which can take hours. The retrieval of
+    each product is recorded in a SQLite table when it's triggered, so that
+    it's only triggered once across every worker process, and so that a
+    retrieval which never completes can be given up on:
+
+        staging = LTAStaging('Copernicus')
+        if not api.is_online(uuid):
+            if staging.triggered(uuid) is None:
+                api.trigger_offline_retrieval(uuid)
+                staging.add(uuid, scene_id)
+            raise ProductOfflineError(scene_id)
+        staging.remove(uuid)
+
+    """
+
+    def __init__(self,
+        source : str,                # Name of the Source the products are retrieved from
+        path   : Union[Path, str] = config.scratch_path.joinpath('State', 'lta_staging.db'),
+    ):
+        self.source = source
+        self.path   = Path(path)
+
+
+    def __str__(self):
+        return f'LTAStaging({self.source})'
+
+
+    def __repr__(self):
+        return str(self)
+
+
+
+    def add(self,
+        product  : str, # ID of the product being retrieved
+        scene_id : str, # ID of the scene the product contains
+    ) -> None:
+        """ Record that the product's retrieval has been triggered """
+        with self._connect() as db:
+            db.execute('INSERT OR REPLACE INTO staging VALUES (?, ?, ?, ?)',
+                       (self.source, product, scene_id, time.time()))
+
+
+
+    def remove(self,
+        product : str, # ID of the product
+    ) -> None:
+        """ Remove the product, once it's online or its retrieval is abandoned """
+        if not self.path.exists(): return
+        with self._connect() as db:
+            db.execute('DELETE FROM staging WHERE source=? AND product=?', (self.source, product))
+
+
+
+    def triggered(self,
+        product : str,    # ID of the product
+    ) -> Optional[float]: # Returns the time the retrieval was triggered, or None if it wasn't
+        """ Time at which the product's retrieval was triggered """
+        if not self.path.exists(): return
+        with self._connect() as db:
+            row = db.execute('SELECT triggered FROM staging WHERE source=? AND product=?',
+                             (self.source, product)).fetchone()
+        return row[0] if row is not None else None
+
+
+
+    def pending(self) -> dict:
+        """ Products currently being retrieved: {product: scene_id} """
+        if not self.path.exists(): return {}
+        with self._connect() as db:
+            rows = db.execute('SELECT product, scene_id FROM staging WHERE source=?',
+                              (self.source,)).fetchall()
+        return dict(rows)
+
+
+
+    # ================================================================
+    # Private functions
+
+    @contextmanager
+    def _connect(self):
+        """ Connection to the shared database """
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        connection = sqlite3.connect(self.path.as_posix(), timeout=60, isolation_level=None)
+        try:
+            connection.execute('''CREATE TABLE IF NOT EXISTS staging (source TEXT, product TEXT,
+                                  scene_id TEXT, triggered REAL, PRIMARY KEY (source, product))''')
+            yield connection
+        finally: connection.close()
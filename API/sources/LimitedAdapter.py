@@ -0,0 +1,35 @@
+from .RateLimiter import RateLimiter
+
+from requests.adapters import HTTPAdapter
+from typing import Optional
+
+
+
+class LimitedAdapter(HTTPAdapter):
+    """
+    HTTPAdapter which takes a request token from the given RateLimiter
+    before sending each request, so that a Source's request rate applies
+    to every HTTP request made through a session (including those made
+    by a paginated search, redirects followed by requests, or each
+    segment of a ranged download):
+
+        session.mount('https://', LimitedAdapter(limiter, max_retries=retries))
+
+    """
+    __attrs__ = HTTPAdapter.__attrs__ + ['limiter']
+
+    def __init__(self,
+        limiter : Optional[RateLimiter] = None, # Limiter shared by all requests (None is unlimited)
+        **kwargs,                               # Any other kwargs given to the HTTPAdapter
+    ):
+        self.limiter = limiter
+        super().__init__(**kwargs)
+
+
+    def send(self, request, **kwargs):
+        """ Wait for a request token before sending the request """
+        if self.limiter is None:
+            return super().send(request, **kwargs)
+
+        with self.limiter.limit():
+            return super().send(request, **kwargs)
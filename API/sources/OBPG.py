@@ -1,9 +1,11 @@
 from .BaseSource import BaseSource
 from ...utils import Location, DatetimeRange, get_credentials, decompress
+from ...utils.decompress import get_extension
+from ...utils.decompress_stream import STREAMABLE
 
 from datetime import datetime as dt
 from pathlib import Path 
-from typing import Union 
+from typing import List, Optional, Union 
 from lxml import etree
 
 
@@ -55,6 +57,8 @@ class OBPG(BaseSource):
         'CZCS'    : 'czcs',
         'HAWK'    : 'hawk',           # HawkEye (SeaHawk)
     }
+    request_rate   = 0.5 # Requests per second; OBPG throttles automated requests
+    download_limit = 2   # Concurrent downloads
 
 
     def __init__(self, *args, **kwargs):
@@ -146,21 +150,27 @@ class OBPG(BaseSource):
         scene_details : dict,             # Any additional details about the scene
         scene_folder  : Union[Path, str], # Folder which holds all downloaded scenes
         overwrite     : bool = False,     # Whether to overwrite an already existing file
+        members       : Optional[List[str]] = None, # Filename patterns of the archive members to extract (None extracts all)
     ) -> Path:                            # Return path to the downloaded scene
         """ Download the requested scene from OBPG """
-        complete, output = self.get_output(scene_folder, scene_id, overwrite)
+        complete, output = self.get_output(scene_folder, scene_id, overwrite, members)
 
         if not complete:
             def download_suffix(suffix):
                 dl_url  = f'{self.data_url}/ob/getfile/{scene_id}.{suffix}'
                 suffix  = suffix.replace('GEO-M_SNPP.nc', 'L1A_SNPP.GEO')
                 archive = output.joinpath(f'{scene_id}.{suffix}')
-
-                self.stream_download(dl_url, archive, **{
+                kwargs  = {
                     'stream'          : True,
                     'allow_redirects' : True,
                     'timeout'         : 60 * 25,
-                })
+                }
+
+                # Extract while downloading, rather than writing the archive first
+                if get_extension(archive) in STREAMABLE:
+                    return self.stream_decompress(dl_url, archive, output, **kwargs)
+                
+                self.stream_download(dl_url, archive, **kwargs)
                 return archive
 
             suffixes =  {
@@ -175,9 +185,12 @@ class OBPG(BaseSource):
             for suffix in suffixes[sensor]:
                 archive = download_suffix(suffix)
 
-            if sensor in ['MOD', 'OLCI', 'HICO', 'MERIS']:
-                decompress(archive, output)
-            output.joinpath('.complete').touch()
+            # Members are only selected from zip archives
+            extracted = None
+            if sensor in ['OLCI', 'MERIS']:
+                decompress(archive, output, members=members)
+                extracted = members
+            self.mark_complete(output, extracted)
         return output
         
 
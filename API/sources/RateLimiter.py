@@ -0,0 +1,151 @@
+from ... import config
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Union
+import os, socket, sqlite3, threading, time, uuid
+
+
+
+class RateLimiter:
+    """Request rate and concurrent download limits shared by all processes.
+
+    Requests are limited via a token bucket which refills at `rate` tokens
+    per second (holding at most `burst` tokens), with a token taken for 
+    each individual request (see LimitedAdapter). Downloads are separately
+    limited to one of `concurrency` slots for their duration. All state is
+    kept in a SQLite database, so the limits apply across every worker 
+    process using the same database path:
+
+        limiter = RateLimiter('Google', rate=1, concurrency=2)
+
+        with limiter.limit():    # Wait for a request token
+            session.get(url)
+
+        with limiter.download(): # Wait for a download slot
+            download()
+
+    """
+
+    def __init__(self,
+        name        : str,                         # Name of the limited resource
+        rate        : Optional[float] = None,      # Requests per second (None is unlimited)
+        burst       : float           = 1,         # Maximum requests made at once
+        concurrency : Optional[int]   = None,      # Concurrent downloads (None is unlimited)
+        path        : Union[Path, str] = config.scratch_path.joinpath('State', 'rate_limits.db'),
+        stale       : float           = 6 * 3600,  # Seconds after which a held slot is abandoned
+        poll        : float           = 1,         # Maximum seconds between checking for a slot
+    ):
+        self.name        = name
+        self.rate        = rate
+        self.burst       = max(burst, 1)
+        self.concurrency = concurrency
+        self.path        = Path(path)
+        self.stale       = stale
+        self.poll        = poll
+
+
+    def __str__(self):
+        return f'RateLimiter({self.name}, rate={self.rate}, concurrency={self.concurrency})'
+
+
+    def __repr__(self):
+        return str(self)
+
+
+
+    @contextmanager
+    def limit(self):
+        """ Block until a request token is available """
+        self._acquire_token()
+        yield
+
+
+
+    @contextmanager
+    def download(self):
+        """ Block until a download slot is available, holding it until exiting """
+        slot = self._acquire_slot()
+        try:
+            yield
+        finally: 
+            if slot is not None: self._release_slot(slot)
+
+
+
+    # ================================================================
+    # Private functions
+
+    @contextmanager
+    def _transaction(self):
+        """ Exclusive transaction on the shared database """
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        connection = sqlite3.connect(self.path.as_posix(), timeout=60, isolation_level=None)
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute('CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+            connection.execute('CREATE TABLE IF NOT EXISTS slots (name TEXT, owner TEXT, acquired REAL)')
+            yield connection
+            connection.execute('COMMIT')
+        except:
+            connection.execute('ROLLBACK')
+            raise
+        finally: connection.close()
+
+
+
+    def _acquire_token(self):
+        """ Wait until a token is available in the bucket, and take it """
+        if self.rate is None: return 
+
+        while True:
+            with self._transaction() as db:
+                now = time.time()
+                row = db.execute('SELECT tokens, updated FROM buckets WHERE name=?', (self.name,)).fetchone()
+                tokens, updated = row or (self.burst, now)
+                tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+                acquired = tokens >= 1
+                db.execute('REPLACE INTO buckets VALUES (?, ?, ?)', (self.name, tokens - acquired, now))
+
+            if acquired: return
+            time.sleep(min(self.poll, (1 - tokens) / self.rate))
+
+
+
+    def _acquire_slot(self) -> Optional[str]:
+        """ Wait until a download slot is available, and take it """
+        if self.concurrency is None: return 
+
+        owner = f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}:{uuid.uuid4().hex}'
+        while True:
+            with self._transaction() as db:
+                now = time.time()
+                for slot, acquired in db.execute('SELECT owner, acquired FROM slots WHERE name=?', (self.name,)).fetchall():
+                    if (now - acquired) > self.stale or not self._alive(slot):
+                        db.execute('DELETE FROM slots WHERE owner=?', (slot,))
+
+                count, = db.execute('SELECT COUNT(*) FROM slots WHERE name=?', (self.name,)).fetchone()
+                if count < self.concurrency:
+                    db.execute('INSERT INTO slots VALUES (?, ?, ?)', (self.name, owner, now))
+                    return owner
+            time.sleep(self.poll)
+
+
+
+    def _release_slot(self, owner: str):
+        """ Return the download slot taken by `owner` """
+        with self._transaction() as db:
+            db.execute('DELETE FROM slots WHERE owner=?', (owner,))
+
+
+
+    @staticmethod
+    def _alive(owner: str) -> bool:
+        """ Check if the process holding a slot still exists (if it's on this node) """
+        host, pid = owner.split(':')[:2]
+        if host != socket.gethostname(): return True
+        try:    os.kill(int(pid), 0)
+        except ProcessLookupError: return False
+        except Exception: pass
+        return True
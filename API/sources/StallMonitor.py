@@ -0,0 +1,108 @@
+from ... import config
+from ...exceptions import DownloadStallError
+
+from collections import deque
+from contextlib import contextmanager
+from typing import Tuple, Union
+import threading, time, requests, urllib3
+
+
+
+class StallMonitor:
+    """Throughput of a download, measured over a sliding window.
+
+    Every chunk received is recorded, and once the download has been running
+    for at least `window` seconds, the rate over the most recent window must
+    remain above `min_rate` - otherwise the download is considered stalled:
+
+        monitor = StallMonitor(url)
+        with monitor.watch():
+            for chunk in response.iter_content(monitor.chunk_size(1024 ** 2)):
+                monitor.update(len(chunk)) # Raises DownloadStallError when stalled
+
+    A single monitor is shared by every connection of a segmented download,
+    so that it's the total throughput which must remain above the minimum.
+    A slow (but not stalled) download therefore isn't aborted, while a
+    connection which is throttled to a trickle fails over to the next
+    Source rather than blocking the worker for hours.
+
+    """
+
+    def __init__(self,
+        label    : str   = 'Download',                         # Name of the download, used in errors
+        min_rate : float = config.download_min_rate * 1024,    # Minimum bytes per second (0 disables)
+        window   : float = config.download_stall_window,       # Seconds over which throughput is measured
+    ):
+        self.label    = label
+        self.min_rate = min_rate
+        self.window   = window
+        self.start    = time.time()
+        self.chunks   = deque()
+        self.lock     = threading.Lock()
+
+
+    def __str__(self):
+        return f'StallMonitor({self.label}, {self.min_rate / 1024:.1f} KB/s over {self.window}s)'
+
+
+    def __repr__(self):
+        return str(self)
+
+
+
+    def update(self, n_bytes: int) -> None:
+        """ Record the bytes received, raising DownloadStallError if the download has stalled """
+        if not self.min_rate: return
+
+        now = time.time()
+        with self.lock:
+            self.chunks.append((now, n_bytes))
+            while self.chunks[0][0] < now - self.window:
+                self.chunks.popleft()
+
+            if now - self.start < self.window: return
+            rate = sum(n for _, n in self.chunks) / self.window
+
+        if rate < self.min_rate:
+            raise DownloadStallError(f'{self.label} stalled at {rate / 1024:.1f} KB/s over the '
+                                     f'last {self.window}s (minimum is {self.min_rate / 1024:.1f} KB/s)')
+
+
+    def chunk_size(self, chunk_size: int) -> int:
+        """ Limit the chunk size, so that several chunks arrive per window even at the minimum rate """
+        if not self.min_rate: return chunk_size
+        return max(1024, min(chunk_size, int(self.min_rate * self.window / 4)))
+
+
+    def timeout(self,
+        timeout : Union[None, float, Tuple[float, float]], # Session timeout given for the request
+    ) -> Union[None, float, Tuple[float, float]]:
+        """ Limit the read timeout to the window, as receiving nothing for that long is a stall """
+        if not self.min_rate: return timeout
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        return (connect, self.window if read is None else min(read, self.window))
+
+
+    @contextmanager
+    def watch(self):
+        """ Raise a read timeout (i.e. no bytes received within the window) as a stall """
+        try: yield
+        except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError) as e:
+            if self.min_rate and self._is_read_timeout(e):
+                raise DownloadStallError(f'{self.label} stalled, receiving nothing for {self.window}s') from e
+            raise
+
+
+
+    # ================================================================
+    # Private functions
+
+    @staticmethod
+    def _is_read_timeout(e: Exception) -> bool:
+        """ 
+        Read timeouts are raised by urllib3 when reading the raw response, and
+        as a ConnectionError by requests when iterating its content
+        """
+        if isinstance(e, (requests.exceptions.ReadTimeout, urllib3.exceptions.ReadTimeoutError)): return True
+        reason = e.args[0] if len(e.args) else None
+        return isinstance(reason, urllib3.exceptions.ReadTimeoutError)
@@ -2,10 +2,13 @@ from ...tests import test_function, get_results_path
 from ...utils import Location, DatetimeRange
 from .. import API
 from . import SOURCES
+from .BaseSource import BaseSource
+from .EarthExplorer import M2MBatch
 
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from tempfile import TemporaryDirectory
 from pathlib import Path 
-import json
+import io, json, tarfile, threading
 
 
 @test_function
@@ -59,9 +62,98 @@ def download_scene(Source, sensor, **kwargs):
 
 
 
+class M2MStandIn(BaseHTTPRequestHandler):
+    """ Local stand-in for the M2M download endpoints, with each order ready on the second retrieve """
+    retrieved = {}
+
+    def log_message(self, *args): pass
+
+    def do_GET(self):
+        endpoint = self.path.strip('/')
+        length   = int(self.headers.get('Content-Length', 0))
+        params   = json.loads(self.rfile.read(length) or 'null') or {}
+        base_url = f'http://{self.headers["Host"]}'
+
+        if endpoint.startswith('files/'):
+            return self.respond(self.bundle(endpoint.split('/')[-1]), 'application/x-tar')
+
+        if endpoint == 'download-options':
+            data = [{'entityId': e, 'id': f'bundle_{e}', 'available': True} for e in params['entityIds']]
+            data+= [{'entityId': e, 'id': f'band_{e}', 'available': True} for e in params['entityIds']]
+
+        elif endpoint == 'download-request':
+            for download in params['downloads']:
+                assert(download['productId'] == f'bundle_{download["entityId"]}'), download
+                self.retrieved[download['entityId']] = 0
+            data = {'availableDownloads': [], 'preparingDownloads': []}
+
+        elif endpoint == 'download-retrieve':
+            for entity_id in self.retrieved:
+                self.retrieved[entity_id] += 1
+            data = {'available': [{'entityId': e, 'url': f'{base_url}/files/{e}'} 
+                                  for e, n in self.retrieved.items() if n > 1]}
+        else: 
+            return self.send_error(404)
+        self.respond(json.dumps({'data': data, 'errorCode': None}).encode(), 'application/json')
+
+    def respond(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def bundle(entity_id):
+        """ Product bundle of the scene, containing a band and its metadata """
+        with io.BytesIO() as buffer:
+            with tarfile.open(fileobj=buffer, mode='w') as tar:
+                for name in [f'{entity_id}_B1.TIF', f'{entity_id}_MTL.txt']:
+                    info = tarfile.TarInfo(name)
+                    info.size = len(entity_id)
+                    tar.addfile(info, io.BytesIO(entity_id.encode()))
+            return buffer.getvalue()
+
+
+
+@test_function
+def download_batch(Source, sensor, **kwargs):
+    """ Test ordering scenes in M2M batches and downloading them by URL, via a local stand-in for M2M """
+    if Source is not SOURCES['EarthExplorer']:
+        raise NotImplementedError(f'{Source.__name__} does not order scenes in batches')
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), M2MStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    # Avoid logging in; only the batch requests are made
+    source = object.__new__(Source)
+    BaseSource.__init__(source)
+    source.url   = f'http://127.0.0.1:{server.server_port}/'
+    source.batch = M2MBatch(source, refresh=0, chunk_size=2)
+
+    scenes = {f'SCENE_{i}': {'entity_id': f'ENTITY{i}'} for i in range(3)}
+    try:
+        with TemporaryDirectory() as tmpdir:
+            ordered = source.order_scenes(sensor, scenes, Path(tmpdir), members=['*_B1.TIF'])
+            assert(ordered == len(scenes)), ordered
+
+            # Orders are ready on the second retrieve, after which each scene uses its order's URL
+            ready = [len(source.batch.urls()) for _ in range(2)]
+            assert(ready == [0, len(scenes)]), ready
+            outputs = [source.download_scene(sensor, scene_id, details, Path(tmpdir), members=['*_B1.TIF'])
+                       for scene_id, details in scenes.items()]
+            files   = sorted(f.name for output in outputs for f in output.glob('*'))
+            assert(all(output.joinpath('.complete').exists() for output in outputs)), files
+    finally: 
+        server.shutdown()
+    return files, f'Downloaded {len(outputs)} scenes ordered in batches'
+
+
+
 def get_tests():
     sensors   = list(API.keys())
-    functions = [search_scenes, download_scene]
+    functions = [search_scenes, download_scene, download_batch]
     configs   = {
         'Test 1' : {
             'location' : Location(lon=-76, lat=37),
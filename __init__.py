@@ -37,15 +37,20 @@ app.amqp.kwargsrepr_maxsize = 32768
 
 # Set task routes
 app.conf.task_routes = {
-   'search'  : {'queue': 'search'},
-   'correct' : {'queue': 'correct'},
-   'extract' : {'queue': 'extract'},
-   'write'   : {'queue': 'write'},
+   'search'   : {'queue': 'search'},
+   'locate'   : {'queue': 'locate'},
+   'locate_cluster' : {'queue': 'locate'},
+   'download' : {'queue': 'search'},
+   'correct'  : {'queue': 'correct'},
+   'extract'  : {'queue': 'extract'},
+   'fan_out'  : {'queue': 'extract'},
+   'write'    : {'queue': 'write'},
 }
 
 from kombu import Exchange, Queue
 app.conf.task_queues = [
     Queue('search',  Exchange('search'),  routing_key='search',  queue_arguments={'x-max-priority': 10}),
+    Queue('locate',  Exchange('locate'),  routing_key='locate',  queue_arguments={'x-max-priority': 10}),
     Queue('correct', Exchange('correct'), routing_key='correct', queue_arguments={'x-max-priority': 10}),
     Queue('extract', Exchange('extract'), routing_key='extract', queue_arguments={'x-max-priority': 10}),
     Queue('write',   Exchange('write'),   routing_key='write',   queue_arguments={'x-max-priority': 10}),
@@ -5,10 +5,12 @@ from pathlib import Path
 import pandas as pd
 import numpy as np
 
-from .tasks import create_extraction_pipeline, CeleryManager
+from .tasks import create_extraction_pipeline, create_scene_grouped_pipeline
+from .tasks import CeleryManager, LocalManager, iter_samples, submit_samples
 from .utils import pretty_print, color
-from .utils import Location, DatetimeRange
+from .utils import Location, DatetimeRange, SharedConfig, PayloadStore, SceneCache
 from .parameters import get_args
+from .plan import create_plan, execute_plan
 
 
 
@@ -166,7 +168,14 @@ def main():
     global_config = gc = get_args()
     print(f'\nRunning pipeline with parameters: {pretty_print(gc.__dict__)}\n')
 
-    pipeline = create_extraction_pipeline(gc)
+    # Config is saved once, rather than serialized into every task message
+    global_config = gc = SharedConfig.create(gc, gc.output_path.joinpath('.shared'))
+
+    # Payloads from any previous run are no longer referenced by a task
+    PayloadStore.from_config(gc).clear()
+
+    pipeline = (create_scene_grouped_pipeline(gc) if gc.scene_grouped else 
+                create_extraction_pipeline(gc))
 
     data = load_insitu_data(gc)
     data = filter_completed(gc, data)
@@ -185,7 +194,7 @@ def main():
     worker_kws = [
         # Multiple threads for search
         {   'logname'     : 'worker1',
-            'queues'      : ['search', 'correct', 'extract', 'celery'],
+            'queues'      : ['search', 'locate', 'correct', 'extract', 'celery'],
             'concurrency' : 3,
         },
         # Multiple threads for correction
@@ -205,14 +214,30 @@ def main():
         },
     ]
     
-    with CeleryManager(worker_kws, data, gc.ac_methods) as manager:
-        for i, row in data.iterrows():
-            #row['location'] = Location(lat=47.443, lon=-61.8168)
-            #print(row)
-            #print()
-            #print('Running:',manager.running())
-            pipeline.delay(row.to_dict())
-            # if i >= 10: break
+    autoscale = None if not gc.autoscale else {
+        'cpus'      : gc.autoscale_cpus,
+        'memory'    : gc.autoscale_memory,
+        'downloads' : gc.autoscale_downloads,
+    }
+
+    prefetch = None if not gc.prefetch else {
+        'cache'       : SceneCache.from_config(gc),
+        'ahead'       : gc.prefetch_ahead,
+        'cache_limit' : gc.prefetch_cache_limit,
+    }
+
+    Manager = LocalManager if gc.backend == 'local' else CeleryManager
+    with Manager(worker_kws, data, gc.ac_methods, autoscale=autoscale, prefetch=prefetch) as manager:
+        if gc.plan is not None:
+            plan = create_plan(gc, data)
+            if not gc.plan_only:
+                execute_plan(gc, plan, data)
+
+        elif gc.scene_grouped:
+            pipeline(list(iter_samples(data)))
+
+        else:
+            submit_samples(pipeline, data)
 
 
 if __name__ == '__main__':
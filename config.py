@@ -19,11 +19,35 @@ insitu_path  = scratch_path.joinpath('Insitu')
 output_path  = scratch_path.joinpath('Gathered')
 
 
+#===================================
+#    Pipeline Execution Parameters
+#===================================
+backend = 'celery' # Execution backend: 'celery' (workers via RabbitMQ) or 'local' (in-process pools)
+autoscale_cpus      = os.cpu_count() # Total worker processes the autoscaler can allocate
+autoscale_memory    = None # GB of memory the autoscaler can allocate (None uses all system memory)
+autoscale_downloads = 4    # Maximum worker processes which can download scenes at once
+prefetch_ahead      = 8    # Scenes kept downloaded ahead of atmospheric correction (with --prefetch)
+prefetch_cache_limit = 0.9 # Fraction of scene_cache_gb which scenes waiting to be processed can use before downloads pause
+source_breaker_failures = 3  # Consecutive failures after which a Source is skipped
+source_breaker_cooldown = 15 # Minutes a failing Source is skipped for, before being tried again
+download_min_rate     = 50  # KB/s a download must sustain before failing over to the next Source (0 disables)
+download_stall_window = 120 # Seconds over which download throughput is measured
+payload_threshold   = 4096 # Bytes at which values are passed between tasks by handle, rather than through the broker (0 disables)
+
+
 #===================================
 #    Data Search Parameters
 #===================================  
 max_cloud_cover = 100 #Max cloud cover for downloading/processing.
 search_day_window = 1
+scene_cache_gb    = 100 # GB of disk space for downloaded scenes, before the least recently used are removed
+scene_ref_timeout = 24  # Hours after which a sample's claim on a scene is considered abandoned
+search_cache_ttl  = 168 # Hours that search results are reused, rather than searching again (0 disables)
+search_empty_ttl  = 1   # Hours that searches which found no scenes are reused (0 disables)
+search_cluster_area = 10000 # max km^2 of the bounding box searched at once for nearby samples on the same day (0 disables)
+search_hedge_percentile = 95 # Percentile of a Source's search latency after which the next Source is raced (with --search_hedge)
+search_hedge_delay      = 10 # Seconds before racing the next Source, until a Source's latencies are known
+lta_retry_delay = 30 # Minutes before retrying the download of a scene being retrieved from a Long Term Archive
 
 
 #===================================
@@ -31,6 +55,7 @@ search_day_window = 1
 #===================================
 ac_timeout = 30 # number of minutes an AC processor can run before being terminated
 ac_methods = ['acolite'] # Atmospheric Correction methods to apply
+ac_cluster_area = 10000  # max km^2 of the bounding box corrected for a cluster of samples within a scene
 
 #===================================
 #    Data Extraction Parameters
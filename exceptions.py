@@ -45,4 +45,26 @@ class MultipleSensorsError(Exception):
 
 class FetchAPIError(Exception):
     """ Raised when all Sources fail for an API method """
+    pass
+
+
+class IncompleteDownloadError(Exception):
+    """ Raised when a download ends before the expected number of bytes is received """
+    pass
+
+
+class RangeNotSupportedError(Exception):
+    """ Raised when a server ignores an HTTP Range request """
+    pass
+
+
+
+class DownloadStallError(Exception):
+    """ Raised when a download's throughput falls below the minimum rate """
+    pass
+
+
+
+class ProductOfflineError(Exception):
+    """ Raised when a product is offline, while it's retrieved from a Long Term Archive """
     pass
\ No newline at end of file
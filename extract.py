@@ -3,6 +3,7 @@ from itertools import compress
 from pathlib import Path 
 from netCDF4 import Dataset
 from geopy import distance
+from scipy.spatial import cKDTree
 import numpy as np 
 
 from .utils import get_latlon 
@@ -72,46 +73,85 @@ def get_variables(data : Dataset) -> dict:
 
 
 
-def get_window(
-        lat    : float,      # Point latitude
-        lon    : float,      # Point longitude
-        im_lat : np.ndarray, # Image latitude
-        im_lon : np.ndarray, # Image longitude
-        window : int,        # Pixel window around center point
-    ) -> np.ndarray:
+def to_unit_vectors(
+        lat : np.ndarray, # Latitude in degrees
+        lon : np.ndarray, # Longitude in degrees
+    ) -> np.ndarray:      # Returns (N, 3) array of cartesian coordinates
+    """ 
+    Convert lat/lon to points on the unit sphere, such that euclidean
+    distance increases monotonically with the great circle distance 
     """
-    Return a window around the closest pixel to (lat, lon),
-    where window=1 -> 3x3 window; 2 -> 5x5; 0 -> 1x1; etc.
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack([
+        np.cos(lat) * np.cos(lon),
+        np.cos(lat) * np.sin(lon),
+        np.sin(lat),
+    ], axis=-1)
+
+
+
+def get_windows(
+        points     : list,       # List of (lat, lon) points
+        im_lat     : np.ndarray, # Image latitude
+        im_lon     : np.ndarray, # Image longitude
+        window     : int,        # Pixel window around center point
+        candidates : int = 16,   # Nearest pixels considered for each point
+    ) -> list:
+    """
+    Return a window around the closest pixel to each (lat, lon) point,
+    where window=1 -> 3x3 window; 2 -> 5x5; 0 -> 1x1; etc. All points
+    are located in a single vectorized spatial index query, and each 
+    point's nearest candidate pixels are then refined by their physical
+    distance. Points have empty windows if no pixel has a valid location.
 
     Can pass flattened im_lon/im_lat arrays (i.e. filtered by 
     valid pixels only) to get the closest valid points, rather
     than a strict NxN window.
     """
     shape  = im_lon.shape
-    im_lon = im_lon.flatten()
-    im_lat = im_lat.flatten()
-
-    # For efficiency, we first approximate the actual distance by finding the 1000 closest
-    # pixels according to a total absolute degrees error metric. The actual physical distances
-    # between these 1000 points and the target coordinates are then calculated, with the 
-    # smallest physical distance (in meters) image coordinate being used as the window center
-    pseudo_dist = (np.abs(im_lat - lat) + np.abs(im_lon - lon)).argsort()[:1000]
-    distances   = [meters_distance((ilat, ilon), (lat, lon)) for ilat, ilon in
-                    zip(im_lat[pseudo_dist], im_lon[pseudo_dist])]
-
-    # If the passed image lon/lat arrays are 2d grids, then we return a strict NxN window around the center
-    if len(shape) == 2:
-        min_dist = np.argmin(distances)
-        w_center = np.unravel_index(pseudo_dist[min_dist], shape)
-        w_slices = slice(-window, window+1)
-        return np.array(w_center) + np.mgrid[w_slices, w_slices].reshape((2, -1)).T
+    im_lon = np.ma.filled(np.ma.asarray(im_lon, dtype=float), np.nan).flatten()
+    im_lat = np.ma.filled(np.ma.asarray(im_lat, dtype=float), np.nan).flatten()
+    valid  = np.flatnonzero(np.isfinite(im_lat) & np.isfinite(im_lon))
+    points = np.asarray(points, dtype=float).reshape((-1, 2))
+    if not len(valid): return [[] for _ in points]
 
-    # Otherwise, we return the closest image points, regardless of location relative to one another 
     n_samples = (2*window + 1) ** 2
-    min_dists = np.argsort(distances)[:n_samples]
-    return [pseudo_dist[i] for i in min_dists]
+    n_nearest = min(max(candidates, 1 if len(shape) == 2 else n_samples), len(valid))
+    tree      = cKDTree(to_unit_vectors(im_lat[valid], im_lon[valid]))
+    _, nearest = tree.query(to_unit_vectors(*points.T), k=n_nearest)
+    nearest    = valid[np.reshape(nearest, (len(points), -1))]
+
+    w_slices = slice(-window, window+1)
+    offsets  = np.mgrid[w_slices, w_slices].reshape((2, -1)).T
+    windows  = []
+    for (lat, lon), pixels in zip(points, nearest):
+        distances = [meters_distance((ilat, ilon), (lat, lon)) for ilat, ilon in
+                        zip(im_lat[pixels], im_lon[pixels])]
+
+        # If the image lon/lat arrays are 2d grids, then we return a strict NxN window around the center
+        if len(shape) == 2:
+            w_center = np.unravel_index(pixels[np.argmin(distances)], shape)
+            windows.append(np.array(w_center) + offsets)
+
+        # Otherwise, we return the closest image points, regardless of location relative to one another 
+        else:
+            min_dists = np.argsort(distances)[:n_samples]
+            windows.append([pixels[i] for i in min_dists])
+    return windows
+
 
 
+def get_window(
+        lat    : float,      # Point latitude
+        lon    : float,      # Point longitude
+        im_lat : np.ndarray, # Image latitude
+        im_lon : np.ndarray, # Image longitude
+        window : int,        # Pixel window around center point
+    ) -> np.ndarray:
+    """ Return a window around the closest pixel to (lat, lon) (see get_windows) """
+    [w_idxs] = get_windows([(lat, lon)], im_lat, im_lon, window)
+    return w_idxs
+
 
 
 def extract_window(
@@ -122,6 +162,21 @@ def extract_window(
     window   : int,   # Size of window to extract (e.g. 1 -> 3x3)
 ) -> dict:            # Returns dict of {all variables : window}
     """ Extract geolocated window from the given netCDF file """
+    [extracted] = extract_windows(sensor, inp_file, [(lat, lon)], window)
+    return extracted
+
+
+
+def extract_windows(
+    sensor   : str,   # Satellite sensor
+    inp_file : Path,  # Path to the netCDF input file 
+    points   : list,  # Center (lat, lon) of each window to extract
+    window   : int,   # Size of window to extract (e.g. 1 -> 3x3)
+) -> list:            # Returns the extract_window result for each point
+    """ 
+    Extract geolocated windows for many points from the given netCDF file,
+    opening the file and reading each of its variables only once
+    """
     assert(inp_file.exists()), f'Input file {inp_file} does not exist'
 
     with Dataset(inp_file.as_posix(), 'r') as data:
@@ -132,43 +187,57 @@ def extract_window(
         if 'geophysical_data' in data.groups.keys():
             data = data['geophysical_data']
         datavars = get_variables(data)
-        img_idxs = get_window(lat, lon, *latlons, window=window)
         w_slices = slice(-window, window+1)
-        raw_idxs = np.mgrid[w_slices, w_slices].reshape((2, -1)).T
-
-        # Filter to only valid (in bound) pixels
-        raw_idxs = list( compress(raw_idxs, map(in_bound, img_idxs)) )
-        img_idxs = list( compress(img_idxs, map(in_bound, img_idxs)) )
-        extract  = lambda feature: [feature[tuple(i)] for i in img_idxs] 
-        w_coords = list( map(extract, latlons) )
-
-        # Location variables are stored both separately and together.
-        # They are stored together for compatibility purposes, and new
-        # code should use the single variable storage version.
-        pt_distance = lambda loc: meters_distance(tuple(loc), (lat, lon))
-        vars_bands  = {}
-        vars_single = {
-            'window_lat'  : w_coords[0],
-            'window_lon'  : w_coords[1],
-            'window_dist' : list(map(pt_distance, zip(*w_coords) )),
-            'window_idxs' : list(map(str, map(tuple, raw_idxs))),
-        }
-        vars_double = { 'loc' : list(zip(*[vars_single[f'window_{k}'] 
-                            for k in ['lat', 'lon', 'dist', 'idxs']])) }
 
-        # Extract and store all remaining variables 
+        results = []
+        windows = []
+        for (lat, lon), img_idxs in zip(points, get_windows(points, *latlons, window=window)):
+            raw_idxs = np.mgrid[w_slices, w_slices].reshape((2, -1)).T
+
+            # Filter to only valid (in bound) pixels
+            raw_idxs = list( compress(raw_idxs, map(in_bound, img_idxs)) )
+            img_idxs = list( compress(img_idxs, map(in_bound, img_idxs)) )
+            extract  = lambda feature, idxs=img_idxs: [feature[tuple(i)] for i in idxs] 
+            w_coords = list( map(extract, latlons) )
+
+            # Location variables are stored both separately and together.
+            # They are stored together for compatibility purposes, and new
+            # code should use the single variable storage version.
+            pt_distance = lambda loc, lat=lat, lon=lon: meters_distance(tuple(loc), (lat, lon))
+            vars_bands  = {}
+            vars_single = {
+                'window_lat'  : w_coords[0],
+                'window_lon'  : w_coords[1],
+                'window_dist' : list(map(pt_distance, zip(*w_coords) )),
+                'window_idxs' : list(map(str, map(tuple, raw_idxs))),
+            }
+            vars_double = { 'loc' : list(zip(*[vars_single[f'window_{k}'] 
+                                for k in ['lat', 'lon', 'dist', 'idxs']])) }
+            results.append( (vars_bands, vars_single, vars_double) )
+            windows.append( extract )
+
+        # Extract and store all remaining variables, reading each only once
         for key, values in datavars.items():
 
             # Multi-key variable
             if type(values) is list:
-                names, vars_bands[f'{key}_bands'] = zip(*values)
-                feature_window   = [extract(data[n][:]) for n in names]
-                vars_double[key] = list(zip(*feature_window))
+                names, bands   = zip(*values)
+                feature_window = [[] for _ in windows]
+                for name in names:
+                    feature = data[name][:]
+                    for point_window, extract in zip(feature_window, windows):
+                        point_window.append( extract(feature) )
+
+                for (vars_bands, _, vars_double), point_window in zip(results, feature_window):
+                    vars_bands[f'{key}_bands'] = bands
+                    vars_double[key] = list(zip(*point_window))
 
             # Single key variable
             else:
-                vars_single[key] = extract(data[key][:])
-                if data[key].ndim == 3:
-                    vars_single[key] = list(map(list, vars_single[key]))
+                feature = data[key][:]
+                for (_, vars_single, _), extract in zip(results, windows):
+                    vars_single[key] = extract(feature)
+                    if data[key].ndim == 3:
+                        vars_single[key] = list(map(list, vars_single[key]))
 
-    return vars_bands, vars_single, vars_double
+    return results
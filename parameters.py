@@ -39,6 +39,73 @@ parser.add_argument('--overwrite', action='store_true',
     help='Redownload and correct scenes already saved\n(default: False)')
 
 
+#===================================
+#    Pipeline Execution Parameters
+#===================================
+execution_parameters = parser.add_argument_group(
+    'Pipeline Execution Parameters',
+    'Set any parameters associated with how the pipeline is executed',
+)
+
+execution_parameters.add_argument('--backend', type=str,
+    default=config.backend, choices=['celery', 'local'],
+    help='Backend which executes the pipeline tasks: celery workers via the\n'+
+         'broker, or local thread / process pools which need no outside services\n'+
+         '(default: %(default)s)')
+
+execution_parameters.add_argument('--scene_grouped', action='store_true',
+    help='Resolve samples to scenes first, and download / correct each scene\n'+
+         'only once for all samples it contains\n(default: False)')
+
+execution_parameters.add_argument('--plan', type=str, nargs='?', const='',
+    help='Search for every sample up front and save the resulting execution\n'+
+         'plan at the given path, before executing it scene by scene. An\n'+
+         'existing plan is resumed rather than searching samples again\n'+
+         '(default path: <output_path>/plan.json)')
+
+execution_parameters.add_argument('--plan_only', action='store_true',
+    help='Only create the execution plan, without executing it\n(default: False)')
+
+execution_parameters.add_argument('--autoscale', action='store_true',
+    help='Grow and shrink the worker pools according to the number of\n'+
+         'tasks waiting in each queue, within the budgets below\n(default: False)')
+
+execution_parameters.add_argument('--autoscale_cpus', type=int,
+    default=config.autoscale_cpus,
+    help='Total worker processes the autoscaler can allocate\n(default: %(default)s)')
+
+execution_parameters.add_argument('--autoscale_memory', type=float,
+    default=config.autoscale_memory,
+    help='GB of memory the autoscaler can allocate\n(default: system memory)')
+
+execution_parameters.add_argument('--autoscale_downloads', type=int,
+    default=config.autoscale_downloads,
+    help='Maximum worker processes which can download scenes at once\n'+
+         '(default: %(default)s)')
+
+execution_parameters.add_argument('--prefetch', action='store_true',
+    help='Keep a number of scenes downloaded ahead of atmospheric correction,\n'+
+         'pausing the search queue whenever more are waiting to be corrected\n'+
+         'or the scene cache is full\n(default: False)')
+
+execution_parameters.add_argument('--prefetch_ahead', type=int,
+    default=config.prefetch_ahead,
+    help='Scenes to keep downloaded ahead of atmospheric correction\n'+
+         '(default: %(default)s)')
+
+execution_parameters.add_argument('--prefetch_cache_limit', type=float,
+    default=config.prefetch_cache_limit,
+    help='Fraction of the scene cache budget which scenes waiting to be\n'+
+         'processed can use, before downloads are paused\n(default: %(default)s)')
+
+execution_parameters.add_argument('--payload_threshold', type=int,
+    default=config.payload_threshold,
+    help='Size (bytes) at which large task results (e.g. scene details,\n'+
+         'extracted windows) are saved to <output_path>/Payloads and passed\n'+
+         'between tasks by handle, rather than through the broker. 0 disables\n'+
+         '(default: %(default)s)')
+
+
 #===================================
 #    Data Search Parameters
 #===================================  
@@ -57,6 +124,58 @@ dt_range.add_argument('--search_minute_window', type=int,
     help='Number of minutes surrounding an in situ sample to match\n'+
     'Only one of search_day_window or search_minute_window can be set')
 
+search_parameters.add_argument('--scene_cache_gb', type=float,
+    default=config.scene_cache_gb,
+    help='GB of disk space downloaded scenes can use, before the least\n'+
+         'recently used scenes which no sample still needs are removed\n'+
+         '(default: %(default)s)')
+
+search_parameters.add_argument('--scene_ref_timeout', type=float,
+    default=config.scene_ref_timeout,
+    help='Hours after which a sample\'s claim on a scene is considered\n'+
+         'abandoned, allowing the scene to be removed\n(default: %(default)s)')
+
+search_parameters.add_argument('--search_cache_ttl', type=float,
+    default=config.search_cache_ttl,
+    help='Hours that search results are cached and reused by identical\n'+
+         'searches, including across reruns (0 disables)\n(default: %(default)s)')
+
+search_parameters.add_argument('--search_empty_ttl', type=float,
+    default=config.search_empty_ttl,
+    help='Hours that searches which found no scenes are cached, as\n'+
+         'scenes can still be published later (0 disables)\n(default: %(default)s)')
+
+search_parameters.add_argument('--search_cluster_area', type=float,
+    default=config.search_cluster_area,
+    help='Maximum area (km^2) of the bounding box searched at once when\n'+
+         'locating scenes up front (--scene_grouped / --plan). Nearby\n'+
+         'samples on the same day share a single search, with the scenes\n'+
+         'found assigned by footprint (0 disables)\n(default: %(default)s)')
+
+search_parameters.add_argument('--search_hedge', action='store_true',
+    help='Race the next search Source in parallel whenever the current one\n'+
+         'is slow, fails, or finds nothing; the first Source to find any\n'+
+         'scenes is used\n(default: False)')
+
+search_parameters.add_argument('--search_hedge_percentile', type=float,
+    default=config.search_hedge_percentile,
+    help='Percentile of a Source\'s recent search latencies after which the\n'+
+         'next Source is raced\n(default: %(default)s)')
+
+search_parameters.add_argument('--search_hedge_delay', type=float,
+    default=config.search_hedge_delay,
+    help='Seconds after which the next Source is raced, while a Source\'s\n'+
+         'latencies are still unknown\n(default: %(default)s)')
+
+search_parameters.add_argument('--search_hedge_merge', action='store_true',
+    help='Wait for all raced Sources, and merge the scenes they find\n(default: False)')
+
+search_parameters.add_argument('--lta_retry_delay', type=float,
+    default=config.lta_retry_delay,
+    help='Minutes before retrying the download of an offline scene, while\n'+
+         'it\'s retrieved from a Long Term Archive (e.g. Copernicus LTA);\n'+
+         'other scenes continue downloading in the meantime\n(default: %(default)s)')
+
 
 #===================================
 # Atmospheric Correction Parameters
@@ -86,6 +205,13 @@ ac_parameters.add_argument('--ac_timeout',  type=int,
          'Timeout can also be set for AC processors individually, by using '+
          'the --ac_kwargs flag')
 
+ac_parameters.add_argument('--ac_cluster_area', type=float,
+    default=config.ac_cluster_area,
+    help='Maximum area (km^2) of the bounding box corrected at once when\n'+
+         'running grouped by scene. Nearby samples are clustered into a\n'+
+         'single AC run, while distant samples are corrected separately\n'+
+         '(default: %(default)s)')
+
 
 #===================================
 #    Data Extraction Parameters
@@ -121,6 +247,10 @@ def get_args(kwargs={}, use_cmdline=True, **kwargs2):
     args.output_path  = Path(args.output_path)
     if getattr(args, 'search_minute_window', None) is not None:
         args.search_day_window = None
+    if getattr(args, 'plan_only', False) and getattr(args, 'plan', None) is None:
+        args.plan = ''
+    if getattr(args, 'plan', None) is not None:
+        args.plan = Path(args.plan or args.output_path.joinpath('plan.json'))
 
     # Perform some validation checks
     for ac in args.ac_methods: 
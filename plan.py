@@ -0,0 +1,304 @@
+from .tasks import locate_scenes, group_by_scene, process_scenes, iter_samples
+from .tasks.search import get_archive_members
+from .utils import pretty_print, color, get_scene_size, SceneIndex
+from . import API
+
+from collections import Counter
+from argparse import Namespace
+from datetime import date, datetime as dt
+from pathlib import Path
+from shapely import wkt
+from shapely.geometry.base import BaseGeometry
+from typing import Any, Optional
+import pandas as pd
+import json
+
+
+
+def encode_value(value: Any) -> Any:
+    """ 
+    Encode the values json can't represent (i.e. those within scene details),
+    tagged with their type so that they can be decoded when a plan is loaded
+    """
+    if isinstance(value, dt):           return {'__type__': 'datetime', 'value': value.isoformat()}
+    if isinstance(value, date):         return {'__type__': 'date',     'value': value.isoformat()}
+    if isinstance(value, BaseGeometry): return {'__type__': 'geometry', 'value': value.wkt}
+    return str(value)
+
+
+
+def decode_value(value: dict) -> Any:
+    """ Decode any value which was tagged with its type by encode_value """
+    if set(value) != {'__type__', 'value'}:
+        return value
+    return {
+        'datetime' : dt.fromisoformat,
+        'date'     : date.fromisoformat,
+        'geometry' : wkt.loads,
+    }[value['__type__']](value['value'])
+
+
+
+class ExecutionPlan:
+    """
+    Persisted mapping between in situ samples and the scenes which serve
+    them, created by an up-front search pass over all samples:
+
+        plan = create_plan(global_config, data)
+        plan.save(path)
+
+        plan = ExecutionPlan.load(path)
+        execute_plan(global_config, plan, data)
+
+    The plan file is a json document of the form:
+
+        {
+          samples : {uid: {sensor: {scene: scene_id, candidates: [...]}}},
+          scenes  : {sensor: {scene_id: {details, samples, bytes}}},
+          ac_jobs : [{sensor, scene_id, ac_method, samples}, ...],
+        }
+
+    where samples without any coverage have a `scene` of None, and
+    are therefore never dispatched to the download or AC queues. Scene
+    details which json can't represent (e.g. datetimes, geometries) are
+    stored tagged with their type, and restored when loaded.
+    """
+
+    def __init__(self,
+        samples    : Optional[dict] = None, # {uid: {sensor: assignment}}
+        scenes     : Optional[dict] = None, # {sensor: {scene_id: scene}}
+        ac_methods : list           = [],   # AC methods applied to each scene
+        created    : Optional[str]  = None, # Creation timestamp
+    ):
+        self.samples    = samples or {}
+        self.scenes     = scenes  or {}
+        self.ac_methods = list(ac_methods)
+        self.created    = created or dt.now().isoformat()
+
+
+    def __str__(self):
+        return f'ExecutionPlan({pretty_print(self.summary())})'
+
+
+    def __repr__(self):
+        return str(self)
+
+
+
+    @property
+    def ac_jobs(self) -> list:
+        """ AC processor runs required to execute this plan """
+        return [{
+            'sensor'    : sensor,
+            'scene_id'  : scene_id,
+            'ac_method' : ac_method,
+            'samples'   : len(scene['samples']),
+        } for sensor, scenes in self.scenes.items()
+          for scene_id, scene in scenes.items()
+          for ac_method in self.ac_methods]
+
+
+
+    def planned(self, uid: str, sensors: list) -> bool:
+        """ Check if the given sample has been searched for all sensors """
+        return all(sensor in self.samples.get(uid, {}) for sensor in sensors)
+
+
+
+    def add(self, located: list) -> None:
+        """
+        Add located samples (see tasks.locate_scenes) to the plan. Any
+        sample with multiple candidate scenes is assigned to the candidate
+        which serves the most samples, in order to maximize scene reuse.
+        """
+        # Count how many samples each scene could potentially serve
+        counts = Counter({(sensor, scene_id): len(scene['samples'])
+                          for sensor, scenes in self.scenes.items()
+                          for scene_id, scene in scenes.items()})
+        counts.update((sample['sensor'], scene_id) for sample in located
+                      for scene_id in sample['scene_candidates'])
+
+        for sample in located:
+            uid        = sample['uid']
+            sensor     = sample['sensor']
+            candidates = sample['scene_candidates']
+            selected   = sample.get('scene_id', None)
+
+            # Remove any previous assignment for this sample
+            previous = self.samples.get(uid, {}).get(sensor, {}).get('scene')
+            if previous is not None:
+                self.scenes[sensor][previous]['samples'].remove(uid)
+                counts[(sensor, previous)] -= 1
+
+            scene = None
+            if len(candidates):
+                scene = max(candidates, key=lambda scene_id: (
+                    counts[(sensor, scene_id)], scene_id == selected))
+
+                scenes  = self.scenes.setdefault(sensor, {})
+                details = candidates[scene]
+                scenes.setdefault(scene, {
+                    'details' : details,
+                    'bytes'   : get_scene_size(details),
+                    'samples' : [],
+                })['samples'].append(uid)
+
+            self.samples.setdefault(uid, {})[sensor] = {
+                'scene'      : scene,
+                'candidates' : list(candidates),
+            }
+
+        # Remove any scenes which no longer serve a sample
+        for sensor, scenes in self.scenes.items():
+            for scene_id in [s for s, scene in scenes.items() if not scene['samples']]:
+                del scenes[scene_id]
+
+
+
+    def scene_configs(self,
+        data    : pd.DataFrame, # Samples which remain to be processed
+        sensors : list,         # Sensors to create scene configs for
+    ) -> list:                  # Returns scene configs in execution order
+        """ Create the scene configs for any remaining samples in the plan """
+        located = []
+        for sample in iter_samples(data):
+            for sensor in sensors:
+                assigned = self.samples.get(sample['uid'], {}).get(sensor, {})
+                scene_id = assigned.get('scene', None)
+
+                if scene_id is not None:
+                    located.append(dict(sample, **{
+                        'sensor'        : sensor,
+                        'scene_id'      : scene_id,
+                        'scene_details' : self.scenes[sensor][scene_id]['details'],
+                    }))
+        return group_by_scene(located)
+
+
+
+    def summary(self) -> dict:
+        """ Summarize the work contained in this plan """
+        scenes   = [s for scenes in self.scenes.values() for s in scenes.values()]
+        assigned = [assigned['scene'] for sensors in self.samples.values()
+                                      for assigned in sensors.values()]
+        n_bytes  = sum(s['bytes'] or 0 for s in scenes)
+        return {
+            'Samples'            : len(self.samples),
+            'Samples covered'    : sum(s is not None for s in assigned),
+            'Samples uncovered'  : sum(s is None for s in assigned),
+            'Scenes'             : len(scenes),
+            'Scenes without size': sum(s['bytes'] is None for s in scenes),
+            'Estimated GB'       : round(n_bytes / 1024 ** 3, 2),
+            'AC jobs'            : len(self.ac_jobs),
+        }
+
+
+
+    def save(self, path: Path) -> None:
+        """ Write the plan to disk, ensuring a partial write is never seen """
+        path = Path(path)
+        path.parent.mkdir(exist_ok=True, parents=True)
+        temp = path.with_name(f'.{path.name}.tmp')
+
+        with temp.open('w+') as f:
+            json.dump({
+                'created'    : self.created,
+                'ac_methods' : self.ac_methods,
+                'samples'    : self.samples,
+                'scenes'     : self.scenes,
+                'ac_jobs'    : self.ac_jobs,
+            }, f, default=encode_value)
+        temp.replace(path)
+
+
+
+    @classmethod
+    def load(cls, path: Path) -> 'ExecutionPlan':
+        """ Read a previously saved plan from disk """
+        with Path(path).open() as f:
+            plan = json.load(f, object_hook=decode_value)
+
+        return cls(**{
+            'samples'    : plan['samples'],
+            'scenes'     : plan['scenes'],
+            'ac_methods' : plan['ac_methods'],
+            'created'    : plan['created'],
+        })
+
+
+
+def create_plan(
+    global_config : Namespace,    # Config for the pipeline
+    data          : pd.DataFrame, # Samples which remain to be processed
+    batch_size    : int = 1000,   # Number of samples searched between saves
+) -> ExecutionPlan:               # Returns the complete execution plan
+    """
+    Search for the scenes of every sample which isn't yet contained in the
+    plan located at global_config.plan, saving the plan as it progresses.
+    Resuming a run therefore only searches for any new (or failed) samples.
+    """
+    path = global_config.plan
+    plan = ExecutionPlan.load(path) if path.exists() else ExecutionPlan()
+    plan.ac_methods = sorted(set(plan.ac_methods) | set(global_config.ac_methods))
+
+    sensors = global_config.sensors
+    planned = data['uid'].apply(lambda uid: plan.planned(uid, sensors))
+    samples = list(iter_samples(data.loc[~planned]))
+
+    search_count = color(f'{len(samples):,}', 'blue')
+    plan_count   = color(f'{planned.sum():,}', 'green')
+    print(f'Samples already contained in the plan: {plan_count}')
+    print(f'Samples requiring a search: {search_count}\n')
+
+    # Scenes found by any previous search resolve samples without searching
+    index_path = global_config.output_path.joinpath('scene_index.pkl')
+    index      = SceneIndex.load(index_path) if index_path.exists() else SceneIndex()
+
+    for i in range(0, len(samples), batch_size):
+        plan.add( locate_scenes(global_config, samples[i:i+batch_size], index) )
+        plan.save(path)
+        index.save(index_path)
+
+    print(f'Execution plan saved to {path}: {pretty_print(plan.summary())}\n')
+    return plan
+
+
+
+def execute_plan(
+    global_config : Namespace,     # Config for the pipeline
+    plan          : ExecutionPlan, # Plan created by create_plan
+    data          : pd.DataFrame,  # Samples which remain to be processed
+) -> list:                         # Returns the AsyncResult of each scene chain
+    """
+    Dispatch every scene in the plan which still serves a remaining sample,
+    such that scenes shared by the most samples are downloaded first
+    """
+    scenes = plan.scene_configs(data, global_config.sensors)
+    order_scenes(global_config, scenes)
+    return process_scenes(global_config, scenes)
+
+
+
+def order_scenes(
+    global_config : Namespace, # Config for the pipeline
+    scenes        : list,      # Scene configs, as created by group_by_scene
+) -> None:
+    """
+    Order every scene up front from the Sources which prepare downloads 
+    in advance (e.g. EarthExplorer), so that each is ready to download by 
+    the time its download task runs
+    """
+    for sensor in global_config.sensors:
+        ordered = {scene['scene_id']: scene['scene_details'] 
+                   for scene in scenes if scene['sensor'] == sensor}
+        if not len(ordered): continue
+
+        counts = API.API[sensor]().order_scenes(**{
+            'sensor'       : sensor,
+            'scenes'       : ordered,
+            'scene_folder' : global_config.output_path.joinpath('Scenes', sensor),
+            'overwrite'    : global_config.overwrite,
+            'members'      : get_archive_members(sensor, global_config.ac_methods),
+        })
+        counts = {name: count for name, count in counts.items() if count}
+        if len(counts): print(f'Ordered {sensor} scenes ahead of download: {pretty_print(counts)}')
@@ -1,12 +1,17 @@
 # Context manager
 from .managers import CeleryManagerMulti as CeleryManager
+from .managers import LocalManager
 
 # Individual tasks
 from .shutdown import shutdown
-from .search   import search
+from .search   import search, locate, locate_cluster, download
 from .correct  import correct 
 from .extract  import extract
 from .write    import write
+from .fan_out  import fan_out
 
 # Pipelines (task combinations)
 from .pipelines import extraction_pipeline as create_extraction_pipeline
+from .pipelines import scene_grouped_pipeline as create_scene_grouped_pipeline
+from .pipelines import cluster_samples, locate_scenes, group_by_scene, process_scenes
+from .pipelines import iter_samples, submit_samples
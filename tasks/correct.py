@@ -1,6 +1,70 @@
 from ..AC.L2_processing import AC_FUNCTIONS
+from ..utils import Location, SceneCache, SingleFlight, cluster_locations
 from .. import app
 from argparse import Namespace
+from pathlib import Path
+from typing import Optional
+import json, os, time
+
+
+def get_correction_jobs(
+    sample_config : dict,      # Config for this sample or scene group
+    global_config : Namespace, # Config for the pipeline
+) -> list:                     # Returns list of (label, location, uids)
+    """
+    Determine the separate AC runs required for the given config. Scene
+    groups are corrected once for each cluster of nearby samples, using
+    the bounding box enclosing the whole cluster.
+    """
+    if 'samples' not in sample_config:
+        uid = sample_config['uid']
+        return [(uid, sample_config['location'], [uid])]
+
+    samples   = sample_config['samples']
+    locations = [sample['location'] for sample in samples]
+    clusters  = cluster_locations(locations, global_config.ac_cluster_area)
+    return [(
+        f'cluster_{i}',
+        Location.merge([locations[idx] for idx in cluster]),
+        [samples[idx]['uid'] for idx in cluster],
+    ) for i, cluster in enumerate(clusters)]
+
+
+
+def get_shared_correction(
+    out_dir   : Path,     # Folder the correction is written to
+    ac_method : str,      # AC method used for correction
+    location  : Location, # Location the correction must cover
+    since     : float,    # Timestamp the correction must be made after
+) -> Optional[Path]:      # Returns the correction path, if one was made
+    """ Correction made by another process for the same location, while this one was waiting """
+    marker = out_dir.joinpath(f'.{ac_method}.json')
+    try:
+        if marker.stat().st_mtime >= since:
+            with marker.open() as f:
+                shared = json.load(f)
+            if shared['bbox'] == list(location.get_bbox()):
+                return Path(shared['correction_path'])
+    except (OSError, ValueError, KeyError): pass
+
+
+
+def share_correction(
+    out_dir         : Path,     # Folder the correction is written to
+    ac_method       : str,      # AC method used for correction
+    location        : Location, # Location the correction covers
+    correction_path : Path,     # Path to the correction
+) -> None:
+    """ Record the correction, so that any process waiting on it can use the result """
+    marker = out_dir.joinpath(f'.{ac_method}.json')
+    temp   = marker.with_name(f'{marker.name}.{os.getpid()}.tmp')
+    with temp.open('w') as f:
+        json.dump({
+            'bbox'            : list(location.get_bbox()),
+            'correction_path' : Path(correction_path).as_posix(),
+        }, f)
+    temp.replace(marker)
+
 
 
 @app.task(bind=True, name='correct', queue='correct', priority=2, retry=False, max_retries=0)
@@ -11,32 +75,65 @@ def correct(self,
 ) -> dict:                     # Returns new sample config state
     """ Atmospherically correct the given scene """
     inp_path = (sample_config['scene_path']
-             if sample_config['scene_path'].exists() else 
+             if sample_config['scene_path'].exists() else
                 sample_config['scene_path'].parent)
-    out_path = (inp_path if inp_path.is_dir() else 
-                inp_path.parent).joinpath('out', sample_config['uid'])
-    out_path.mkdir(exist_ok=True, parents=True)
+    out_root = (inp_path if inp_path.is_dir() else
+                inp_path.parent).joinpath('out')
+    jobs     = get_correction_jobs(sample_config, global_config)
+
+    for label, location, uids in jobs:
+        out_root.joinpath(label).mkdir(exist_ok=True, parents=True)
 
     # Input file has been deleted
     if not inp_path.exists():
         self.request.chain = None
         return
 
-    kwargs = {
-        'sensor'    : sample_config['sensor'],
-        'inp_file'  : inp_path,
-        'out_dir'   : out_path,
-        'ac_path'   : global_config.ac_path[ac_method],
-        'overwrite' : True, # Correcting only for small area needs overwrite
-        'timeout'   : global_config.ac_timeout,
-        'location'  : sample_config['location'],
-    }
-    try:
-        kwargs['correction_path'] = AC_FUNCTIONS[ac_method](**kwargs)
-    except Exception as e:
-        self.logger.error(f'Error running AC: {e}')
+    correction_paths = {}
+    start = time.time()
+    for label, location, uids in jobs:
+        kwargs = {
+            'sensor'    : sample_config['sensor'],
+            'inp_file'  : inp_path,
+            'out_dir'   : out_root.joinpath(label),
+            'ac_path'   : global_config.ac_path[ac_method],
+            'overwrite' : True, # Correcting only for small area needs overwrite
+            'timeout'   : global_config.ac_timeout,
+            'location'  : location,
+        }
+        try:
+            # Only one process corrects the same output, with any others using its result
+            flight = SingleFlight(kwargs['out_dir'].joinpath(f'.{ac_method}.lock'))
+            shared = lambda: get_shared_correction(kwargs['out_dir'], ac_method, location, start)
+            with flight.lead(lambda: shared() is not None) as leader:
+                if leader:
+                    kwargs['correction_path'] = AC_FUNCTIONS[ac_method](**kwargs)
+                    share_correction(kwargs['out_dir'], ac_method, location, kwargs['correction_path'])
+                else:
+                    kwargs['correction_path'] = shared()
+                    self.logger.info(f'Using {ac_method} correction of {label} made by another process')
+            correction_paths.update(dict.fromkeys(uids, kwargs['correction_path']))
+        except Exception as e:
+            self.logger.error(f'Error running AC for {label}: {e}')
+
+    # Samples which won't be extracted no longer need the scene
+    uncorrected = [uid for label, location, uids in jobs for uid in uids
+                   if uid not in correction_paths]
+    if len(uncorrected):
+        cache = SceneCache.from_config(global_config)
+        refs  = cache.refs(uncorrected, [ac_method])
+        cache.release(sample_config['sensor'], sample_config['scene_id'], refs)
+
+    # Stop the chain if there aren't any samples left to extract
+    if not len(correction_paths):
         self.request.chain = None
-        return 
+        return
+
+    if 'samples' in sample_config:
+        kwargs.pop('correction_path', None)
+        kwargs['correction_paths'] = correction_paths
+        self.logger.info(f'Corrected {sample_config["scene_id"]} with '
+                         f'{len(jobs)} {ac_method} runs')
     kwargs.update(sample_config)
     kwargs.update({'ac_method': ac_method})
     return kwargs
@@ -1,15 +1,18 @@
-from ..extract import extract_window
+from ..extract import extract_window, extract_windows
 from .. import app
 from argparse import Namespace
+from typing import Union
 
 
 @app.task(bind=True, name='extract', queue='extract', priority=3)
 def extract(self,
-	sample_config : dict,      # Config for this sample
+	sample_config : dict,      # Config for this sample, or for samples sharing a correction
 	global_config : Namespace, # Config for the pipeline
-) -> dict:                     # Returns new sample config state
+) -> Union[dict, list]:        # Returns new sample config state (for each sample)
 	""" Extract a geolocated window from the given scene """
-	
+	if 'samples' in sample_config:
+		return extract_batch(sample_config, global_config)
+
 	kwargs = {
 		'sensor'   : sample_config['sensor'],
 		'inp_file' : sample_config['correction_path'],
@@ -20,3 +23,28 @@ def extract(self,
 	kwargs['extracted'] = extract_window(**kwargs)
 	kwargs.update(sample_config)
 	return kwargs
+
+
+
+def extract_batch(
+	batch_config  : dict,      # Config for all samples sharing a correction_path
+	global_config : Namespace, # Config for the pipeline
+) -> list:                     # Returns new sample config state for each sample
+	""" Extract the windows for many samples, reading the scene only once """
+	samples = batch_config['samples']
+	shared  = {k: v for k, v in batch_config.items() if k != 'samples'}
+	kwargs  = {
+		'sensor'   : batch_config['sensor'],
+		'inp_file' : batch_config['correction_path'],
+		'points'   : [(sample['lat'], sample['lon']) for sample in samples],
+		'window'   : global_config.extract_window,
+	}
+	extracted = extract_windows(**kwargs)
+	return [dict({
+		'sensor'    : kwargs['sensor'],
+		'inp_file'  : kwargs['inp_file'],
+		'lat'       : sample['lat'],
+		'lon'       : sample['lon'],
+		'window'    : kwargs['window'],
+		'extracted' : sample_extracted,
+	}, **dict(shared, **sample)) for sample, sample_extracted in zip(samples, extracted)]
@@ -0,0 +1,36 @@
+from .extract import extract
+from .write   import write
+from .. import app
+from argparse import Namespace
+from collections import defaultdict as dd
+from celery import group
+
+
+@app.task(bind=True, name='fan_out', queue='extract', priority=3)
+def fan_out(self,
+    scene_config  : dict,      # Config for the corrected scene
+    global_config : Namespace, # Config for the pipeline
+) -> None:
+    """ Dispatch extraction and writing for every sample served by a scene """
+    k = {'global_config' : global_config}
+
+    # Samples inherit all scene state, except for the group specific values
+    shared = {key: value for key, value in scene_config.items() 
+              if key not in ['samples', 'location', 'correction_paths']}
+    paths  = scene_config['correction_paths']
+
+    # Samples whose cluster failed to be corrected are skipped, and the
+    # remainder are batched so that each correction is only read once (and
+    # is removed once its batch has been written)
+    samples = [sample for sample in scene_config['samples'] if sample['uid'] in paths]
+    batches = dd(list)
+    for sample in samples:
+        batches[paths[sample['uid']]].append(sample)
+
+    self.logger.info(f'Extracting {len(samples)} samples '
+                     f'from {scene_config["scene_id"]}')
+    group([
+        (   extract.s(dict(shared, correction_path=path, samples=batch), **k) # 3. Extract windows from L2 scene
+          |   write.s(**k)                                                   # 4. Write the data
+        ) for path, batch in batches.items()
+    ]).apply_async()
@@ -0,0 +1,144 @@
+from ... import app, utils
+from .Controller import Controller
+
+from pathlib import Path 
+from typing import Optional
+import os
+
+
+
+def total_memory() -> float:
+    """ Total physical memory (in GB) of this node """
+    try:    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 1024 ** 3
+    except: return float('inf')
+
+
+
+class Autoscaler(Controller):
+    """ 
+    Controller which grows and shrinks the pool of each Celery worker, 
+    based on the number of tasks waiting in the queues it consumes from:
+
+        with Autoscaler(worker_kws, cpus=16, memory=64, downloads=4):
+            ...
+
+    Every step, workers with idle pool processes and no waiting tasks are 
+    shrunk, freeing their share of the budgets. Workers with every pool 
+    process busy and tasks waiting are then grown, with the largest 
+    backlogs (per pool process) given the first share of the budgets:
+
+        cpus      : total pool processes across all workers
+        memory    : total GB used by all pool processes (see slot_memory)
+        downloads : total pool processes consuming from the search queue
+
+    A worker is only grown or shrunk by a single process each step, so
+    that the pools are smoothly rebalanced as the workload shifts between
+    downloading and correcting scenes.
+    """
+    slot_memory = { # Estimated GB used by a single task from each queue
+        'celery'  : 0.5,
+        'search'  : 0.5,
+        'locate'  : 0.5,
+        'correct' : 8,
+        'extract' : 2,
+        'write'   : 0.5,
+    }
+
+    def __init__(self,
+        worker_kws : list,                    # List of kwarg dicts for workers
+        cpus       : Optional[int]   = None,  # Pool process budget (default: cpu count)
+        memory     : Optional[float] = None,  # GB memory budget (default: system memory)
+        downloads  : Optional[int]   = None,  # Search pool process budget
+        interval   : float           = 10,    # Seconds between each adjustment
+        logdir     : Path            = Path('Logs'), # Location to store log files 
+        timeout    : Optional[int]   = None,  # Seconds to wait for graceful exit
+        **kwargs,                             # Any other kwargs given to the workers
+    ):
+        super().__init__(interval, 'autoscaler', logdir, timeout)
+        self.workers = {kw.get('logname', 'celery') : {
+            'queues'      : list(kw.get('queues', ['celery'])),
+            'concurrency' : int(kw.get('concurrency', 1)),
+        } for kw in worker_kws}
+
+        downloading    = lambda worker: 'search' in worker['queues']
+        self.cpus      = cpus   or os.cpu_count()
+        self.memory    = memory or total_memory()
+        self.downloads = downloads or sum(worker['concurrency'] 
+                            for worker in self.workers.values() 
+                            if downloading(worker))
+        self._log(f'Autoscaling {list(self.workers)} within {self.cpus} cpus, '
+                  f'{self.memory:.1f} GB memory, and {self.downloads} downloads')
+
+
+
+    def step(self):
+        """ Rebalance the worker pools according to the current queue depths """
+        queues  = sorted({q for worker in self.workers.values() for q in worker['queues']})
+        depths  = utils.get_queue_depths(queues)
+        active  = app.control.inspect(timeout=1).active() or {}
+        nodes   = {node.split('@')[0] : node for node in active}
+        running = {node.split('@')[0] : len(tasks) for node, tasks in active.items()}
+
+        # Only workers which are online can be resized, and waiting tasks 
+        # are shared between all workers consuming from the same queue
+        online    = {name: w for name, w in self.workers.items() if name in nodes}
+        consumers = {q: sum(q in w['queues'] for w in online.values()) for q in queues}
+        backlog   = {name: sum(depths[q] / consumers[q] for q in w['queues'])
+                     for name, w in online.items()}
+
+        # Shrink any workers which have idle processes and nothing waiting
+        for name, worker in online.items():
+            idle = running[name] < worker['concurrency']
+            if backlog[name] == 0 and idle and worker['concurrency'] > 1:
+                self._resize(name, nodes[name], -1)
+
+        # Grow the busy workers with the largest backlog first
+        busy = [name for name, worker in online.items() 
+                if backlog[name] > 0 and running[name] >= worker['concurrency']]
+        for name in sorted(busy, key=lambda n: -backlog[n] / online[n]['concurrency']):
+            if self._within_budget(name):
+                self._resize(name, nodes[name], 1)
+
+
+
+    # ================================================================
+    # Private functions
+
+    def _usage(self, 
+        extra : Optional[str] = None, # Worker name to add an extra process to
+    ) -> dict:                        # Returns the usage of each budget
+        """ Current (or hypothetical) usage of each budget """
+        usage = {'cpus': 0, 'memory': 0, 'downloads': 0}
+        for name, worker in self.workers.items():
+            processes = worker['concurrency'] + (name == extra)
+            usage['cpus']      += processes
+            usage['memory']    += processes * max(self.slot_memory.get(q, 1) 
+                                                  for q in worker['queues'])
+            usage['downloads'] += processes * ('search' in worker['queues'])
+        return usage
+
+
+
+    def _within_budget(self, name: str) -> bool:
+        """ Check if the given worker can grow by a single process """
+        usage = self._usage(extra=name)
+        return ((usage['cpus']   <= self.cpus)   and 
+                (usage['memory'] <= self.memory) and 
+                (usage['downloads'] <= self.downloads or 
+                 'search' not in self.workers[name]['queues']))
+
+
+
+    def _resize(self, 
+        name  : str, # Worker name (i.e. its logname)
+        node  : str, # Full worker hostname
+        delta : int, # Number of processes to add (or remove, if negative)
+    ):
+        """ Grow or shrink the pool of the given worker """
+        if delta > 0: app.control.pool_grow(delta, destination=[node])
+        else:         app.control.pool_shrink(-delta, destination=[node])
+
+        self.workers[name]['concurrency'] += delta
+        self._log(f'{"Grew" if delta > 0 else "Shrunk"} {node} to '
+                  f'{self.workers[name]["concurrency"]} processes '
+                  f'(usage: {self._usage()})')
@@ -4,6 +4,10 @@ from ..shutdown import shutdown
 from .Worker  import Worker
 from .Flower  import Flower
 from .Monitor import Monitor
+from .Autoscaler import Autoscaler
+from .Prefetcher import Prefetcher
+
+from typing import Optional
 
 
 
@@ -36,16 +40,22 @@ class CeleryManagerMulti:
     """
 
     def __init__(self, 
-        worker_kws : list = [{}], # List of kwarg dicts for workers
-        data       : list = [],   # Data samples
-        ac_methods : list = [],   # AC methods
-        **kwargs,                 # Any other kwargs to pass Worker/Flower
+        worker_kws : list           = [{}],  # List of kwarg dicts for workers
+        data       : list           = [],    # Data samples
+        ac_methods : list           = [],    # AC methods
+        autoscale  : Optional[dict] = None,  # Autoscaler budgets, if workers should be autoscaled
+        prefetch   : Optional[dict] = None,  # Prefetcher kwargs, if downloads should be kept ahead of correction
+        **kwargs,                            # Any other kwargs to pass Worker/Flower
     ):
         utils.purge_queues()
         merge_kwargs = lambda d: (d.update(kwargs) or d)
         self.celery  = [Worker(**merge_kwargs(kw)) for kw in worker_kws]
         self.flower  = [Flower()]
         self.monitor = [Monitor(data, ac_methods)]
+        self.autoscaler = [] if autoscale is None else [
+            Autoscaler(worker_kws, **autoscale)]
+        self.prefetcher = [] if prefetch is None else [
+            Prefetcher(worker_kws, **prefetch)]
 
 
     # Context managers
@@ -95,7 +105,7 @@ class CeleryManagerMulti:
 
     def _iter_processes(self):
         """ Iterate over processes """
-        for name in ['celery', 'flower', 'monitor']:
+        for name in ['autoscaler', 'prefetcher', 'celery', 'flower', 'monitor']:
             yield from getattr(self, name, [])
 
 
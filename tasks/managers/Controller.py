@@ -0,0 +1,101 @@
+from ... import utils
+
+from threading import Thread, Event
+from datetime import datetime as dt
+from pathlib import Path 
+from typing import Optional
+
+
+
+class Controller:
+    """ 
+    Background thread which periodically inspects and adjusts the running
+    pipeline. Inheriting classes implement `step`, which is called once 
+    every `interval` seconds until the controller is closed:
+
+        with Autoscaler(worker_kws) as controller:
+            print(f'Running: {controller.running()}')
+
+    """
+    def __init__(self,
+        interval : float         = 10,           # Seconds between each step
+        logname  : str           = 'controller', # Log file name
+        logdir   : Path          = Path('Logs'), # Location to store log files 
+        timeout  : Optional[int] = None,         # Seconds to wait for graceful exit
+    ):
+        self.interval = interval
+        self.timeout  = timeout
+        self.thread   = None
+        self.stopped  = Event()
+        self.logname  = logname
+        self.logfile  = self._init_log(logdir, logname)
+
+    # Check if controller has been started
+    def running(self): return self.thread is not None
+
+    # Alternative to context manager __exit__
+    def close(self):   return self._stop_process()
+
+    # Context managers
+    def __enter__(self, *args, **kwargs): return self._start_process()
+    def  __exit__(self, *args, **kwargs): return self._stop_process()
+
+    # Cannot read from a Controller
+    def  __iter__(self): return iter(())
+
+    # Inheriting class should implement the adjustment made every interval
+    def step(self): raise NotImplementedError
+
+
+
+    # ================================================================
+    # Private functions
+
+    def _init_log(self, logdir, filename):
+        """ Create log directory if necessary, and clear prior log file """
+        root = Path(__file__).parent.parent.parent.joinpath(logdir)
+        path = root.joinpath(f'{filename}.log')
+        root.mkdir(exist_ok=True, parents=True)
+        path.write_text('')
+        return path
+
+
+
+    def _log(self, message):
+        """ Write a timestamped message to the log file """
+        with self.logfile.open('a+') as f:
+            f.write(f'[{dt.now().isoformat(timespec="seconds")}] {message}\n')
+
+
+
+    def _run(self):
+        """ Step the controller until it is stopped """
+        step = utils.catch_and_log(f'{self.logname}_err.txt')(self.step)
+        while not self.stopped.wait(self.interval): step()
+
+
+
+    def _start_process(self):
+        """ Start the controller thread in the background """
+        if self.thread is None:
+            self.stopped.clear()
+            self.thread = Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self
+
+
+
+    def _stop_process(self):
+        """ Signal the controller to stop, and wait for it to exit """
+        if self.thread is None: return 
+
+        self.stopped.set()
+        try:     self.thread.join(timeout=self.timeout)
+        finally: self._kill_process()
+
+
+
+    def _kill_process(self):
+        """ Daemon threads exit with the main process, so only signal """
+        self.stopped.set()
+        self.thread = None
@@ -0,0 +1,259 @@
+from ... import app
+from ..pipelines.PipelineTask import PipelineTask
+from ...utils import record_completed
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from collections import defaultdict as dd
+from celery import signature
+from celery.exceptions import Retry
+from celery.utils import uuid
+from threading import Condition, Timer
+from typing import Optional
+import time, traceback, warnings
+
+
+
+def run_task(
+    name   : str,   # Name of the task to run
+    args   : tuple, # Positional arguments for the task
+    kwargs : dict,  # Keyword arguments for the task
+) -> tuple:         # Returns (task result, tasks submitted while running)
+    """ Run a task within a pool, collecting any tasks it submits itself """
+    retval = app.tasks[name](*args, **kwargs)
+    return retval, PipelineTask.executor.drain()
+
+
+
+class Recorder:
+    """ 
+    Executor used within pool processes, which records the tasks submitted
+    so that they can be handed back to the LocalManager in the main process
+    """
+    def __init__(self): 
+        self.submitted = []
+
+
+    @staticmethod
+    def install():
+        """ Pool process initializer """
+        PipelineTask.executor = Recorder()
+
+
+    def submit(self, name, args, kwargs, options):
+        options = LocalManager.clean_options(options)
+        self.submitted.append( (name, args, kwargs, options) )
+        return app.AsyncResult(options['task_id'])
+
+
+    def drain(self):
+        submitted, self.submitted = self.submitted, []
+        return submitted
+
+
+
+class LocalManager:
+    """ 
+    Context manager which runs the pipeline tasks within this process, using
+    thread and process pools in place of the Celery workers. No broker or 
+    other outside services are required, and tasks are never serialized 
+    unless they are executed in a process pool:
+
+        worker_kws = [
+            # Multiple processes for searching and correcting
+            {   'queues'      : ['search', 'correct'], 
+                'concurrency' : 3, 
+            },
+
+            # Single dedicated thread (e.g. for writing) 
+            {   'queues'      : ['write'],
+                'concurrency' : 1, 
+                'pool'        : 'threads',
+            },
+        ]
+
+        with LocalManager(worker_kws) as manager:
+            pipeline.delay(sample)
+
+    Each worker definition creates a pool for its queues, using processes
+    (Celery's default prefork pool) unless `'pool' : 'threads'` is given. 
+    Tasks are sent to the least busy pool which consumes from their queue.
+    As with the Celery pipeline, a chain continues to its next task with 
+    the result of the previous task, unless that result is None.
+    """
+
+    def __init__(self, 
+        worker_kws : list = [{}], # List of kwarg dicts for workers
+        data       : list = [],   # Data samples
+        ac_methods : list = [],   # AC methods
+        **kwargs,                 # Any other kwargs given to the Celery workers
+    ):
+        # Pools have a fixed size, and aren't backed by a broker which could be paused
+        for option in ['autoscale', 'prefetch']:
+            if kwargs.get(option, None) is not None:
+                warnings.warn(f'The {option} option is not supported by the LocalManager, and is ignored')
+
+        # Results are kept in memory, and nothing is ever sent to a broker
+        app.conf.update(**{
+            'broker_url'     : 'memory://',
+            'result_backend' : 'cache+memory://',
+        })
+        self.backend = app.backend
+        self.workers = worker_kws
+        self.pools   = dd(list)
+        self.pending = dd(int)
+        self.counts  = dd(lambda: dd(int))
+        self.total   = 0
+        self.done    = Condition()
+
+
+    # Context managers
+    def __enter__(self, *args, **kwargs): return self._start_processes()
+    def  __exit__(self, *args, **kwargs): return self._stop_processes()
+
+    # Check if the pools have been started
+    def running(self): return PipelineTask.executor is self
+
+    # Alternative to context manager __exit__
+    def close(self):   return self._stop_processes()
+
+    # Tasks submitted by the main process are dispatched immediately
+    def drain(self):   return []
+
+
+
+    @staticmethod
+    def clean_options(options: dict) -> dict:
+        """ Keep only the options which are relevant to local execution """
+        keep    = ['chain', 'task_id', 'queue', 'countdown']
+        options = {k: v for k, v in options.items() if k in keep and v is not None}
+        options.setdefault('task_id', uuid())
+        return options
+
+
+
+    def submit(self, 
+        name    : str,   # Name of the task to run
+        args    : tuple, # Positional arguments for the task
+        kwargs  : dict,  # Keyword arguments for the task
+        options : dict,  # Celery execution options (e.g. chain, countdown)
+    ):                   # Returns an AsyncResult for the task
+        """ Run the task on the pool associated with its queue """
+        options = self.clean_options(options)
+        with self.done:
+            self.total += 1
+
+        if options.get('countdown', 0) > 0:
+            delay = options.pop('countdown')
+            timer = Timer(delay, self._dispatch, (name, args, kwargs, options))
+            timer.daemon = True
+            timer.start()
+        else: self._dispatch(name, args, kwargs, options)
+        return app.AsyncResult(options['task_id'], backend=self.backend)
+
+
+
+    # ================================================================
+    # Private functions
+
+    def _start_processes(self):
+        """ Create the pools, and route all tasks to this manager """
+        for kws in self.workers:
+            concurrency = int(kws.get('concurrency', 1))
+            pool = (ThreadPoolExecutor(concurrency) if kws.get('pool', None) == 'threads' else 
+                    ProcessPoolExecutor(concurrency, initializer=Recorder.install))
+
+            for queue in kws.get('queues', ['celery']):
+                self.pools[queue].append(pool)
+
+        PipelineTask.executor = self
+        self.start = time.time()
+        return self
+
+
+
+    def _stop_processes(self):
+        """ Wait for all submitted tasks to finish, and shut down the pools """
+        with self.done:
+            self.done.wait_for(lambda: self.total == 0)
+
+        PipelineTask.executor = None
+        for pool in {id(p): p for pools in self.pools.values() for p in pools}.values():
+            pool.shutdown()
+        self.pools.clear()
+
+        elapsed = time.time() - self.start
+        print(f'Finished all tasks in {elapsed:.1f} seconds:')
+        for name, count in self.counts.items():
+            print(f'\t{name:>8}: ' + ', '.join(f'{k} {v:,}' for k, v in count.items()))
+
+
+
+    def _record_search(self, args, kwargs, retval):
+        """ Append whether the sample's search found a scene to its completed.csv """
+        sample_config, sensor = args[:2]
+        global_config = kwargs['global_config']
+        dataset = sample_config.get('dataset', None)
+        if dataset is None: return
+
+        with self.done:
+            record_completed(global_config.output_path, dataset, sensor, sample_config['uid'], retval is not None)
+
+
+
+    def _dispatch(self, name, args, kwargs, options):
+        """ Submit the task to the least busy pool consuming from its queue """
+        queue = options.get('queue', None) or app.tasks[name].queue or 'celery'
+        pools = self.pools.get(queue, None) or self.pools['celery']
+        assert(len(pools)), f'No workers defined for queue "{queue}"'
+
+        with self.done:
+            pool = min(pools, key=lambda pool: self.pending[id(pool)])
+            self.pending[id(pool)] += 1
+
+        future = pool.submit(run_task, name, args, kwargs)
+        future.add_done_callback(lambda future: self._complete(future, pool, name, args, kwargs, options))
+
+
+
+    def _complete(self, future, pool, name, args, kwargs, options):
+        """ Store the task result, and continue the chain if necessary """
+        task_id = options['task_id']
+        try:
+            try: 
+                retval, submitted = future.result()
+
+            # Task asked to be run again later (e.g. once an offline scene is retrieved)
+            except Retry as e:
+                self.counts[name]['Retry'] += 1
+                self.submit(name, args, kwargs, dict(options, countdown=e.when))
+                return
+            except Exception as e:
+                self.backend.mark_as_failure(task_id, e, traceback=traceback.format_exc())
+                app.tasks[name].logger.error(f'Task {name}[{task_id}] failed: {e}')
+                self.counts[name]['Failure'] += 1
+                return
+
+            self.backend.mark_as_done(task_id, retval)
+            self.counts[name]['Success'] += 1
+
+            # Search outcomes are recorded as the Monitor does, so completed samples are skipped on restart
+            if name in ['search', 'locate']:
+                self._record_search(args, kwargs, retval)
+
+            # Tasks submitted within a pool process
+            for task in submitted: self.submit(*task)
+
+            # Chains are stopped by a task returning None
+            chain = options.get('chain', None)
+            if chain and retval is not None:
+                next_task = signature(chain.pop(), app=app)
+                next_task.apply_async((retval,), chain=chain)
+
+        except Exception as e:
+            app.tasks[name].logger.error(f'Failed continuing {name}[{task_id}]: {e}')
+
+        finally:
+            with self.done:
+                self.pending[id(pool)] -= 1
+                self.total -= 1
+                self.done.notify_all()
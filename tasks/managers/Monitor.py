@@ -99,7 +99,7 @@ def start_monitor(total_samples, total_ac, show_plot=plt is not None):
         if name == 'shutdown':
             return 
 
-        if name == 'search' and state == 'SUCCESS':
+        if name in ['search', 'locate'] and state == 'SUCCESS':
             dataset = extract_key('dataset', task.args)
             uid     = extract_key('uid',     task.args)
             sensor  = task.args.split(" '")[-1][:-2] 
@@ -108,10 +108,7 @@ def start_monitor(total_samples, total_ac, show_plot=plt is not None):
 
             successful_search = str(task.result) != 'None'
             if dataset is not None:
-                outpath = Path(outpath).joinpath(dataset, sensor)
-                outpath.mkdir(exist_ok=True, parents=True)
-                with outpath.joinpath('completed.csv').open('a+') as f:
-                    f.write(f'{uid}, {successful_search}\n')
+                utils.record_completed(outpath, dataset, sensor, uid, successful_search)
 
         else: successful_search = True 
 
@@ -187,7 +184,7 @@ def start_monitor(total_samples, total_ac, show_plot=plt is not None):
 
 
         if name not in bars:
-            total = total_samples * (1 if name == 'search' else total_ac)
+            total = total_samples * (1 if name in ['search', 'locate'] else total_ac)
             bars[name] = {
                 'main'     : tqdm(total=total, position=len(bars)+(3 if show_plot else 0), desc=label(name)), 
                 # 'main'     : tqdm(total=total * 3, position=len(bars) * 4, desc=label(name)), 
@@ -0,0 +1,96 @@
+from ... import app, utils
+from .Controller import Controller
+
+from pathlib import Path
+from typing import Optional
+
+
+
+class Prefetcher(Controller):
+    """
+    Controller which keeps a target number of scenes downloaded ahead of
+    atmospheric correction, applying backpressure to the downloads by
+    pausing the workers' search queue consumers:
+
+        cache = SceneCache.from_config(global_config)
+        with Prefetcher(worker_kws, cache, ahead=8, cache_limit=0.9):
+            ...
+
+    Every step, the scenes ahead of correction are counted as the correct
+    tasks waiting in the queue, plus the downloads which are still running.
+    The search queue is paused once this reaches `ahead`, or once scenes
+    which are pinned in the cache (i.e. can't be evicted) use `cache_limit`
+    of its budget. Downloads which are already running are completed, and
+    the search queue is resumed once correction catches up and the cache
+    has room again. The correct queue therefore never runs dry while
+    downloads are waiting, without downloaded scenes filling the disk.
+
+    Search isn't paused for a full cache when no downloads are running and
+    no correct tasks are waiting, as nothing would then release the pinned
+    scenes (e.g. pins left by failed tasks), and the pause would never end.
+    Scenes are only located (i.e. without being downloaded) on the separate
+    locate queue, which is never paused.
+    """
+    download_tasks = ['search', 'download'] # Tasks on the search queue which download a scene
+
+    def __init__(self,
+        worker_kws  : list,                    # List of kwarg dicts for workers
+        cache       : utils.SceneCache,        # Cache which downloaded scenes are stored in
+        ahead       : int             = 8,     # Scenes to keep downloaded ahead of correction
+        cache_limit : float           = 0.9,   # Fraction of the cache budget pinned scenes can use
+        interval    : float           = 10,    # Seconds between each adjustment
+        logdir      : Path            = Path('Logs'), # Location to store log files
+        timeout     : Optional[int]   = None,  # Seconds to wait for graceful exit
+    ):
+        super().__init__(interval, 'prefetcher', logdir, timeout)
+        self.cache       = cache
+        self.ahead       = ahead
+        self.cache_limit = cache_limit
+        self.paused      = False
+        self.workers     = [kw.get('logname', 'celery') for kw in worker_kws
+                            if 'search' in kw.get('queues', ['celery'])]
+        self._log(f'Prefetching {ahead} scenes for {self.workers}, within '
+                  f'{cache_limit:.0%} of the {cache} budget')
+
+
+
+    def step(self):
+        """ Pause or resume the search queue according to the scenes waiting for correction """
+        depths  = utils.get_queue_depths(['correct'])
+        active  = app.control.inspect(timeout=1).active() or {}
+        nodes   = [node for node in active if node.split('@')[0] in self.workers]
+        running = sum(task['name'] in self.download_tasks
+                      for tasks in active.values() for task in tasks)
+
+        usage   = self.cache.usage()
+        waiting = depths['correct'] + running
+        full    = usage['Pinned GB'] >= self.cache_limit * usage['Budget']
+        pause   = waiting >= self.ahead or (full and waiting > 0)
+
+        if pause != self.paused and len(nodes):
+            self._set_consuming(nodes, not pause)
+            self.paused = pause
+            self._log(f'{"Paused" if pause else "Resumed"} search for {nodes} with '
+                      f'{waiting} scenes ahead of correction (cache usage: {usage})')
+
+
+
+    # ================================================================
+    # Private functions
+
+    def _set_consuming(self,
+        nodes     : list, # Full worker hostnames
+        consuming : bool, # Whether the workers should consume from the search queue
+    ):
+        """ Start or stop the given workers consuming from the search queue """
+        if not consuming:
+            return app.control.cancel_consumer('search', destination=nodes)
+
+        # Queue must be redeclared exactly as configured, or it'd be bound to the default exchange
+        queue = next(q for q in app.conf.task_queues if q.name == 'search')
+        app.control.add_consumer('search', **{
+            'exchange'      : queue.exchange.name,
+            'exchange_type' : queue.exchange.type,
+            'routing_key'   : queue.routing_key,
+            'destination'   : nodes,
+        })
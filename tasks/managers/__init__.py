@@ -1,2 +1,5 @@
 from .CeleryManager      import CeleryManager      # Single worker
 from .CeleryManagerMulti import CeleryManagerMulti # Multiple workers
+from .Autoscaler         import Autoscaler         # Worker pool autoscaling
+from .Prefetcher         import Prefetcher         # Download backpressure
+from .LocalManager       import LocalManager       # Broker-free local execution
@@ -1,7 +1,27 @@
-from ...utils import pretty_print
+from ...utils import pretty_print, PayloadStore
 
+from argparse import Namespace
 from celery import Task
 from celery.utils.log import get_task_logger
+from functools import wraps
+
+
+
+def with_payloads(run):
+    """ Wrap a task's run method, loading any payload handles before it runs and storing large results after """
+    @wraps(run)
+    def wrapper(self, *args, **kwargs):
+        store = self.payload_store(args, kwargs)
+        if store is None:
+            return run(self, *args, **kwargs)
+
+        handles = {}
+        args    = store.check_out(args, handles)
+        kwargs  = store.check_out(kwargs, handles)
+        retval  = run(self, *args, **kwargs)
+        return store.check_in(retval, self.claim_keys, handles)
+    return wrapper
+
 
 
 class PipelineTask(Task):
@@ -11,7 +31,9 @@ class PipelineTask(Task):
 
     Docs: https://docs.celeryq.dev/en/latest/userguide/tasks.html#handlers 
     """
-    _logger = None
+    _logger    = None
+    executor   = None # Local executor which runs tasks without a broker (see LocalManager)
+    claim_keys = ['scene_details', 'scene_candidates', 'extracted'] # Results passed by handle (see PayloadStore)
 
     @property
     def logger(self):
@@ -21,6 +43,39 @@ class PipelineTask(Task):
         return self._logger    
 
 
+    def __init_subclass__(cls, **kwargs):
+        """ 
+        Wrap the run method of each (bound) task to handle payloads. Unlike
+        overriding __call__, the worker then still calls run directly, so 
+        the task sees its real request (e.g. to stop its chain, or retry)
+        """
+        super().__init_subclass__(**kwargs)
+        run = cls.__dict__.get('run', None)
+        if callable(run) and not isinstance(run, staticmethod):
+            cls.run = with_payloads(run)
+
+
+    def apply_async(self, args=None, kwargs=None, **options):
+        """ Store any large arguments, then send the task to the local executor if one is in use """
+        store = self.payload_store(args or (), kwargs or {})
+        if store is not None:
+            args = store.check_in(args, self.claim_keys)
+
+        if self.executor is not None:
+            return self.executor.submit(self.name, tuple(args or ()), dict(kwargs or {}), options)
+        return super().apply_async(args, kwargs, **options)
+
+
+    @staticmethod
+    def payload_store(args, kwargs):
+        """ PayloadStore used for the task arguments, if payloads are enabled """
+        config = kwargs.get('global_config', None)
+        if config is None:
+            config = next((a for a in args if isinstance(a, Namespace)), None)
+        if getattr(config, 'payload_threshold', None):
+            return PayloadStore.from_config(config)
+
+
     def before_start(self, task_id, args, kwargs):
         """ Run by the worker before the task starts executing """
         try: self.logger.debug(f'Starting task={self.name}: {pretty_print(args)}')
@@ -1 +1,4 @@
-from .extraction import extraction as extraction_pipeline
\ No newline at end of file
+from .extraction import extraction as extraction_pipeline
+from .extraction import scene_grouped as scene_grouped_pipeline
+from .extraction import cluster_samples, locate_scenes, group_by_scene, process_scenes
+from .submit     import iter_samples, submit_samples
@@ -1,9 +1,14 @@
-from ..search  import search
-from ..correct import correct 
+from ..search  import search, locate, locate_cluster, located_config, download, SEARCH_LIMIT
+from ..correct import correct
 from ..extract import extract
 from ..write   import write
+from ..fan_out import fan_out
+from ...utils  import Location, DatetimeRange, PayloadStore, SceneIndex, cluster_locations, record_completed
 
+from collections import defaultdict as dd
+from argparse import Namespace
 from celery import group
+from typing import Optional
 
 
 def extraction(global_config):
@@ -12,13 +17,195 @@ def extraction(global_config):
 
     # Execute all steps in parallel over sensors
     return ( group([
-        search.s(sensor, **k)    # 1. Search for matching scenes 
+        search.s(sensor, **k)    # 1. Search for matching scenes
 
         # Execute steps 2-4 in parallel over AC processors
-        | group([(                                          
+        | group([(
               correct.s(ac_method=ac, **k) # 2. Correct L1 scene with each AC processor
             | extract.s(**k)     # 3. Extract window from L2 scene
             |   write.s(**k)     # 4. Write the data
         ) for ac in global_config.ac_methods])
     for sensor in global_config.sensors]) )
 
+
+
+def cluster_samples(
+    global_config : Namespace, # Config for the pipeline
+    samples       : list,      # Sample configs to search scenes for
+) -> list:                     # Returns a config per cluster of nearby samples
+    """
+    Group samples from the same day into clusters of nearby samples, 
+    which can then be searched for at once. Each cluster config holds
+    the Location and DatetimeRange enclosing all of its samples.
+    """
+    days = dd(list)
+    for sample in samples:
+        days[sample['dt_range'].start.date()].append(sample)
+
+    clusters = []
+    for day_samples in days.values():
+        locations = [sample['location'] for sample in day_samples]
+        for cluster in cluster_locations(locations, global_config.search_cluster_area):
+            members = [day_samples[i] for i in cluster]
+            clusters.append({
+                'samples'  : members,
+                'location' : Location.merge([s['location'] for s in members]),
+
+                # Given as strings, as DatetimeRange truncates datetime objects to their date
+                'dt_range' : DatetimeRange(
+                    start = min(s['dt_range'].start for s in members).isoformat(),
+                    end   = max(s['dt_range'].end   for s in members).isoformat(),
+                ),
+            })
+    return clusters
+
+
+
+def locate_scenes(
+    global_config : Namespace,            # Config for the pipeline
+    samples       : list,                 # Sample configs to search scenes for
+    index         : Optional[SceneIndex] = None, # Index of previously found scenes
+) -> list:                                # Returns a located config per (sample, sensor)
+    """
+    Search for the matching scenes of every sample. Samples without any
+    coverage are returned with no `scene_id`; samples whose search failed
+    are dropped, so that they are searched again on any later attempt.
+
+    Samples which the index can resolve are not searched for at all, and
+    any new search results are added to the index, along with the area and
+    datetime range which was searched (i.e. the whole cluster's, for 
+    samples located by a cluster search). Nearby samples from the
+    same day are searched for with a single search (if search_cluster_area
+    is set), and are only searched individually when the scenes found 
+    can't be assigned to the samples they cover. The outcome of each 
+    sample's search is recorded in completed.csv.
+    """
+    k = {'global_config' : global_config}
+
+    # Resolve samples from the index, and cluster the remainder by sensor
+    located  = []
+    pairs    = []
+    clusters = []
+    for sensor in global_config.sensors:
+        pending = []
+        for sample in samples:
+            scenes = None if index is None else index.query(sensor, sample['location'], sample['dt_range'])
+            if scenes is not None: located.append(located_config(sample, sensor, scenes, global_config))
+            else:                  pending.append(sample)
+
+        for cluster in (cluster_samples(global_config, pending) if global_config.search_cluster_area
+                        else [{'samples': [sample]} for sample in pending]):
+            if len(cluster['samples']) > 1: clusters.append((cluster, sensor))
+            else:                           pairs.append((cluster['samples'][0], sensor))
+    resolved = list(located) # Outcomes which aren't recorded by a locate task
+    searched = []
+    indexed  = [] # Searches to add to the index: (sensor, scenes, location, dt_range)
+
+    # Search once for each cluster of multiple samples
+    results = group([
+        locate_cluster.s(cluster, sensor, **k) for cluster, sensor in clusters
+    ]).apply_async().get(propagate=False) if len(clusters) else []
+    results = PayloadStore.check_out(results)
+
+    for (cluster, sensor), result in zip(clusters, results):
+        if isinstance(result, dict):
+            searched += result['located']
+            resolved += result['located']
+            pairs    += [(sample, sensor) for sample in result['unassigned']]
+            indexed.append((sensor, result['scene_candidates'], cluster['location'], cluster['dt_range']))
+
+    # Search for any remaining samples individually
+    results = group([
+        locate.s(sample, sensor, **k) for sample, sensor in pairs
+    ]).apply_async().get(propagate=False) if len(pairs) else []
+    results = PayloadStore.check_out(results)
+
+    for (sample, sensor), result in zip(pairs, results):
+        if result is None:
+            result = dict(sample, sensor=sensor, scene_id=None, scene_candidates={})
+        if isinstance(result, dict):
+            searched.append(result)
+            indexed.append((sensor, result['scene_candidates'], sample['location'], sample['dt_range']))
+
+    for sensor, scenes, location, dt_range in (indexed if index is not None else []):
+        index.add(sensor, scenes, location, dt_range, SEARCH_LIMIT)
+
+    # Samples resolved by the index or a cluster search are recorded here, as 
+    # the monitor (or LocalManager) only records the outcomes of locate tasks
+    for result in resolved:
+        if result.get('dataset', None) is not None:
+            record_completed(global_config.output_path, result['dataset'], result['sensor'],
+                             result['uid'], result['scene_id'] is not None)
+    return located + searched
+
+
+
+def group_by_scene(located : list) -> list:
+    """
+    Combine located samples into one config per (sensor, scene),
+    ordered such that scenes serving the most samples come first
+    """
+    scene_keys = ['sensor', 'scene_id', 'scene_details', 'scene_candidates']
+    scenes     = dd(list)
+    details    = {}
+
+    for sample in located:
+        if sample.get('scene_id', None) is None: continue
+
+        key = (sample['sensor'], sample['scene_id'])
+        details[key] = sample['scene_details']
+        scenes[key].append({k: v for k, v in sample.items()
+                            if k not in scene_keys})
+
+    return [{
+        'sensor'        : sensor,
+        'scene_id'      : scene_id,
+        'scene_details' : details[(sensor, scene_id)],
+        'samples'       : samples,
+        'location'      : Location.merge([s['location'] for s in samples]),
+    } for (sensor, scene_id), samples in sorted(scenes.items(),
+                                        key=lambda kv: -len(kv[1]))]
+
+
+
+def process_scenes(
+    global_config : Namespace, # Config for the pipeline
+    scenes        : list,      # Scene configs, as created by group_by_scene
+) -> list:                     # Returns the AsyncResult of each scene chain
+    """ Download and correct each scene once, fanning out to its samples """
+    k = {'global_config' : global_config}
+
+    # Execute steps 2-5 in parallel over scenes
+    return [(
+          download.s(scene, **k) # 2. Download the shared scene
+
+        # Execute steps 3-5 in parallel over AC processors
+        | group([(
+              correct.s(ac_method=ac, **k) # 3. Correct L1 scene with each AC processor
+            | fan_out.s(**k) # 4-5. Extract and write each of the scene's samples
+        ) for ac in global_config.ac_methods])
+    ).delay() for scene in scenes]
+
+
+
+def scene_grouped(global_config):
+    """
+    Chain together the matchup extraction pipeline, grouped by scene.
+
+    Rather than running every step for each sample individually, all
+    samples are first resolved to their matching scene. Each scene is
+    then downloaded and corrected only once per AC method, with the
+    extraction and writing fanned out to every sample it serves:
+
+        pipeline = scene_grouped(global_config)
+        results  = pipeline(samples)
+
+    """
+    path  = global_config.output_path.joinpath('scene_index.pkl')
+    index = SceneIndex.load(path) if path.exists() else SceneIndex()
+
+    def pipeline(samples):
+        located = locate_scenes(global_config, samples, index) # 1. Search for scenes
+        index.save(path)
+        return process_scenes(global_config, group_by_scene(located))
+    return pipeline
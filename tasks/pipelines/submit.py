@@ -0,0 +1,53 @@
+from ... import app
+from ...utils import color
+from .PipelineTask import PipelineTask
+
+from celery.canvas import Signature
+from contextlib import nullcontext
+from typing import Iterator
+import pandas as pd
+import time
+
+
+
+def iter_samples(data: pd.DataFrame) -> Iterator[dict]:
+    """ 
+    Stream each row of the data as a sample config dict. Unlike iterrows,
+    this doesn't construct an intermediate Series (and its index) per row
+    """
+    columns = list(data.columns)
+    for values in zip(*(data[column].tolist() for column in columns)):
+        yield dict(zip(columns, values))
+
+
+
+def submit_samples(
+    pipeline   : Signature,    # Pipeline applied to each sample
+    data       : pd.DataFrame, # Samples to submit
+    batch_size : int = 1000,   # Number of samples between throughput reports
+) -> int:                      # Returns number of samples submitted
+    """
+    Publish the pipeline for every sample over a single producer, reporting
+    the enqueue throughput after each batch. The pipeline config should be a
+    SharedConfig, so that it is only referenced rather than fully serialized 
+    in every message. No producer is needed when a local executor (i.e. the
+    LocalManager) is running the tasks, as nothing is sent to a broker.
+    """
+    total = len(data)
+    start = time.time()
+    count = 0
+
+    def report():
+        elapsed = max(time.time() - start, 1e-6)
+        rate    = color(f'{count / elapsed:,.0f}', 'blue')
+        print(f'Submitted {count:,} / {total:,} samples ({rate} samples/s)')
+
+    local = PipelineTask.executor is not None
+    with (nullcontext() if local else app.producer_or_acquire()) as producer:
+        for sample in iter_samples(data):
+            pipeline.apply_async((sample,), producer=producer)
+            count += 1
+
+            if count % batch_size == 0: report()
+    report()
+    return count
@@ -1,8 +1,158 @@
+from ..AC.L2_processing.sensor_parameters import ARCHIVE_MEMBERS
+from ..API.BaseAPI import BaseAPI
+from ..API.SearchCache import SearchCache
+from ..exceptions import ProductOfflineError
+from ..utils import SceneCache, get_scene_size, get_scene_footprint, get_scene_datetime
 from .. import API, app
 from argparse import Namespace
+from celery.exceptions import Retry
+from pathlib import Path
+from typing import List, Optional
 
 
-@app.task(bind=True, name='search', queue='search', priority=1)#, rate_limit='3/m')
+# Results returned by a Source search at most, beyond which results may be missing
+SEARCH_LIMIT = 20
+
+# Cost of each scene property when ranking scenes, in hours of time offset
+RANK_WEIGHTS = {
+    'download'  : 2,    # Scene must be downloaded 
+    'gigabyte'  : 1,    # Each GB which must be downloaded
+    'corrected' : -1,   # Each requested AC method which has already been applied
+    'cloud'     : 0.12, # Each percent of cloud cover
+}
+
+
+def search_options(global_config: Namespace) -> dict:
+    """ Keywords for BaseAPI.search_scenes, as set in the pipeline config """
+    return {
+        'cache' : SearchCache.from_config(global_config),
+        'hedge' : None if not global_config.search_hedge else {
+            'percentile' : global_config.search_hedge_percentile,
+            'delay'      : global_config.search_hedge_delay,
+            'merge'      : global_config.search_hedge_merge,
+        },
+    }
+
+
+
+def get_archive_members(
+    sensor     : str,       # Sensor which created the scene
+    ac_methods : List[str], # AC methods which will be applied to the scene
+) -> Optional[List[str]]:   # Returns filename patterns, or None if all members are required
+    """ Archive members which must be extracted from a scene for the AC methods to run """
+    members = []
+    for ac_method in ac_methods:
+        if sensor not in ARCHIVE_MEMBERS.get(ac_method, {}): return
+        members += [m for m in ARCHIVE_MEMBERS[ac_method][sensor] if m not in members]
+    return members
+
+
+
+def download_cached(
+    api           : BaseAPI,     # API used to download the scene
+    cache         : SceneCache,  # Cache which the scene is stored in
+    refs          : list,        # References taken on the scene while it's in use
+    logger,                      # Logger of the calling task
+    **kwargs,                    # Keywords passed to api.download_scene
+) -> Path:                       # Returns path to the downloaded scene
+    """ Download the scene, ensuring it remains in the cache until released """
+    sensor   = kwargs['sensor']
+    scene_id = kwargs['scene_id']
+    n_bytes  = get_scene_size(kwargs['scene_details'])
+
+    if not cache.acquire(sensor, scene_id, refs, n_bytes):
+        logger.warning(f'{cache} exceeds its budget, as all scenes are in use')
+
+    try:
+        scene_path = api.download_scene(**kwargs)
+        cache.register(sensor, scene_id, scene_path)
+        return scene_path
+
+    # Scene won't be used if the download fails
+    except:
+        cache.release(sensor, scene_id, refs)
+        raise
+
+
+
+def retry_offline(
+    task,                      # Task which downloads the scene
+    exc           : ProductOfflineError, # Error raised by the offline scene download
+    global_config : Namespace, # Config for the pipeline
+) -> None:
+    """ 
+    Requeue the task to run again once the offline scene is expected to 
+    have been retrieved, keeping the remainder of its chain. The worker 
+    is free to download any online scenes in the meantime.
+    """
+    countdown = global_config.lta_retry_delay * 60
+    task.logger.info(f'{exc}\nRetrying {task.name} in {global_config.lta_retry_delay} minutes')
+
+    # Tasks run by a local executor (i.e. the LocalManager) are requeued by it instead
+    if task.executor is not None:
+        raise Retry(str(exc), exc, when=countdown)
+    raise task.retry(exc=exc, countdown=countdown)
+
+
+
+def get_cloud_cover(scene_details: dict) -> Optional[float]:
+    """ Cloud cover percentage of a scene, if the Source provides it """
+    for key in ['cloudcoverpercentage', 'cloud_cover', 'cloudCover']:
+        try:    return float(scene_details[key])
+        except: pass
+
+
+
+def rank_scenes(
+    scenes        : dict,      # Scenes found for the sample: {scene_id: scene_details}
+    sample_config : dict,      # Config for the sample
+    sensor        : str,       # Sensor the scenes were found for
+    global_config : Namespace, # Config for the pipeline
+) -> List[str]:                # Returns scene ids, from best to worst
+    """
+    Order the scenes by their cost for the given sample. This is the time
+    offset (in hours) from the in situ measurement, plus the (weighted)
+    cost of downloading the scene, minus any AC processing already done,
+    plus the cloud cover. Scenes already on disk are therefore preferred 
+    over an equally valid scene which would need to be downloaded.
+    """
+    folder   = global_config.output_path.joinpath('Scenes', sensor)
+    measured = sample_config.get('datetime', None)
+    window   = sample_config['dt_range'].distance.total_seconds() / 2 / 3600
+
+    def cost(scene_id):
+        details  = scenes[scene_id]
+        acquired = get_scene_datetime(details)
+        hours    = (abs((acquired - measured).total_seconds()) / 3600 
+                    if acquired is not None and measured is not None else window)
+
+        path = folder.joinpath(scene_id)
+        if not path.joinpath('.complete').exists():
+            n_bytes = get_scene_size(details) or 1024 ** 3
+            hours  += RANK_WEIGHTS['download'] + RANK_WEIGHTS['gigabyte'] * n_bytes / 1024 ** 3
+
+        for ac_method in global_config.ac_methods:
+            if next(path.glob(f'out/*/{ac_method}.nc'), None) is not None:
+                hours += RANK_WEIGHTS['corrected']
+
+        cloud = get_cloud_cover(details)
+        return hours + RANK_WEIGHTS['cloud'] * (cloud or 0)
+    return sorted(scenes, key=cost)
+
+
+
+def select_scene(
+    scenes        : dict,      # Scenes found for the sample: {scene_id: scene_details}
+    sample_config : dict,      # Config for the sample
+    sensor        : str,       # Sensor the scenes were found for
+    global_config : Namespace, # Config for the pipeline
+) -> str:                      # Returns the selected scene id
+    """ Choose which of the found scenes a sample should use """
+    return rank_scenes(scenes, sample_config, sensor, global_config)[0]
+
+
+
+@app.task(bind=True, name='search', queue='search', priority=1, max_retries=None)#, rate_limit='3/m')
 def search(self,
     sample_config : dict,      # Config for this sample
     sensor        : str,       # Sensor to perform search for
@@ -14,37 +164,155 @@ def search(self,
     out_path = global_config.output_path.joinpath('Scenes', sensor)
 
     api    = API.API[sensor]()
-    scenes = api.search_scenes(sensor, location, dt_range)
+    scenes = api.search_scenes(sensor, location, dt_range, **search_options(global_config))
 
     if len(scenes):
-        # Quick hack to minimize risk of running out of space
-        try:
-            folders = [f for f in out_path.glob('*') if f.joinpath('.complete').exists()]
-            
-            if len(folders) > 20:
-                import numpy as np
-                import shutil
-                # Doesn't work on linux?
-                #oldest = min(folders, key=lambda f: f.stat().st_ctime)#i = np.random.randint(0, len(folders))
-                oldest = min(folders, key=lambda f: min(f.joinpath('.complete').stat().st_ctime, f.joinpath('.complete').stat().st_atime))
-                #parse_f = lambda f: dt.fromtimestamp(min(f.stat().st_ctime, f.stat().st_atime))
-                #options = {f.name: parse_f(f.joinpath('.complete')) for f in folders}
-                #self.logger.info(f'Removing folder {oldest} out of options: \n{pretty_print(options)}')
-                shutil.rmtree(oldest) #folders[i].as_posix())
-        except Exception as e: self.logger.error(f'Error removing folders: {e}')
-
-        scene  = list(scenes.keys())[0] 
+        scene  = select_scene(scenes, sample_config, sensor, global_config)
+        cache  = SceneCache.from_config(global_config)
+        refs   = cache.refs([sample_config['uid']], global_config.ac_methods)
         kwargs = {
             'sensor'        : sensor,
             'scene_id'      : scene,
             'scene_details' : scenes[scene],
             'scene_folder'  : out_path,
             'overwrite'     : global_config.overwrite,
+            'members'       : get_archive_members(sensor, global_config.ac_methods),
         }
         self.logger.info(f'Downloading scene {scene}')
-        kwargs['scene_path'] = api.download_scene(**kwargs)
+        try: kwargs['scene_path'] = download_cached(api, cache, refs, self.logger, **kwargs)
+        except ProductOfflineError as e: retry_offline(self, e, global_config)
+        kwargs.update(sample_config)
+        return kwargs
+
+    # If there aren't any scenes found, break out of the pipeline chain
+    self.request.chain = None
+
+
+
+@app.task(bind=True, name='locate', queue='locate', priority=1)
+def locate(self,
+    sample_config : dict,      # Config for this sample
+    sensor        : str,       # Sensor to perform search for
+    global_config : Namespace, # Config for the pipeline
+) -> dict:                     # Returns new sample config state
+    """ Search for the matching scene of a given sample, without downloading """
+    location = sample_config['location'] # Location object
+    dt_range = sample_config['dt_range'] # DatetimeRange object
+
+    api    = API.API[sensor]()
+    scenes = api.search_scenes(sensor, location, dt_range, **search_options(global_config))
+
+    if len(scenes):
+        scene  = select_scene(scenes, sample_config, sensor, global_config)
+        kwargs = {
+            'sensor'           : sensor,
+            'scene_id'         : scene,
+            'scene_details'    : scenes[scene],
+            'scene_candidates' : scenes,
+        }
         kwargs.update(sample_config)
         return kwargs
 
     # If there aren't any scenes found, break out of the pipeline chain
     self.request.chain = None
+
+
+
+@app.task(bind=True, name='download', queue='search', priority=1, max_retries=None)
+def download(self,
+    scene_config  : dict,      # Config for the scene and the samples it serves
+    global_config : Namespace, # Config for the pipeline
+) -> dict:                     # Returns new scene config state
+    """ Download the scene shared by a group of samples """
+    sensor   = scene_config['sensor']
+    out_path = global_config.output_path.joinpath('Scenes', sensor)
+    cache    = SceneCache.from_config(global_config)
+    uids     = [sample['uid'] for sample in scene_config['samples']]
+    refs     = cache.refs(uids, global_config.ac_methods)
+
+    kwargs = {
+        'sensor'        : sensor,
+        'scene_id'      : scene_config['scene_id'],
+        'scene_details' : scene_config['scene_details'],
+        'scene_folder'  : out_path,
+        'overwrite'     : global_config.overwrite,
+        'members'       : get_archive_members(sensor, global_config.ac_methods),
+    }
+    n_samples = len(scene_config['samples'])
+    self.logger.info(f'Downloading scene {kwargs["scene_id"]} for {n_samples} samples')
+    try: kwargs['scene_path'] = download_cached(API.API[sensor](), cache, refs, self.logger, **kwargs)
+    except ProductOfflineError as e: retry_offline(self, e, global_config)
+    kwargs.update(scene_config)
+    return kwargs
+
+
+
+def assign_scenes(
+    scenes  : dict, # Scenes found for a cluster of samples
+    samples : list, # Sample configs within the cluster
+) -> Optional[list]: # Returns the matching scenes of each sample, or None if unknown
+    """
+    Find the scenes which cover each sample, by intersecting the sample
+    and scene footprints. None is returned if the scenes can't be assigned
+    (i.e. a footprint or datetime is missing), or if the search may have
+    been truncated.
+    """
+    if len(scenes) >= SEARCH_LIMIT: return
+
+    footprints = {scene: get_scene_footprint(details) for scene, details in scenes.items()}
+    datetimes  = {scene: get_scene_datetime(details)  for scene, details in scenes.items()}
+    if None in footprints.values() or None in datetimes.values(): return
+
+    return [{scene: details for scene, details in scenes.items()
+             if sample['dt_range'].start <= datetimes[scene] <= sample['dt_range'].end
+             and footprints[scene].intersects(sample['location'].footprint)}
+            for sample in samples]
+
+
+
+def located_config(
+    sample_config : dict,      # Config for this sample
+    sensor        : str,       # Sensor the scenes were found for
+    scenes        : dict,      # Scenes which cover the sample
+    global_config : Namespace, # Config for the pipeline
+) -> dict:                     # Returns the located sample config
+    """ Sample config with the scene selected from those covering it (if any) """
+    located = dict(sample_config, sensor=sensor, scene_id=None, scene_candidates={})
+    if len(scenes):
+        scene = select_scene(scenes, sample_config, sensor, global_config)
+        located.update({
+            'scene_id'         : scene,
+            'scene_details'    : scenes[scene],
+            'scene_candidates' : scenes,
+        })
+    return located
+
+
+
+@app.task(bind=True, name='locate_cluster', queue='locate', priority=1)
+def locate_cluster(self,
+    cluster_config : dict,      # Config for a cluster of nearby samples
+    sensor         : str,       # Sensor to perform search for
+    global_config  : Namespace, # Config for the pipeline
+) -> dict:                      # Returns located sample configs, and any which remain
+    """ 
+    Search once for the matching scenes of all samples within a cluster,
+    without downloading. Samples whose scenes couldn't be determined from
+    the cluster search are returned as unassigned. All scenes found are 
+    also returned, so that the cluster's search can be indexed.
+    """
+    location = cluster_config['location'] # Location object enclosing all samples
+    dt_range = cluster_config['dt_range'] # DatetimeRange object enclosing all samples
+    samples  = cluster_config['samples']
+
+    api      = API.API[sensor]()
+    scenes   = api.search_scenes(sensor, location, dt_range, **search_options(global_config))
+    assigned = assign_scenes(scenes, samples)
+
+    if assigned is None:
+        self.logger.info(f'Unable to assign {len(scenes)} scenes to {len(samples)} samples')
+        return {'located': [], 'unassigned': samples, 'scene_candidates': scenes}
+
+    located = [located_config(sample, sensor, candidates, global_config) 
+               for sample, candidates in zip(samples, assigned)]
+    return {'located': located, 'unassigned': [], 'scene_candidates': scenes}
@@ -19,36 +19,10 @@ def get_active_tasks2(self):
 
 
 def get_active_tasks(self):
-
-    # tasks = dd(list)
-    with app.connection() as connection:
-        with connection.channel() as channel:
-            # inspector = app.control.inspect(connection=connection)
-
-            # a = inspector.active_queues()
-            # print(a)
-            # for worker, queues in a.items():
-            for queue in ['celery', 'search','correct','extract','write']:
-                name, jobs, consumers = channel.queue_declare(**{
-                    'queue'   : queue,#['name'], 
-                    'passive' : True,
-                })
-                if jobs > 0:
-                    return jobs
-                # active = []
-                # parse  = lambda msg: msg.properties['application_headers']['task']
-                # append = lambda msg: active.append( parse(msg) )
-                # channel.basic_consume(**{
-                #     'queue'    : queue,#['name'],
-                #     'callback' : append,
-                # })
-
-                # for job in range(max(1, jobs)): connection.drain_events()
-                # # print(f'{queue["name"]} ({jobs}, {name}): {active}')
-                # print(f'{queue} ({jobs}, {name}): {active}')
-                # print(inspector.active(), inspector.scheduled(), inspector.reserved())
-                # print(inspector.stats())
-    # return active 
+    """ Check the broker for any tasks still waiting in a queue """
+    for queue, jobs in utils.get_queue_depths().items():
+        if jobs > 0:
+            return jobs
 
 import time
 
@@ -1,6 +1,9 @@
+from ..utils import SceneCache
 from .. import app
+from collections import defaultdict as dd
 from argparse import Namespace
 from pathlib import Path
+from typing import Union
 # import zarr
 import numpy as np
 
@@ -16,14 +19,40 @@ def serialize(values, separators=['||', '<>', ',']):
 
 @app.task(bind=True, name='write', queue='write', priority=4)
 def write(self,
-    sample_config : dict,      # Config for this sample
-    global_config : Namespace, # Config for the pipeline
+    sample_config : Union[dict, list], # Config for this sample (or each batched sample)
+    global_config : Namespace,         # Config for the pipeline
 ) -> None:                     
     """ 
     Write the extracted window to disk. 
     Note that this function runs in a separate queue to ensure only
     one process ever handles writing (to avoid race conditions).
     """
+    sample_configs = sample_config if type(sample_config) is list else [sample_config]
+    for sample_config in sample_configs:
+        write_sample(sample_config, global_config)
+
+    # Batched samples share their correction, so it's only removed once all are written
+    corrections = {str(c['correction_path']): c for c in sample_configs}
+    for sample_config in corrections.values():
+        remove_correction(sample_config)
+
+    # Samples no longer need their scene once they've been written
+    released = dd(list)
+    for sample_config in sample_configs:
+        key = tuple(sample_config[k] for k in ['sensor', 'scene_id', 'ac_method'])
+        released[key].append(sample_config['uid'])
+
+    cache = SceneCache.from_config(global_config)
+    for (sensor, scene_id, ac_method), uids in released.items():
+        cache.release(sensor, scene_id, cache.refs(uids, [ac_method]))
+
+
+
+def write_sample(
+    sample_config : dict,      # Config for this sample
+    global_config : Namespace, # Config for the pipeline
+) -> None:
+    """ Write the extracted window of a single sample to disk """
     # dataset   = sample_config['dataset']
     # ac_method = 
     # sensor    = 
@@ -71,6 +100,10 @@ def write(self,
         with out_path.joinpath(f'{feature}.csv').open('a+') as f:
             f.write(f'{values}\n')
 
+
+
+def remove_correction(sample_config: dict) -> None:
+    """ Remove the correction output which the sample was extracted from """
     try: 
         sample_config['correction_path'].unlink()
         if sample_config['ac_method'] == 'acolite':
@@ -1,4 +1,5 @@
 from .exceptions import ResultComparisonError, HaltOnFailureError
+from ..exceptions import ProductOfflineError
 from .utils import color, get_dict_hash, pretty_print
 
 from sentinelsat.exceptions import LTATriggered
@@ -45,7 +46,7 @@ def test_function(function : Callable) -> Callable:
         **f_kwargs,   # Keyword arguments to pass to function
     ) -> str:         # Returns pass/fail result string
         """ Determine whether the given function throws an exception """
-        ignore_tb = (ReadTimeout, LTATriggered, EarthExplorerError)
+        ignore_tb = (ReadTimeout, LTATriggered, EarthExplorerError, ProductOfflineError)
 
         # Try to run the function, and catch any execution exceptions
         try: 
@@ -0,0 +1,124 @@
+from pathlib import Path
+from typing import Optional, Union
+import os, socket, time
+
+
+
+class FileLock:
+    """Lock shared between processes, using an exclusively created lockfile.
+
+    As the lock is only a file, it is shared by any process which can see
+    the lockfile path, including processes on other nodes when the path is
+    on a shared filesystem:
+
+        with FileLock(path.with_suffix('.lock')):
+            ... # Only a single process will ever be here at once
+
+    Locks whose holder died without releasing them are broken once the 
+    lockfile hasn't been modified for `stale` seconds. Long running holders
+    should therefore call `refresh` periodically. Only one process breaks 
+    a stale lock at a time (see `_break_stale`), so that a lock which was
+    just recreated by another process is never broken as well.
+
+    """
+
+    def __init__(self, 
+        path    : Union[Path, str],      # Path of the lockfile
+        timeout : Optional[float] = None, # Seconds to wait for the lock (None waits forever)
+        stale   : Optional[float] = 600,  # Seconds after which an unmodified lock is broken
+        poll    : float           = 0.1,  # Seconds between attempts to acquire the lock
+    ):
+        self.path    = Path(path)
+        self.timeout = timeout
+        self.stale   = stale
+        self.poll    = poll
+        self.locked  = False
+
+
+    def __str__(self):
+        return f'FileLock({self.path})'
+
+
+    def __repr__(self):
+        return str(self)
+
+    # Context managers
+    def __enter__(self, *args, **kwargs): return self.acquire()
+    def  __exit__(self, *args, **kwargs): return self.release()
+
+
+
+    def acquire(self) -> 'FileLock':
+        """ Block until the lock is acquired, or raise TimeoutError """
+        start = time.time()
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                with os.fdopen(fd, 'w') as f:
+                    f.write(f'{socket.gethostname()}:{os.getpid()}')
+                self.locked = True
+                return self
+
+            except FileExistsError:
+                if self.is_stale() and self._break_stale():
+                    continue
+
+            if self.timeout is not None and (time.time() - start) > self.timeout:
+                raise TimeoutError(f'Failed to acquire {self} within {self.timeout} seconds')
+            time.sleep(self.poll)
+
+
+
+    def release(self) -> None:
+        """ Release the lock, if it is held """
+        if self.locked:
+            self.path.unlink(missing_ok=True)
+            self.locked = False
+
+
+
+    def refresh(self) -> None:
+        """ Mark the lock as still in use, preventing it from becoming stale """
+        if self.locked:
+            self.path.touch()
+
+
+
+    def is_stale(self) -> bool:
+        """ Check if the current lockfile has been abandoned by its holder """
+        if self.stale is None: return False
+        try:    return (time.time() - self.path.stat().st_mtime) > self.stale
+        except FileNotFoundError: return False
+
+
+
+    # ================================================================
+    # Private functions
+
+    def _break_stale(self) -> bool:
+        """ 
+        Remove the lockfile if it's still stale, returning whether this process
+        was the one to check it. Breakers are serialized by a second lockfile,
+        so the lock is rechecked after any other process has broken (and then
+        recreated) it.
+        """
+        breaker = self.path.with_name(f'{self.path.name}.break')
+        try:
+            fd = os.open(breaker, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            # Breaker died while holding the breaker lock
+            try:
+                if (time.time() - breaker.stat().st_mtime) > self.stale:
+                    breaker.unlink(missing_ok=True)
+            except FileNotFoundError: pass
+            return False
+
+        try:
+            if self.is_stale():
+                self.path.unlink(missing_ok=True)
+        finally:
+            os.close(fd)
+            breaker.unlink(missing_ok=True)
+        return True
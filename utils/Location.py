@@ -78,6 +78,18 @@ class Location:
 
 
 
+    @classmethod
+    def merge(cls, locations: List['Location']) -> 'Location':
+        """ Create a bounding box Location enclosing all given Locations """
+        return cls(**{
+            'n' : max(location.n for location in locations),
+            's' : min(location.s for location in locations),
+            'e' : max(location.e for location in locations),
+            'w' : min(location.w for location in locations),
+        })
+
+
+
     def get_bbox(self,
         order     : Union[str, List[str]] = 'nsew', 
         given     : bool                  = False,  
@@ -0,0 +1,134 @@
+from argparse import Namespace
+from pathlib import Path
+from typing import Any, Union
+import hashlib, os, pickle, shutil
+
+
+
+class Payload:
+    """ Compact handle to a value saved within a PayloadStore """
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+
+
+    def __repr__(self):
+        return f'Payload({Path(self.path).stem[:8]}, {self.size:,} bytes)'
+
+
+    def load(self) -> Any:
+        """ Load the value this handle references """
+        with open(self.path, 'rb') as f:
+            return pickle.load(f)
+
+
+
+class PayloadStore:
+    """Content-addressed store for large values passed between tasks.
+
+    Each task in a chain returns the sample config it received along with
+    any new values, so that the message sent to the broker grows at every
+    step. Large values (e.g. scene details, extracted windows) are instead
+    saved to a folder visible to all workers, and only a handle to the
+    value is passed through the broker (i.e. the claim-check pattern):
+
+        store   = PayloadStore(folder, threshold=4096)
+        handles = {}
+        config  = store.check_in(config, ['extracted'], handles)
+        config  = store.check_out(config, handles)
+
+    Values are saved under the hash of their contents, so that identical
+    values (e.g. the details of a scene shared by many samples) are only
+    stored once.
+
+    """
+
+    def __init__(self,
+        root      : Union[Path, str], # Folder visible to all workers to save payloads in
+        threshold : int = 4096,       # Pickled size (bytes) at which a value is stored
+    ):
+        self.root      = Path(root)
+        self.threshold = threshold
+
+
+    def __repr__(self):
+        return f'PayloadStore({self.root})'
+
+
+    @classmethod
+    def from_config(cls, global_config: Namespace) -> 'PayloadStore':
+        """ Create the store used by the pipeline with the given config """
+        return cls(global_config.output_path.joinpath('Payloads'),
+                   global_config.payload_threshold)
+
+
+
+    def put(self, value: Any) -> Union[Payload, Any]:
+        """ Store the value if it's large enough, returning its handle """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) < self.threshold:
+            return value
+
+        digest = hashlib.sha1(data).hexdigest()
+        path   = self.root.joinpath(digest[:2], f'{digest}.pkl')
+
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True, parents=True)
+            temp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+            temp.write_bytes(data)
+            temp.replace(path)
+        return Payload(path.as_posix(), len(data))
+
+
+
+    def check_in(self,
+        value   : Any,            # Task result, possibly containing large values
+        keys    : list,           # Dictionary keys whose values should be stored
+        handles : dict = None,    # Handles of values previously checked out
+    ) -> Any:                     # Returns the value, with large values as handles
+        """
+        Replace the values of the given keys with handles. Any value which
+        was checked out by the current task and returned unmodified reuses
+        its original handle, rather than being serialized again.
+        """
+        handles = handles or {}
+        if type(value) in [list, tuple]:
+            return type(value)(self.check_in(v, keys, handles) for v in value)
+
+        if isinstance(value, dict):
+            stored = {}
+            for k, v in value.items():
+                if k in keys and not isinstance(v, Payload):
+                    stored[k] = handles.get(id(v), None) or self.put(v)
+                else:
+                    stored[k] = self.check_in(v, keys, handles)
+            return stored
+        return value
+
+
+    @staticmethod
+    def check_out(
+        value   : Any,         # Task argument, possibly containing handles
+        handles : dict = None, # Records the handle of each loaded value
+    ) -> Any:                  # Returns the value with all handles loaded
+        """ Replace any handles within the value with the values they reference """
+        if isinstance(value, Payload):
+            loaded = value.load()
+            if handles is not None:
+                handles[id(loaded)] = value
+            return loaded
+
+        if type(value) in [list, tuple]:
+            return type(value)(PayloadStore.check_out(v, handles) for v in value)
+
+        if isinstance(value, dict):
+            return {k: PayloadStore.check_out(v, handles) for k, v in value.items()}
+        return value
+
+
+
+    def clear(self) -> None:
+        """ Remove all stored payloads """
+        if self.root.exists():
+            shutil.rmtree(self.root)
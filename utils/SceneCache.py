@@ -0,0 +1,229 @@
+from .FileLock import FileLock
+
+from contextlib import contextmanager
+from argparse import Namespace
+from pathlib import Path
+from typing import List, Optional, Union
+import json, os, shutil, time
+
+
+
+def folder_size(path: Path) -> int:
+    """ Total number of bytes of all files contained in the given folder """
+    path = Path(path)
+    if path.is_file(): return path.stat().st_size
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+
+
+class SceneCache:
+    """Disk budget aware cache of downloaded scenes.
+
+    Scenes are stored at `root`/<sensor>/<scene_id>, and each sample which 
+    is bound to a scene takes a reference to it. A scene with any live 
+    references is pinned, and will never be removed; otherwise, the least
+    recently used scenes are removed whenever the cache exceeds its budget:
+
+        cache = SceneCache.from_config(global_config)
+        refs  = cache.refs([uid], global_config.ac_methods)
+
+        cache.acquire(sensor, scene_id, refs, n_bytes) # Pin, making room for the scene 
+        cache.register(sensor, scene_id, scene_path)   # Record the downloaded size
+        cache.release(sensor, scene_id, refs)          # Unpin, once samples are written
+
+    The cache state is kept in an on-disk index (`root`/.index.json) which
+    is shared between all processes via a FileLock, so that the scene 
+    folders themselves only need to be examined when a download completes.
+    Evicted scenes are moved aside while the index is locked, and only 
+    deleted once it has been released, so the lock is never held for long.
+    References which are held for longer than `stale_after` seconds are 
+    assumed to be abandoned (e.g. a failed task), and no longer pin a scene.
+
+    """
+
+    def __init__(self, 
+        root        : Union[Path, str], # Folder which holds all downloaded scenes
+        budget      : float,            # Maximum number of bytes used by all scenes
+        stale_after : float = 86400,    # Seconds after which a reference is abandoned
+    ):
+        self.root        = Path(root)
+        self.budget      = budget
+        self.stale_after = stale_after
+        self.index_path  = self.root.joinpath('.index.json')
+        self.lock        = FileLock(self.root.joinpath('.index.lock'), stale=60)
+        self.evicted     = self.root.joinpath('.evicted')
+
+
+    def __str__(self):
+        return f'SceneCache({self.root})'
+
+
+    def __repr__(self):
+        return str(self)
+
+
+
+    @classmethod
+    def from_config(cls, global_config: Namespace) -> 'SceneCache':
+        """ Create the SceneCache defined by the pipeline config """
+        return cls(**{
+            'root'        : global_config.output_path.joinpath('Scenes'),
+            'budget'      : global_config.scene_cache_gb * 1024 ** 3,
+            'stale_after' : global_config.scene_ref_timeout * 3600,
+        })
+
+
+
+    @staticmethod
+    def refs(uids: List[str], ac_methods: List[str]) -> List[str]:
+        """ References held on a scene until each sample is written for every AC method """
+        return [f'{uid}:{ac_method}' for uid in uids for ac_method in ac_methods]
+
+
+
+    def acquire(self,
+        sensor   : str,                   # Sensor which created the scene
+        scene_id : str,                   # ID of the scene
+        refs     : List[str],             # References to take on the scene
+        n_bytes  : Optional[int] = None,  # Expected size of the scene, if known
+    ) -> bool:                            # Returns flag indicating if the cache is within budget
+        """ Pin the scene, evicting unpinned scenes to make room for it if necessary """
+        now = time.time()
+        with self._index() as index:
+            scene = index.setdefault(f'{sensor}/{scene_id}', {
+                'bytes'    : None,
+                'expected' : n_bytes,
+                'refs'     : {},
+            })
+            scene['last_used'] = now
+            scene['refs'].update(dict.fromkeys(refs, now))
+            return self._evict(index) <= self.budget
+
+
+
+    def register(self,
+        sensor     : str,  # Sensor which created the scene
+        scene_id   : str,  # ID of the scene
+        scene_path : Path, # Path to the downloaded scene
+    ) -> None:
+        """ Record the actual size of a scene once it's been downloaded """
+        folder  = self.root.joinpath(sensor, scene_id)
+        n_bytes = folder_size(folder if folder.exists() else scene_path)
+
+        with self._index() as index:
+            scene = index.setdefault(f'{sensor}/{scene_id}', {'refs': {}})
+            scene['bytes']     = n_bytes
+            scene['last_used'] = time.time()
+            self._evict(index)
+
+
+
+    def release(self,
+        sensor   : str,       # Sensor which created the scene
+        scene_id : str,       # ID of the scene
+        refs     : List[str], # References to release from the scene
+    ) -> None:
+        """ Release references on the scene, unpinning it once none remain """
+        with self._index() as index:
+            scene = index.get(f'{sensor}/{scene_id}', None)
+            if scene is not None:
+                for ref in refs: scene['refs'].pop(ref, None)
+                scene['last_used'] = time.time()
+
+
+
+    def usage(self) -> dict:
+        """ Summarize the current state of the cache """
+        with self._index() as index:
+            pinned = [key for key, scene in index.items() if self._pinned(scene)]
+            return {
+                'Scenes' : len(index),
+                'Pinned' : len(pinned),
+                'GB'     : round(sum(map(self._size, index.values())) / 1024 ** 3, 2),
+                'Pinned GB' : round(sum(self._size(index[key]) for key in pinned) / 1024 ** 3, 2),
+                'Budget' : round(self.budget / 1024 ** 3, 2),
+            }
+
+
+
+    # ================================================================
+    # Private functions
+
+    @contextmanager
+    def _index(self):
+        """ Load the index for modification, writing it back once complete """
+        with self.lock:
+            index = self._load()
+            yield index
+            self._save(index)
+        self._purge()
+
+
+
+    def _load(self) -> dict:
+        """ Load the index, building it from any existing scenes if necessary """
+        if self.index_path.exists():
+            with self.index_path.open() as f:
+                return json.load(f)
+
+        # Index any scenes which were downloaded prior to the index existing
+        index = {}
+        for complete in self.root.glob('*/*/.complete'):
+            folder = complete.parent
+            if folder.parent.name.startswith('.'): continue
+            index[f'{folder.parent.name}/{folder.name}'] = {
+                'bytes'     : folder_size(folder),
+                'last_used' : complete.stat().st_mtime,
+                'refs'      : {},
+            }
+        return index
+
+
+
+    def _save(self, index: dict) -> None:
+        """ Write the index, ensuring a partial write is never seen """
+        self.root.mkdir(exist_ok=True, parents=True)
+        temp = self.index_path.with_name(f'.index.{os.getpid()}.tmp')
+        with temp.open('w+') as f:
+            json.dump(index, f)
+        temp.replace(self.index_path)
+
+
+
+    def _pinned(self, scene: dict) -> bool:
+        """ Check if the scene has any live references """
+        now = time.time()
+        return any((now - taken) < self.stale_after for taken in scene['refs'].values())
+
+
+
+    def _size(self, scene: dict) -> int:
+        """ Actual size of the scene if downloaded, and expected size otherwise """
+        return scene.get('bytes') or scene.get('expected') or 0
+
+
+
+    def _evict(self, index: dict) -> int:
+        """ Remove least recently used, unpinned scenes until within budget """
+        usage   = sum(map(self._size, index.values()))
+        unused  = [key for key, scene in index.items() if not self._pinned(scene)]
+        by_time = sorted(unused, key=lambda key: index[key].get('last_used', 0))
+
+        for key in by_time:
+            if usage <= self.budget: break
+            usage -= self._size(index.pop(key))
+
+            # Renaming is quick, whereas deleting a multi-GB scene isn't
+            folder = self.root.joinpath(key)
+            if folder.exists():
+                self.evicted.mkdir(exist_ok=True, parents=True)
+                folder.rename(self.evicted.joinpath(f'{key.replace("/", "_")}.{os.getpid()}.{time.time_ns()}'))
+        return usage
+
+
+
+    def _purge(self) -> None:
+        """ Delete the scenes which have been evicted, outside of the index lock """
+        if not self.evicted.exists(): return
+        for folder in self.evicted.iterdir():
+            shutil.rmtree(folder, ignore_errors=True)
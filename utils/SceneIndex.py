@@ -0,0 +1,174 @@
+from .DatetimeRange import DatetimeRange
+from .Location import Location
+from .get_scene_datetime import get_scene_datetime
+from .get_scene_footprint import get_scene_footprint
+
+from shapely.geometry.base import BaseGeometry
+from shapely.strtree import STRtree
+from pathlib import Path
+from typing import List, Optional, Union
+import os, pickle, warnings
+
+
+
+def build_tree(geometries: List[BaseGeometry]) -> tuple:
+    """ Build an STRtree, along with the index of each geometry it contains """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore') # Shapely 1.8 warns of the 2.x interface change
+        tree = STRtree(geometries)
+    return tree, {id(geom): i for i, geom in enumerate(geometries)}
+
+
+
+def query_tree(
+    tree     : STRtree,      # Tree to query
+    lookup   : dict,         # Index of each geometry within the tree, by id
+    geometry : BaseGeometry, # Geometry to query the tree with
+) -> List[int]:              # Returns indices of geometries whose bounds intersect
+    """ Query an STRtree, for both shapely 1.8 (geometries) and 2.x (indices) """
+    results = tree.query(geometry)
+    if len(results) and isinstance(results[0], BaseGeometry):
+        return [lookup[id(geom)] for geom in results]
+    return [int(i) for i in results]
+
+
+
+class SceneIndex:
+    """Spatial index of the scenes found by previous searches.
+
+    Scene footprints (and acquisition datetimes) are taken from search
+    results and held in an STRtree for each sensor. Samples covered by
+    a known scene can then be resolved without searching again:
+
+        index = SceneIndex.load(path) if path.exists() else SceneIndex()
+        index.add(sensor, scenes, location, dt_range)
+
+        scenes = index.query(sensor, location, dt_range)
+        if scenes is None:
+            ... # Unknown, so a search is still required
+
+    The area and datetime range of each search is also recorded, so that
+    the index can determine when no scene covers a sample, rather than
+    only that no scene is known.
+
+    """
+
+    def __init__(self):
+        self.scenes   = {} # {sensor: {scene_id: (footprint, datetime, details)}}
+        self.searches = {} # {sensor: [(footprint, start, end)]}
+        self._trees   = {} # {(kind, sensor): (tree, lookup, values)}
+
+
+    def __str__(self):
+        n_scenes   = sum(map(len, self.scenes.values()))
+        n_searches = sum(map(len, self.searches.values()))
+        return f'SceneIndex(scenes={n_scenes}, searches={n_searches})'
+
+
+    def __repr__(self):
+        return str(self)
+
+
+    def __getstate__(self):
+        """ Trees are rebuilt after loading, rather than being saved """
+        return {'scenes': self.scenes, 'searches': self.searches}
+
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.__dict__.update(state)
+
+
+
+    def add(self,
+        sensor   : str,                     # Sensor the scenes were found for
+        scenes   : dict,                    # Search results: {scene_id: scene_details}
+        location : Optional[Location]      = None, # Location which was searched
+        dt_range : Optional[DatetimeRange] = None, # Datetime range which was searched
+        limit    : Optional[int]           = None, # Number of results at which the search may be truncated
+    ) -> None:
+        """
+        Add the scenes found by a search. Scenes without a footprint or
+        datetime can't be indexed, in which case the search area is not
+        recorded either (as the index would be incomplete for that area).
+        Nor is it recorded if the search returned `limit` or more results,
+        as other scenes within the area may then be missing.
+        """
+        indexed    = self.scenes.setdefault(sensor, {})
+        incomplete = False
+
+        for scene_id, details in scenes.items():
+            footprint = get_scene_footprint(details)
+            datetime  = get_scene_datetime(details)
+            if footprint is None or datetime is None:
+                incomplete = True
+                continue
+
+            indexed[scene_id] = (footprint, datetime, details)
+            self._trees.pop(('scenes', sensor), None)
+
+        if limit is not None and len(scenes) >= limit:
+            incomplete = True
+
+        if location is not None and dt_range is not None and not incomplete:
+            searches = self.searches.setdefault(sensor, [])
+            searches.append((location.footprint, dt_range.start, dt_range.end))
+            self._trees.pop(('searches', sensor), None)
+
+
+
+    def query(self,
+        sensor   : str,           # Sensor to find scenes for
+        location : Location,      # Location the scenes must cover
+        dt_range : DatetimeRange, # Datetime range the scenes must be acquired within
+    ) -> Optional[dict]:          # Returns the covering scenes, or None if unknown
+        """
+        Find the known scenes covering the given location and datetime range.
+        Scenes are only returned if a previous search covered the same 
+        location and datetime range (an empty dictionary if it found none),
+        as every scene within it is then known. Otherwise None is returned.
+        """
+        footprint = location.footprint
+        found     = {}
+        for scene_id, (scene_footprint, datetime, details) in self._query('scenes', sensor, footprint):
+            if dt_range.start <= datetime <= dt_range.end and scene_footprint.intersects(footprint):
+                found[scene_id] = details
+
+        for search_footprint, start, end in self._query('searches', sensor, footprint):
+            if start <= dt_range.start and dt_range.end <= end and search_footprint.covers(footprint):
+                return found
+
+
+
+    def save(self, path: Union[Path, str]) -> None:
+        """ Write the index to disk, ensuring a partial write is never seen """
+        path = Path(path)
+        path.parent.mkdir(exist_ok=True, parents=True)
+        temp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+        temp.write_bytes(pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL))
+        temp.replace(path)
+
+
+    @classmethod
+    def load(cls, path: Union[Path, str]) -> 'SceneIndex':
+        """ Read a previously saved index from disk """
+        with Path(path).open('rb') as f:
+            return pickle.load(f)
+
+
+
+    # ================================================================
+    # Private functions
+
+    def _query(self, kind: str, sensor: str, geometry: BaseGeometry) -> list:
+        """ Values of the given kind whose footprint bounds intersect the geometry """
+        key = (kind, sensor)
+        if key not in self._trees:
+            values = (list(self.scenes.get(sensor, {}).items()) if kind == 'scenes' else
+                      list(self.searches.get(sensor, [])))
+            geometries = [v[1][0] if kind == 'scenes' else v[0] for v in values]
+            self._trees[key] = (*build_tree(geometries), values) if len(values) else (None, None, [])
+
+        tree, lookup, values = self._trees[key]
+        if tree is None: return []
+        return [values[i] for i in query_tree(tree, lookup, geometry)]
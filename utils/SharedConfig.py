@@ -0,0 +1,67 @@
+from argparse import Namespace
+from pathlib import Path
+from typing import Union
+import hashlib, os, pickle
+
+
+# Shared configs already loaded by this process, keyed by file path
+LOADED = {}
+
+
+
+def load_shared_config(path: str) -> 'SharedConfig':
+    """ Load the SharedConfig saved at the given path, reusing any prior load """
+    if path not in LOADED:
+        with open(path, 'rb') as f:
+            LOADED[path] = SharedConfig(path, **pickle.load(f))
+    return LOADED[path]
+
+
+
+class SharedConfig(Namespace):
+    """Namespace which is serialized as a reference to its values on disk.
+
+    The pipeline config is passed to every task, and would otherwise be
+    pickled in full into every message sent to the broker. A SharedConfig
+    is instead saved to disk once, with messages only containing its path.
+    Each worker process then loads the config a single time:
+
+        config  = SharedConfig.create(global_config, folder)
+        message = pickle.dumps(config) # Only contains the path
+
+    Note that the saved values are immutable: any modifications made to 
+    a SharedConfig after creation are not seen by other processes.
+
+    """
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.__dict__['_path'] = path
+
+
+    def __reduce__(self):
+        return (load_shared_config, (self._path,))
+
+
+    def _get_kwargs(self):
+        """ Exclude the file path from the Namespace representation """
+        return [(k, v) for k, v in super()._get_kwargs() if k != '_path']
+
+
+
+    @classmethod
+    def create(cls, 
+        config : Namespace,        # Config to share 
+        folder : Union[Path, str], # Folder visible to all workers to save the config in
+    ) -> 'SharedConfig':           # Returns the shared config
+        """ Save the config values, returning the SharedConfig which references them """
+        values = pickle.dumps( dict(config._get_kwargs()) )
+        digest = hashlib.sha1(values).hexdigest()
+        path   = Path(folder).resolve().joinpath(f'{digest}.pkl')
+
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True, parents=True)
+            temp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+            temp.write_bytes(values)
+            temp.replace(path)
+        return load_shared_config(path.as_posix())
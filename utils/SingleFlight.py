@@ -0,0 +1,91 @@
+from .FileLock import FileLock
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Union
+import threading, time
+
+
+
+class SingleFlight:
+    """Work on a shared result which is only ever performed by one process.
+
+    The first process to require the result becomes the leader, and does
+    the work while holding a FileLock. Any other process (including those
+    on other nodes sharing the filesystem) waits for the lock instead, and
+    then uses the leader's result rather than repeating the work:
+
+        flight = SingleFlight(output.joinpath('.download.lock'))
+        with flight.lead(lambda: output.joinpath('.complete').exists()) as leader:
+            if leader:
+                download(output)
+
+    If the leader fails without producing the result, the next waiting
+    process takes over as leader. The lock is refreshed by a heartbeat
+    while the leader works, so that a lock abandoned by a process which
+    died is broken after `stale` seconds, without long running work
+    (e.g. a multi-GB download) being mistaken for an abandoned lock.
+
+    """
+
+    def __init__(self,
+        path      : Union[Path, str],       # Path of the lockfile
+        stale     : float = 120,            # Seconds after which an unrefreshed lock is broken
+        heartbeat : float = 30,             # Seconds between refreshes of the leader's lock
+        poll      : float = 1,              # Seconds between checks while waiting on the leader
+        timeout   : Optional[float] = None, # Seconds to wait on a leader (None waits forever)
+    ):
+        assert(heartbeat < stale), 'Heartbeat must be more frequent than the stale period'
+        self.path      = Path(path)
+        self.stale     = stale
+        self.heartbeat = heartbeat
+        self.poll      = poll
+        self.timeout   = timeout
+
+
+    def __str__(self):
+        return f'SingleFlight({self.path})'
+
+
+    def __repr__(self):
+        return str(self)
+
+
+
+    @contextmanager
+    def lead(self,
+        is_done : Callable[[], bool], # Function which checks if the result already exists
+    ) -> Iterator[bool]:              # Yields flag indicating if this process must do the work
+        """
+        Wait until either the result exists, or this process holds the lock
+        (in which case the result must be produced within the context).
+        """
+        start = time.time()
+        while not is_done():
+            lock = FileLock(self.path, timeout=0, stale=self.stale)
+            try:
+                lock.acquire()
+            except TimeoutError:
+                if self.timeout is not None and (time.time() - start) > self.timeout:
+                    raise TimeoutError(f'{self} leader did not finish within {self.timeout} seconds')
+                time.sleep(self.poll)
+                continue
+
+            try:
+                # Previous leader may have finished while the lock was being acquired
+                if is_done(): break
+
+                def heartbeat():
+                    while not stop.wait(self.heartbeat):
+                        lock.refresh()
+
+                stop   = threading.Event()
+                thread = threading.Thread(target=heartbeat, daemon=True)
+                thread.start()
+                try:     yield True
+                finally:
+                    stop.set()
+                    thread.join()
+                return
+            finally: lock.release()
+        yield False
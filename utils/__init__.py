@@ -2,18 +2,31 @@ from .assert_contains  import assert_contains
 from .bitmask_l2gen    import bitmask_l2gen
 from .bitmask_polymer  import bitmask_polymer
 from .catch_and_log    import catch_and_log
+from .cluster_locations import cluster_locations
 from .color            import color
 from .DatetimeRange    import DatetimeRange
 from .decompress       import decompress 
+from .decompress_stream import decompress_stream
+from .FileLock         import FileLock
 from .force_ipv4       import force_ipv4
 from .get_credentials  import get_credentials
 from .get_datetime     import get_datetime
 from .get_latlon       import get_latlon
+from .get_queue_depths import get_queue_depths
+from .get_scene_datetime import get_scene_datetime
+from .get_scene_footprint import get_scene_footprint
+from .get_scene_size   import get_scene_size
 from .get_wavelengths  import get_wavelengths
 from .line_messages    import line_messages
 from .Location         import Location
+from .PayloadStore     import PayloadStore
 from .pretty_print     import pretty_print
 from .purge_queues     import purge_queues
+from .record_completed import record_completed
+from .SceneCache       import SceneCache
+from .SceneIndex       import SceneIndex
+from .SharedConfig     import SharedConfig
+from .SingleFlight     import SingleFlight
 from .unstack          import unstack
 from .UTM_zone         import UTM_zone
 from .variable_name    import variable_name
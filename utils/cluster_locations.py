@@ -0,0 +1,66 @@
+from .Location import Location
+
+from typing import List
+import math
+
+
+def bbox_area(location: Location) -> float:
+    """ Approximate area (in km^2) of the Location bounding box """
+    km_per_degree = 111.32
+    height = abs(location.n - location.s) * km_per_degree
+    width  = abs(location.e - location.w) * km_per_degree
+    return height * width * math.cos(math.radians(location.lat))
+
+
+
+def cluster_locations(
+    locations : List[Location], 
+    max_area  : float,
+) -> List[List[int]]:
+    """Group Locations such that each group's bounding box is limited in size.
+
+    Locations are greedily added to whichever existing cluster results 
+    in the smallest enclosing bounding box, so long as that bounding box
+    area does not exceed `max_area`. Otherwise, a new cluster is created.
+
+    Parameters
+    ----------
+    locations : List[Location]
+        Locations which should be clustered.
+    max_area  : float
+        Maximum area (in km^2) of a cluster's enclosing bounding box. Any
+        single Location larger than this will be placed in its own cluster.
+
+    Returns
+    -------
+    List[List[int]]
+        List of clusters, where each cluster is a list of indices into
+        the given `locations`.
+
+    Examples
+    --------
+    >>> locations = [
+            Location(lat=37.0, lon=-76.0), 
+            Location(lat=37.1, lon=-76.1), 
+            Location(lat=42.0, lon=-70.0),
+        ]
+    >>> cluster_locations(locations, max_area=10000)
+    [[0, 1], [2]]
+
+    """
+    clusters = []
+    bboxes   = []
+
+    for idx, location in enumerate(locations):
+        merged = [Location.merge([bbox, location]) for bbox in bboxes]
+        areas  = [bbox_area(bbox) for bbox in merged]
+        valid  = [i for i, area in enumerate(areas) if area <= max_area]
+
+        if len(valid):
+            best = min(valid, key=lambda i: areas[i])
+            clusters[best].append(idx)
+            bboxes[best] = merged[best]
+        else:
+            clusters.append([idx])
+            bboxes.append(location)
+    return clusters
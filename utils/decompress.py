@@ -1,13 +1,39 @@
 from ..exceptions import MissingFileError, BadArchiveError
 
 from pathlib import Path
-import shutil, zipfile, tarfile, bz2
+from typing import List, Optional, Union
+import fnmatch, shutil, zipfile, tarfile, bz2
+
+# Recognized archive extensions, with compound extensions first
+EXTENSIONS = ['.tar.gz', '.tgz', '.tar', '.bz2', '.zip']
+
+
+def get_extension(archive: Union[Path, str]) -> str:
+    """ Archive extension of a filename, e.g. 'A2018257.L1A_LAC.bz2' -> '.bz2' """
+    name = Path(archive).name.lower()
+    return next((ext for ext in EXTENSIONS if name.endswith(ext)), ''.join(Path(archive).suffixes))
+
+
+def get_bz2_output(archive: Union[Path, str], destination: Path) -> Path:
+    """ File a .bz2 archive is extracted to, if the destination is a folder """
+    if destination.is_dir():
+        return destination.joinpath(Path(archive).name[:-len('.bz2')])
+    return destination
+
+
+def is_member(
+    name    : str,                 # Name of the member within the archive
+    members : Optional[List[str]], # Filename patterns of the members to extract
+) -> bool:                         # Returns flag indicating if the member is extracted
+    """ Check if the archive member matches any of the given patterns (or if there are none) """
+    return members is None or any(fnmatch.fnmatch(Path(name).name, m) for m in members)
 
 
 def decompress(        
     archive     : Path, 
     destination : Path, 
     remove      : bool = True,
+    members     : Optional[List[str]] = None,
 ) -> None:
     """Decompress the given archive, raising exceptions as necessary.
 
@@ -19,6 +45,9 @@ def decompress(
         Path of the location to extract to.
     remove      : bool, optional
         If True, delete the archive after extraction.
+    members     : [str], optional
+        Filename patterns (e.g. '*_B?.TIF') of the members to extract, 
+        rather than extracting all members. Ignored for .bz2 archives.
     
     Raises
     ------
@@ -31,15 +60,16 @@ def decompress(
 
     class BZ2Helper(bz2.BZ2File):
         """ Provides uniform interface for .bz2 extraction """
-        def extractall(self, destination: str):
-            with open(destination, 'wb') as f:
+        def extractall(self, destination: str, members=None):
+            with get_bz2_output(archive, Path(destination)).open('wb') as f:
                 shutil.copyfileobj(self, f)
 
-    extension = ''.join(archive.suffixes)
+    extension = get_extension(archive)
     operators = {
         '.zip'    : lambda f: zipfile.ZipFile(f, 'r'),
         '.tar'    : lambda f: tarfile.open(f),
         '.tar.gz' : lambda f: tarfile.open(f, 'r:gz'),
+        '.tgz'    : lambda f: tarfile.open(f, 'r:gz'),
         '.bz2'    : lambda f: BZ2Helper(f, 'rb'),
     }
 
@@ -49,7 +79,12 @@ def decompress(
     
     try:
         with operators[extension](archive) as f:
-            f.extractall(destination.as_posix())
+            if members is None or extension == '.bz2':
+                f.extractall(destination.as_posix())
+            elif extension == '.zip':
+                f.extractall(destination.as_posix(), [m for m in f.namelist() if is_member(m, members)])
+            else:
+                f.extractall(destination.as_posix(), [m for m in f.getmembers() if is_member(m.name, members)])
 
     except Exception as e:
         archive.replace(archive.with_name(f'badarchive_{archive.name}'))
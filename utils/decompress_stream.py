@@ -0,0 +1,72 @@
+from ..exceptions import BadArchiveError, DownloadStallError
+from .decompress import get_extension, get_bz2_output, is_member
+
+from pathlib import Path
+from typing import BinaryIO, List, Optional
+import os, shutil, tarfile, bz2, requests, urllib3
+
+# Archives which can be extracted in a single sequential read. Zip archives
+# can't be, as their central directory is at the end of the file.
+STREAMABLE = ['.tar.gz', '.tgz', '.tar', '.bz2']
+
+
+def decompress_stream(
+    stream      : BinaryIO, 
+    name        : str,
+    destination : Path, 
+    members     : Optional[List[str]] = None,
+) -> None:
+    """Decompress an archive while it is being read, e.g. from an HTTP response.
+
+    Only the extracted files are written to disk, rather than first
+    writing the archive and then reading it back again to extract it.
+
+    Parameters
+    ----------
+    stream      : BinaryIO
+        File-like object the archive is read from, sequentially.
+    name        : str
+        Filename of the archive, which determines its format.
+    destination : Path
+        Path of the location to extract to.
+    members     : [str], optional
+        Filename patterns (e.g. '*_B?.TIF') of the members to extract, 
+        rather than extracting all members. Ignored for .bz2 archives.
+    
+    Raises
+    ------
+    BadArchiveError 
+        The archive can't be streamed, or the extraction fails for any reason 
+        (including the stream ending early). Errors raised while reading the
+        stream itself (e.g. DownloadStallError) are raised unchanged.
+    
+    """
+    extension = get_extension(name)
+    if extension not in STREAMABLE:
+        message = f'Archive {name} cannot be decompressed while streaming'
+        raise BadArchiveError(message)
+
+    partial = None
+    try:
+        if extension == '.bz2':
+            output  = get_bz2_output(name, destination)
+            partial = output.with_name(f'.{output.name}.{os.getpid()}.part')
+            with bz2.BZ2File(stream, 'rb') as f, partial.open('wb') as out:
+                shutil.copyfileobj(f, out, 1024 ** 2)
+            partial.replace(output)
+
+        else:
+            with tarfile.open(fileobj=stream, mode='r|*') as f:
+                for member in f:
+                    if is_member(member.name, members):
+                        f.extract(member, destination.as_posix())
+
+    # Download failures aren't a problem with the archive
+    except (DownloadStallError, requests.exceptions.RequestException, urllib3.exceptions.HTTPError):
+        if partial is not None: partial.unlink(missing_ok=True)
+        raise
+
+    except Exception as e:
+        if partial is not None: partial.unlink(missing_ok=True)
+        message = f'Unable to decompress archive {name}: {e}'
+        raise BadArchiveError(message)
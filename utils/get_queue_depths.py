@@ -0,0 +1,33 @@
+from .. import app 
+
+
+
+def get_queue_depths(
+    queues=['celery', 'search', 'locate', 'correct', 'extract', 'write'],
+) -> dict:
+    """Get the number of messages waiting in each celery queue.
+
+    Queues are declared passively, so that the broker only reports 
+    on the queue state rather than creating any missing queues.
+
+    Parameters
+    ----------
+    queues : List[str], optional
+        Names of the queues which should be examined.
+
+    Returns
+    -------
+    dict
+        Mapping of `{queue name: number of waiting messages}`.
+
+    """
+    depths = {}
+    with app.connection() as connection:
+        with connection.channel() as channel:
+            for queue in queues:
+                name, jobs, consumers = channel.queue_declare(**{
+                    'queue'   : queue, 
+                    'passive' : True,
+                })
+                depths[queue] = jobs
+    return depths
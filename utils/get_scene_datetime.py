@@ -0,0 +1,39 @@
+from datetime import datetime as dt, timezone
+from dateutil import parser
+from typing import Optional
+
+
+
+def get_scene_datetime(scene_details: dict) -> Optional[dt]:
+    """Attempt to determine the acquisition datetime of a scene from its details.
+
+    Copernicus reports the start of the acquisition as `beginposition`, 
+    EarthExplorer uses `start_time` or `acquisition_date`, and LAADS 
+    gives the `start` of the granule. Other Sources (e.g. OBPG) do not 
+    provide any datetime information at all.
+
+    Parameters
+    ----------
+    scene_details : dict
+        Scene details as returned by a Source `search_scenes` call.
+
+    Returns
+    -------
+    Optional[datetime.datetime]
+        Naive UTC datetime of the scene acquisition, or None if the 
+        datetime cannot be determined (including when only the date
+        is available).
+
+    """
+    for key in ['beginposition', 'begin_position', 'start_time', 'startTime',
+                'acquisition_date', 'acquisitionDate', 'start']:
+        value = scene_details.get(key, None)
+
+        if isinstance(value, str):
+            try:    value = parser.parse(value)
+            except: continue
+
+        if isinstance(value, dt):
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            return value
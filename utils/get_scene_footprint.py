@@ -0,0 +1,46 @@
+from shapely.geometry.base import BaseGeometry
+from shapely.geometry import Polygon, box
+from shapely import wkt
+from typing import Optional
+
+
+
+def get_scene_footprint(scene_details: dict) -> Optional[BaseGeometry]:
+    """Attempt to determine the footprint of a scene from its details.
+
+    Copernicus reports the footprint as a WKT string, EarthExplorer gives
+    a shapely geometry (or its bounds), and LAADS gives the corners of 
+    the granule ring. Other Sources (e.g. OBPG) do not provide any 
+    footprint information at all.
+
+    Parameters
+    ----------
+    scene_details : dict
+        Scene details as returned by a Source `search_scenes` call.
+
+    Returns
+    -------
+    Optional[BaseGeometry]
+        Footprint of the scene, or None if the footprint cannot be 
+        determined.
+
+    """
+    for key in ['footprint', 'spatial_coverage', 'spatialCoverage']:
+        value = scene_details.get(key, None)
+
+        if isinstance(value, BaseGeometry):
+            return value
+
+        if isinstance(value, str):
+            try:    return wkt.loads(value)
+            except: pass
+
+    for key in ['spatial_bounds', 'spatialBounds']:
+        value = scene_details.get(key, None)
+        if value is not None and len(value) == 4:
+            return box(*map(float, value))
+
+    corners = [(scene_details.get(f'GRingLongitude{i}', None), 
+                scene_details.get(f'GRingLatitude{i}',  None)) for i in range(1, 5)]
+    if all(v is not None for corner in corners for v in corner):
+        return Polygon([tuple(map(float, corner)) for corner in corners])
@@ -0,0 +1,44 @@
+from typing import Optional
+import re
+
+
+# Multipliers for unit prefixes (e.g. MB -> M)
+UNITS = {
+    ''  : 1,
+    'K' : 1024,
+    'M' : 1024 ** 2,
+    'G' : 1024 ** 3,
+    'T' : 1024 ** 4,
+}
+
+
+def get_scene_size(scene_details: dict) -> Optional[int]:
+    """Attempt to determine the download size of a scene from its details.
+
+    Copernicus reports the size as a string (e.g. '619.44 MB'), whereas
+    LAADS gives the number of bytes directly. Other Sources (e.g. OBPG)
+    do not provide any size information at all.
+
+    Parameters
+    ----------
+    scene_details : dict
+        Scene details as returned by a Source `search_scenes` call.
+
+    Returns
+    -------
+    Optional[int]
+        Estimated number of bytes for the scene download, or None 
+        if the size cannot be determined.
+
+    """
+    for key in ['size', 'filesize', 'file_size', 'fileSize']:
+        value = scene_details.get(key, None)
+
+        if isinstance(value, (int, float)):
+            return int(value)
+
+        if isinstance(value, str):
+            match = re.match(r'^\s*([\d.]+)\s*([KMGT]?B?)\s*$', value.upper())
+            if match is not None:
+                number, unit = match.groups()
+                return int(float(number) * UNITS[unit.rstrip('B')])
@@ -0,0 +1,19 @@
+from pathlib import Path
+from typing import Union
+
+
+def record_completed(
+    output_path : Union[Path, str], # Output path of the pipeline
+    dataset     : str,              # Dataset the sample belongs to
+    sensor      : str,              # Sensor the sample was searched for
+    uid         : str,              # Unique ID of the sample
+    found       : bool,             # Whether a matching scene was found
+) -> None:
+    """ 
+    Append the outcome of a sample's search to its completed.csv, so 
+    that the sample is skipped by any later run (see filter_completed)
+    """
+    outpath = Path(output_path).joinpath(dataset, sensor)
+    outpath.mkdir(exist_ok=True, parents=True)
+    with outpath.joinpath('completed.csv').open('a+') as f:
+        f.write(f'{uid}, {found}\n')